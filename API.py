@@ -1,17 +1,48 @@
+import os
+import time
+import asyncio
 import uvicorn
-from uuid import uuid4
+from typing import Optional, Literal
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Query, Header, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 
 from Utils.Schemas import *
-from Utils.Logger import createLogger, sessionIDVar
+from Utils.Logger import createLogger, loggingStats
+from Utils.Serializers import ResponseClass, negotiateResponseClass
+from Utils.Metrics import markValidated, renderMetrics, timed
+from Utils.SessionMiddleware import SessionTrackingMiddleware
+from Utils.SingleFlight import SingleFlight, SingleFlightTimeout
+from Utils.GroupCommit import GroupCommitBuffer
 
-from Services.PackagingAgent import PackagingAgent
+from Services.PackagingAgent import PackagingAgent, BULK_MAX_BYTES
 from Services.DBAgent import DBAgent
+from Services.AsyncDBAgent import AsyncDBAgent
 
-app = FastAPI()
+
+# Lifespan: Schema bootstrap and pool warm-up, once per worker
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema is verified/migrated here, never on the request path
+    if os.getenv("DB_BOOTSTRAP_ON_STARTUP", "1") == "1":
+        dbAgent.bootstrap()
+    dbAgent.pool.warm()
+    if isinstance(dbAgent, AsyncDBAgent):
+        await dbAgent.asyncPool.warm()
+    logger.info("Schema and connection pool are ready...")
+    yield
+    if upsertBuffer is not None:
+        await upsertBuffer.close()
+    if isinstance(dbAgent, AsyncDBAgent):
+        await dbAgent.asyncPool.close()
+    dbAgent.pool.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ResponseClass)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +52,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Middleware: Session ID Injection and Request Metrics, outermost
+app.add_middleware(SessionTrackingMiddleware)
+
+# Seconds between re-reads of /changes while a long-poll waits
+CHANGES_POLL_INTERVAL = float(os.getenv("API_CHANGES_POLL_INTERVAL", "0.5"))
+
+# Content type of each /query?stream= format
+STREAM_MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
 # Logger
 logger = createLogger()
 logger.info("API's logger is warm...")
@@ -29,58 +69,246 @@ logger.info("API's logger is warm...")
 packagingAgent = PackagingAgent()
 logger.info("IMSAgent is warm...")
 
-# DB Agent: Sending Payload
-dbAgent = DBAgent()
-logger.info("DBAgent is warm...")
+# DB Agent: Sending Payload - DB_MODE=async swaps in the asyncio driver
+dbAgent = AsyncDBAgent() if os.getenv("DB_MODE", "sync") == "async" else DBAgent()
+logger.info(f"{type(dbAgent).__name__} is warm...")
+
+# Single-flight: identical concurrent reads share one DB call
+singleFlight = (
+    SingleFlight(maxWait=float(os.getenv("API_SINGLE_FLIGHT_MAX_WAIT", "10")))
+    if os.getenv("API_SINGLE_FLIGHT", "1") == "1"
+    else None
+)
+
+# Group commit: upserts buffered for a few ms share one statement and commit
+upsertBuffer = (
+    GroupCommitBuffer(
+        lambda upsertInPayloads: dbCall(dbAgent.groupUpsert, upsertInPayloads),
+        window=float(os.getenv("API_GROUP_COMMIT_WINDOW", "0.005")),
+        maxItems=int(os.getenv("API_GROUP_COMMIT_MAX_ITEMS", "100")),
+    )
+    if os.getenv("API_GROUP_COMMIT", "0") == "1"
+    else None
+)
+
+
+async def dbCall(method, *args):
+    # Coroutines are awaited on the loop, blocking calls go to the threadpool
+    if asyncio.iscoroutinefunction(method):
+        return await method(*args)
+    return await run_in_threadpool(method, *args)
+
+
+async def readDBCall(method, *args):
+    # Joins an identical in-flight read, sharing its result or error. A session
+    # that just wrote reads alone, a shared flight may be served by a replica.
+    if singleFlight is None or dbAgent.replicas.isSticky():
+        return await dbCall(method, *args)
+
+    try:
+        return await singleFlight.do(
+            (method.__name__, *args), lambda: dbCall(method, *args)
+        )
+    except SingleFlightTimeout as timeout:
+        logger.error(f"{timeout}...")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(timeout)
+        )
+
+
+def forgetReads():
+    # Reads started before a write must not answer requests sent after it
+    if singleFlight is not None:
+        singleFlight.forget()
+
+
+async def readBody(request, maxBytes):
+    # Rejects an oversized body before buffering it: by Content-Length when
+    # sent, otherwise as soon as the streamed chunks pass maxBytes
+    tooLarge = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body is limited to {maxBytes} bytes.",
+    )
+    contentLength = request.headers.get("content-length", "")
+    if contentLength.isdigit() and int(contentLength) > maxBytes:
+        raise tooLarge
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > maxBytes:
+            raise tooLarge
 
+    return bytes(body)
 
-# Middleware: Session ID Injection
-@app.middleware("http")
-async def session_tracking_middleware(request: Request, call_next):
-    sessionID = str(uuid4())
-    sessionIDVar.set(sessionID)
-    request.state.session_id = sessionID
-    logger.info("Handling new request...")
-    response: Response = await call_next(request)
 
-    return response
+def respond(responseClass, response):
+    with timed("serialization"):
+        return responseClass(response, status_code=200)
 
 
 # API: Upsert
 @app.post("/upsert")
-def upsert(upsertPayload: VAL_UPSERT):
+async def upsert(upsertPayload: VAL_UPSERT):
+    markValidated()
     logger.info("Invoked upsert API...")
-    listID = dbAgent.upsert(packagingAgent.upsertIn(upsertPayload.model_dump()))
+    upsertInPayload = packagingAgent.upsertIn(upsertPayload.model_dump())
+    if upsertBuffer is None:
+        listID = await dbCall(dbAgent.upsert, upsertInPayload)
+    else:
+        with timed("group_commit"):
+            listID = await upsertBuffer.submit(upsertInPayload)
+        # Committed by the buffer outside this request, keep its reads sticky
+        dbAgent.replicas.recordWrite()
+    forgetReads()
     response = packagingAgent.upsertOut(listID)
     logger.info("Completed upsert API...")
 
-    return JSONResponse(response, status_code=200)
+    return respond(ResponseClass, response)
+
+
+# API: Bulk Upsert - JSON list, {"items": [...]} or NDJSON (application/x-ndjson)
+@app.post("/upsert/bulk")
+async def bulkUpsert(request: Request):
+    markValidated()
+    logger.info("Invoked bulk upsert API...")
+    itemCount, bulkUpsertInPayload, failures = packagingAgent.bulkUpsertIn(
+        await readBody(request, BULK_MAX_BYTES),
+        request.headers.get("content-type", ""),
+    )
+    try:
+        itemIDs, dbFailures = await dbCall(dbAgent.bulkUpsert, bulkUpsertInPayload)
+    finally:
+        # Earlier chunks may be committed even when a later one failed
+        forgetReads()
+    response = packagingAgent.bulkUpsertOut(
+        itemCount, itemIDs, {**failures, **dbFailures}
+    )
+    logger.info("Completed bulk upsert API...")
+
+    return respond(ResponseClass, response)
 
 
 # API: Query
 @app.post("/query")
-def query(queryPayload: VAL_QUERY):
+async def query(
+    queryPayload: VAL_QUERY,
+    stream: Optional[Literal["json", "ndjson"]] = None,
+    summary: bool = False,
+    group_by: Optional[Literal["category"]] = None,
+    layout: Literal["items", "columnar"] = Query("items", alias="format"),
+    accept: Optional[str] = Header(None),
+):
+    markValidated()
     logger.info("Invoked query API...")
-    Listitems = dbAgent.query(packagingAgent.queryIn(queryPayload.model_dump()))
-    response = packagingAgent.queryOut(Listitems)
+    if summary or group_by:
+        # Aggregates only, computed by MySQL, no row data leaves the server
+        rows = await readDBCall(
+            dbAgent.querySummary,
+            packagingAgent.queryIn(queryPayload.model_dump()),
+            group_by,
+        )
+        response = packagingAgent.querySummaryOut(rows, group_by)
+        logger.info("Completed query summary API...")
+
+        return respond(negotiateResponseClass(accept), response)
+
+    if stream and layout == "columnar":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format=columnar cannot be streamed.",
+        )
+
+    if stream:
+        # Opt-in: rows are fetched and serialized batch by batch
+        batches = await dbCall(
+            dbAgent.streamQuery, packagingAgent.queryIn(queryPayload.model_dump())
+        )
+        logger.info("Streaming query API...")
+        return StreamingResponse(
+            packagingAgent.queryStreamOut(batches, stream),
+            media_type=STREAM_MEDIA_TYPES[stream],
+        )
+
+    Listitems = await readDBCall(
+        dbAgent.query, packagingAgent.queryIn(queryPayload.model_dump())
+    )
+    response = packagingAgent.queryOut(Listitems, layout)
     logger.info("Completed query API...")
 
-    return JSONResponse(response, status_code=200)
+    return respond(negotiateResponseClass(accept), response)
 
 
 # API: Advance Query
 @app.post("/advance-query")
-def query(advanceQueryPayload: VAL_ADVANCE_QUERY):
+async def query(
+    advanceQueryPayload: VAL_ADVANCE_QUERY,
+    layout: Literal["items", "columnar"] = Query("items", alias="format"),
+    accept: Optional[str] = Header(None),
+):
+    markValidated()
     logger.info("Invoked advance query API...")
-    Listitems = dbAgent.advanceQuery(
-        packagingAgent.advanceQueryIn(advanceQueryPayload.model_dump())
+    ListitemsTotal = await readDBCall(
+        dbAgent.advanceQuery,
+        packagingAgent.advanceQueryIn(advanceQueryPayload.model_dump()),
     )
     response = packagingAgent.advanceQueryOut(
-        Listitems, advanceQueryPayload.model_dump()
+        ListitemsTotal, advanceQueryPayload.model_dump(), layout
     )
     logger.info("Completed advance query API...")
 
-    return JSONResponse(response, status_code=200)
+    return respond(negotiateResponseClass(accept), response)
+
+
+# API: Changes - rows updated after a cursor, oldest first, optional long-poll
+@app.post("/changes")
+async def changes(changesPayload: VAL_CHANGES, accept: Optional[str] = Header(None)):
+    markValidated()
+    logger.info("Invoked changes API...")
+    changesInPayload = packagingAgent.changesIn(changesPayload.model_dump())
+    deadline = time.monotonic() + changesPayload.wait
+
+    while True:
+        # Mirrors polling from the same cursor share one read
+        rows = await readDBCall(dbAgent.changes, changesInPayload)
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            break
+        await asyncio.sleep(min(CHANGES_POLL_INTERVAL, remaining))
+
+    response = packagingAgent.changesOut(rows, changesInPayload)
+    logger.info("Completed changes API...")
+
+    return respond(negotiateResponseClass(accept), response)
+
+
+# API: Stats
+@app.get("/stats")
+def stats():
+    return ResponseClass(
+        {
+            "pool": dbAgent.poolStats(),
+            "cache": dbAgent.cacheStats(),
+            "prepared": dbAgent.preparedStats(),
+            "replicas": dbAgent.replicaStats(),
+            "single_flight": (
+                singleFlight.stats() if singleFlight else {"enabled": False}
+            ),
+            "group_commit": (
+                upsertBuffer.stats() if upsertBuffer else {"enabled": False}
+            ),
+            "logging": loggingStats(),
+        },
+        status_code=200,
+    )
+
+
+# API: Metrics - Prometheus text exposition format
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(
+        renderMetrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 if __name__ == "__main__":
@@ -65,7 +65,7 @@ else
 fi
 
 echo "Running Application"
-gunicorn -w 1 -k uvicorn.workers.UvicornWorker -b 0.0.0.0:2000 API:app || { 
+gunicorn -c Configs/GunicornConfig.py API:app || { 
   echo "Failed to start application"; 
   docker stop mysql-ims;
   exit 1; 
@@ -0,0 +1,310 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+
+ENDPOINTS = ["/upsert", "/query", "/advance-query"]
+SORT_FIELDS = ["name", "category", "price"]
+ROUND_TRIPS_PATTERN = re.compile(
+    r'^ims_db_round_trips_(sum|count)\{endpoint="([^"]+)"\} (\S+)$', re.MULTILINE
+)
+
+
+def itemName(index):
+    return f"bench-item-{index:08d}"
+
+
+def itemCategory(index, categories):
+    return f"bench-category-{index % categories:04d}"
+
+
+def seed(args):
+    # Deterministic rows, re-seeding the same size only rewrites prices
+    from Services.DBAgent import DBAgent
+
+    dbAgent = DBAgent()
+    dbAgent.bootstrap()
+    random.seed(args.seed)
+
+    started = time.perf_counter()
+    with dbAgent.pool.connection() as connection, connection.cursor() as cursor:
+        if args.truncate:
+            cursor.execute(f"TRUNCATE TABLE {dbAgent.table}")
+
+        for batchStart in range(0, args.rows, args.batch):
+            batch = range(batchStart, min(batchStart + args.batch, args.rows))
+            cursor.execute(
+                dbAgent._upsertQuery(len(batch)),
+                [
+                    value
+                    for index in batch
+                    for value in (
+                        itemName(index),
+                        itemCategory(index, args.categories),
+                        round(random.uniform(0.5, 500), 2),
+                    )
+                ],
+            )
+            connection.commit()
+            print(f"Seeded {batch.stop}/{args.rows} rows...", end="\r", flush=True)
+
+    dbAgent.pool.close()
+    print(f"\nSeeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+def upsertPayload(rng, args):
+    return {
+        "name": itemName(rng.randrange(args.rows)),
+        "category": itemCategory(rng.randrange(args.categories), args.categories),
+        "price": round(rng.uniform(0.5, 500), 2),
+    }
+
+
+def queryPayload(rng, args):
+    return {"category": itemCategory(rng.randrange(args.categories), args.categories)}
+
+
+def advanceQueryPayload(rng, args):
+    low = round(rng.uniform(0.5, 250), 2)
+    return {
+        "filters": {
+            "category": itemCategory(rng.randrange(args.categories), args.categories),
+            "price_range": [low, round(low + rng.uniform(10, 250), 2)],
+        },
+        "pagination": {"page": rng.randint(1, 10), "limit": args.limit},
+        "sort": {
+            "field": rng.choice(SORT_FIELDS),
+            "order": rng.choice(["asc", "desc"]),
+        },
+    }
+
+
+PAYLOADS = {
+    "/upsert": upsertPayload,
+    "/query": queryPayload,
+    "/advance-query": advanceQueryPayload,
+}
+
+
+async def scrapeRoundTrips(client):
+    # {endpoint: (sum, count)} from the server's /metrics, {} if unavailable
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+
+    roundTrips = {}
+    for kind, endpoint, value in ROUND_TRIPS_PATTERN.findall(response.text):
+        total, count = roundTrips.get(endpoint, (0.0, 0.0))
+        roundTrips[endpoint] = (
+            (float(value), count) if kind == "sum" else (total, float(value))
+        )
+
+    return roundTrips
+
+
+async def drive(client, endpoint, args, semaphore):
+    # Open loop: requests start on a fixed schedule whether or not earlier ones
+    # finished, latency counts from the scheduled start (no coordinated omission)
+    rng = random.Random(f"{args.seed}:{endpoint}")
+    latencies, errors, tasks = [], {}, []
+
+    async def send(payload, scheduled):
+        async with semaphore:
+            try:
+                response = await client.post(endpoint, json=payload)
+                outcome = response.status_code
+            except httpx.HTTPError as httpError:
+                outcome = type(httpError).__name__
+        if outcome == 200:
+            latencies.append(time.perf_counter() - scheduled)
+        else:
+            errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+
+    started = time.perf_counter()
+    for requestIndex in range(int(args.rate * args.duration)):
+        scheduled = started + requestIndex / args.rate
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        tasks.append(
+            asyncio.create_task(send(PAYLOADS[endpoint](rng, args), scheduled))
+        )
+    await asyncio.gather(*tasks)
+
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(sortedValues, percent):
+    # Nearest-rank percentile
+    if not sortedValues:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sortedValues)))
+    return sortedValues[rank - 1]
+
+
+def summarise(latencies, errors, elapsed, roundTrips):
+    latencies = sorted(latencies)
+    toMs = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies) + sum(errors.values()),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": toMs(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": toMs(percentile(latencies, 50)),
+        "p95_ms": toMs(percentile(latencies, 95)),
+        "p99_ms": toMs(percentile(latencies, 99)),
+        "max_ms": toMs(latencies[-1] if latencies else None),
+        "db_round_trips_per_request": roundTrips,
+    }
+
+
+async def runLoad(args):
+    endpoints = args.endpoints or ENDPOINTS
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        results = {}
+        for endpoint in endpoints:
+            # One endpoint at a time so per-request round trips can be told apart
+            before = await scrapeRoundTrips(client)
+            latencies, errors, elapsed = await drive(client, endpoint, args, semaphore)
+            after = await scrapeRoundTrips(client)
+
+            roundTrips = None
+            if endpoint in after:
+                total, count = after[endpoint]
+                previousTotal, previousCount = before.get(endpoint, (0.0, 0.0))
+                if count > previousCount:
+                    roundTrips = round(
+                        (total - previousTotal) / (count - previousCount), 3
+                    )
+
+            results[endpoint] = summarise(latencies, errors, elapsed, roundTrips)
+            print(f"{endpoint:<15} {formatResult(results[endpoint])}")
+
+    return results
+
+
+def formatResult(result):
+    return (
+        f"{result['throughput']} req/s, p50 {result['p50_ms']} ms, "
+        f"p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+        f"{result['db_round_trips_per_request']} round trips, "
+        f"errors {result['errors'] or 0}"
+    )
+
+
+def gitRevision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    # Regressions beyond tolerance (fraction) in p95 latency or throughput
+    regressions = []
+    for endpoint, result in current["results"].items():
+        baselineResult = baseline["results"].get(endpoint)
+        if baselineResult is None:
+            continue
+
+        for metric, higherIsBetter in [("throughput", True), ("p95_ms", False)]:
+            now, before = result[metric], baselineResult[metric]
+            if not now or not before:
+                continue
+            change = (now - before) / before
+            print(
+                f"{endpoint:<15} {metric:<11} {before:>10} -> {now:<10} {change:+.1%}"
+            )
+            if (-change if higherIsBetter else change) > tolerance:
+                regressions.append(f"{endpoint} {metric} {change:+.1%}")
+
+    return regressions
+
+
+def run(args):
+    started = datetime.now(timezone.utc)
+    results = asyncio.run(runLoad(args))
+    report = {
+        "meta": {
+            "started": started.isoformat(),
+            "revision": gitRevision(),
+            "python": platform.python_version(),
+            "url": args.url,
+            "rows": args.rows,
+            "categories": args.categories,
+            "rate": args.rate,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "limit": args.limit,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Seed INVENTORY and load test /upsert, /query and /advance-query."
+    )
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seedParser = commands.add_parser("seed", help="Seed INVENTORY via DB_* env vars.")
+    seedParser.add_argument("--batch", type=int, default=5000)
+    seedParser.add_argument("--truncate", action="store_true")
+    seedParser.set_defaults(handler=seed)
+
+    runParser = commands.add_parser("run", help="Drive a running API at fixed rates.")
+    runParser.add_argument("--url", default="http://127.0.0.1:2000")
+    runParser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS)
+    runParser.add_argument("--rate", type=float, default=50, help="Requests/s.")
+    runParser.add_argument("--duration", type=float, default=30, help="Seconds.")
+    runParser.add_argument("--concurrency", type=int, default=64)
+    runParser.add_argument("--timeout", type=float, default=30)
+    runParser.add_argument("--limit", type=int, default=50)
+    runParser.add_argument("--output", default="loadtest.json")
+    runParser.add_argument("--baseline", help="Earlier --output to compare against.")
+    runParser.add_argument("--tolerance", type=float, default=0.1)
+    runParser.set_defaults(handler=run)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import asyncio
+import logging
+import argparse
+from uuid import uuid4
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+
+from Utils.Logger import createLogger, sessionIDVar
+from Utils.Metrics import RequestMetrics, requestMetricsVar
+from Utils.SessionMiddleware import SessionTrackingMiddleware
+
+logger = createLogger()
+
+
+def buildApp(stack, sampleRate=1.0):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if stack == "bare":
+        return app
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    if stack == "before":
+        # session_tracking_middleware as it was: BaseHTTPMiddleware and uuid4()
+        @app.middleware("http")
+        async def session_tracking_middleware(request: Request, call_next):
+            sessionID = str(uuid4())
+            sessionIDVar.set(sessionID)
+            request.state.session_id = sessionID
+            requestMetrics = RequestMetrics()
+            requestMetricsVar.set(requestMetrics)
+            logger.info("Handling new request...")
+            statusCode = 500
+            try:
+                response = await call_next(request)
+                statusCode = response.status_code
+            finally:
+                route = request.scope.get("route")
+                requestMetrics.observe(
+                    request.method, route.path if route else "unmatched", statusCode
+                )
+
+            return response
+
+    else:
+        app.add_middleware(SessionTrackingMiddleware, sampleRate=sampleRate)
+
+    return app
+
+
+async def drive(app, requests):
+    # Calls the ASGI app directly, no sockets, so only the stack is measured
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"origin", b"http://bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("127.0.0.1", 2000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-request overhead of the middleware stack."
+    )
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Keep the log formatting cost, drop the terminal noise
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(open(os.devnull, "w"))
+
+    stacks = [
+        ("bare", "bare", 1.0),
+        ("before", "before", 1.0),
+        ("after", "after", 1.0),
+        ("after, 1% logged", "after", 0.01),
+    ]
+
+    print(f"GET /ping, {args.requests} requests, best of {args.repeat}")
+    print(f"{'stack':<18} {'us/request':>10} {'overhead':>10}")
+
+    bare = None
+    for label, stack, sampleRate in stacks:
+        app = buildApp(stack, sampleRate)
+        asyncio.run(drive(app, 100))
+        elapsed = min(
+            asyncio.run(drive(app, args.requests)) for _ in range(args.repeat)
+        )
+        perRequest = elapsed / args.requests * 1e6
+        bare = bare or perRequest
+
+        print(f"{label:<18} {perRequest:>10.1f} {perRequest - bare:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import random
+import argparse
+import threading
+
+# Every call must reach MySQL
+os.environ["DB_RESULT_CACHE_TTL"] = "0"
+
+from Services.DBAgent import DBAgent
+from Services.PackagingAgent import PackagingAgent
+from Benchmarks.LoadTest import upsertPayload, queryPayload, advanceQueryPayload
+from Utils.PreparedStatements import PreparedStatementCache
+
+SERVER_COUNTERS = ["Com_stmt_prepare", "Com_stmt_execute", "Com_stmt_reset"]
+
+
+def operations(dbAgent, packagingAgent, rng, args):
+    # One upsert, one /query filter and one /advance-query page per round,
+    # built from the same payloads as the HTTP load test
+    return [
+        lambda: dbAgent.upsert(packagingAgent.upsertIn(upsertPayload(rng, args))),
+        lambda: dbAgent.query(packagingAgent.queryIn(queryPayload(rng, args))),
+        lambda: dbAgent.advanceQuery(
+            packagingAgent.advanceQueryIn(advanceQueryPayload(rng, args))
+        ),
+    ]
+
+
+def serverCounters(dbAgent):
+    with dbAgent.pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            "SHOW GLOBAL STATUS WHERE Variable_name IN (%s, %s, %s)",
+            SERVER_COUNTERS,
+        )
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def runMode(prepared, args):
+    dbAgent, packagingAgent = DBAgent(), PackagingAgent()
+    dbAgent.preparedStatements = PreparedStatementCache() if prepared else None
+    latencies, lock = [], threading.Lock()
+
+    def worker(index, rounds, record):
+        rng = random.Random(f"{args.seed}:{record}:{index}")
+        local = []
+        for _ in range(rounds):
+            for operation in operations(dbAgent, packagingAgent, rng, args):
+                started = time.perf_counter()
+                operation()
+                local.append(time.perf_counter() - started)
+        if record:
+            with lock:
+                latencies.extend(local)
+
+    def runThreads(rounds, record):
+        threads = [
+            threading.Thread(target=worker, args=(index, rounds, record))
+            for index in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Warm the pool and, when enabled, every connection's statements
+    runThreads(args.warmup, False)
+    before = serverCounters(dbAgent)
+    started = time.perf_counter()
+    runThreads(args.rounds, True)
+    elapsed = time.perf_counter() - started
+    after = serverCounters(dbAgent)
+    dbAgent.pool.close()
+
+    latencies.sort()
+    return {
+        "ops/s": len(latencies) / elapsed,
+        "p50 us": latencies[len(latencies) // 2] * 1e6,
+        "p99 us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        **{name: after[name] - before[name] for name in SERVER_COUNTERS},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Text protocol vs prepared statements for the DBAgent hot path."
+    )
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Same pool size as threads, so no time is spent waiting for connections
+    os.environ["DB_POOL_MAX_SIZE"] = str(args.threads)
+    print(
+        f"{args.threads} threads x {args.rounds} rounds of upsert + query + "
+        f"advanceQuery, seed with Benchmarks/LoadTest.py --rows {args.rows}"
+    )
+    results = {"text": runMode(False, args), "prepared": runMode(True, args)}
+
+    print(f"{'':<18}" + "".join(f"{mode:>12}" for mode in results))
+    for metric in results["text"]:
+        print(
+            f"{metric:<18}"
+            + "".join(f"{results[mode][metric]:>12.0f}" for mode in results)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import random
+import timeit
+
+from Services.PackagingAgent import PackagingAgent
+from Utils.Serializers import SERIALIZERS, orjson, msgpack
+
+
+def sampleRows(rowCount):
+    # (id, name, category, price) rows as returned by DBAgent.query
+    random.seed(0)
+    return [
+        (i, f"Item {i}", f"Category {i % 50}", round(random.uniform(0.5, 500), 2))
+        for i in range(1, rowCount + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time packaging + serialization of /query responses."
+    )
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=10)
+    args = parser.parse_args()
+
+    packagingAgent = PackagingAgent()
+    rows = sampleRows(args.rows)
+
+    encoders = {name: dumps for name, (_, dumps) in SERIALIZERS.items()}
+    encoders["msgpack"] = msgpack and (
+        lambda content: msgpack.packb(content, use_bin_type=True)
+    )
+    if orjson is None:
+        encoders["orjson"] = None
+
+    print(f"/query response, {args.rows} rows, best of {args.repeat}x{args.number}")
+    print(
+        f"{'serializer':<10} {'format':<10} {'ms/response':>12} {'bytes':>10} "
+        f"{'speedup':>8}"
+    )
+
+    baseline = None
+    for layout in ["items", "columnar"]:
+        for name, dumps in encoders.items():
+            if dumps is None:
+                print(f"{name:<10} {layout:<10} {'not installed':>12}")
+                continue
+
+            timings = timeit.repeat(
+                lambda: dumps(packagingAgent.queryOut(rows, layout)),
+                repeat=args.repeat,
+                number=args.number,
+            )
+            elapsed = min(timings) / args.number * 1000
+            baseline = baseline or elapsed
+            size = len(dumps(packagingAgent.queryOut(rows, layout)))
+
+            print(
+                f"{name:<10} {layout:<10} {elapsed:>12.2f} {size:>10} "
+                f"{baseline / elapsed:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# gunicorn -c Configs/GunicornConfig.py API:app
+#
+# Loaded by the gunicorn master before the app is imported, so the DB pool
+# sizes it exports are what each worker's DBAgent reads.
+import os
+import math
+import multiprocessing
+
+from uvicorn.workers import UvicornWorker
+
+
+def cpuCount():
+    # CPUs this process may use: affinity (taskset/cpuset) and cgroup v2 quota
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, cpus)
+
+
+def workerCount(cpus, workersPerCPU=1, maxWorkers=None):
+    # Each uvicorn worker runs its own event loop, one per core saturates it
+    workers = max(1, int(cpus * workersPerCPU))
+    return min(workers, maxWorkers) if maxWorkers else workers
+
+
+def poolSizes(connectionBudget, workers, dbMode="sync"):
+    # (DB_POOL_MAX_SIZE, DB_ASYNC_POOL_MAX_SIZE) per worker within the budget
+    perWorker = max(1, connectionBudget // workers)
+    if dbMode != "async":
+        return perWorker, None
+
+    # Async mode keeps a small blocking pool for bootstrap and bulk upserts
+    blocking = max(1, perWorker // 4)
+    return blocking, max(1, perWorker - blocking)
+
+
+def exportPoolSizes(workers):
+    blocking, asynchronous = poolSizes(
+        int(os.getenv("DB_CONNECTION_BUDGET", "120")),
+        workers,
+        os.getenv("DB_MODE", "sync"),
+    )
+    # Explicit per-worker sizes win over the budget
+    os.environ.setdefault("DB_POOL_MAX_SIZE", str(blocking))
+    if asynchronous is not None:
+        os.environ.setdefault("DB_ASYNC_POOL_MAX_SIZE", str(asynchronous))
+
+    minSize = min(
+        int(os.getenv("DB_POOL_MIN_SIZE", "1")), int(os.environ["DB_POOL_MAX_SIZE"])
+    )
+    os.environ["DB_POOL_MIN_SIZE"] = str(minSize)
+
+
+class IMSUvicornWorker(UvicornWorker):
+    # Explicit instead of "auto", so a missing uvloop/httptools fails loudly
+    CONFIG_KWARGS = {
+        "loop": os.getenv("UVICORN_LOOP", "uvloop"),
+        "http": os.getenv("UVICORN_HTTP", "httptools"),
+        "lifespan": "on",
+    }
+
+
+# Server socket
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:2000")
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+
+# Workers - WEB_CONCURRENCY pins the count, otherwise derived from the CPUs
+workers = int(
+    os.getenv("WEB_CONCURRENCY")
+    or workerCount(
+        cpuCount(),
+        float(os.getenv("GUNICORN_WORKERS_PER_CPU", "1")),
+        int(os.getenv("GUNICORN_MAX_WORKERS", "0")) or None,
+    )
+)
+worker_class = IMSUvicornWorker
+exportPoolSizes(workers)
+# Lets each worker know it has siblings, e.g. for per-worker caches
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Import the app once in the master and fork it, pools and the log listener
+# reset themselves in each child (os.register_at_fork)
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# Recycle workers to bound slow leaks, jittered so they do not restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# Timeouts - keep-alive above a fronting load balancer's idle timeout is safest
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Worker heartbeat files on tmpfs, a disk-backed /tmp can stall workers in Docker
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Access logs off, requests are logged by the app with their session id
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
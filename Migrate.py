@@ -0,0 +1,37 @@
+import argparse
+
+from Utils.Logger import createLogger
+from Services.DBAgent import DBAgent
+from Services.SchemaMigrations import MIGRATIONS, LATEST_VERSION
+
+# Logger
+logger = createLogger()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create/migrate the IMS schema ahead of starting the API."
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="List known schema migrations without touching the database.",
+    )
+    args = parser.parse_args()
+
+    if args.list:
+        for version, description, _ in MIGRATIONS:
+            print(f"{version:>4}  {description}")
+        return
+
+    dbAgent = DBAgent()
+    try:
+        version = dbAgent.bootstrap()
+    finally:
+        dbAgent.pool.close()
+
+    logger.info(f"Schema is at version {version} (latest {LATEST_VERSION})...")
+
+
+if __name__ == "__main__":
+    main()
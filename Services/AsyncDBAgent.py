@@ -0,0 +1,227 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+from functools import wraps
+from contextlib import asynccontextmanager
+
+import mysql.connector
+import mysql.connector.aio
+
+from Utils.Logger import createLogger
+from Utils.AsyncConnectionPool import AsyncConnectionPool
+from Utils.Metrics import AsyncMeteredConnection
+from Utils.QueryBuilder import buildQuery, buildQuerySummary, buildAdvanceQuery
+from Services.DBAgent import DBAgent, SchemaMissingError, UPSERT_STATUS
+
+# Logger
+logger = createLogger()
+logger.info("AsyncDBAgent's logger is warm...")
+
+
+def lazyReverifyAsync(method):
+    # Coroutine flavour of DBAgent.lazyReverify, bootstrap runs off the loop
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        except SchemaMissingError as schemaError:
+            logger.warning(f"Schema missing ({schemaError}), re-verifying...")
+            await asyncio.to_thread(self.bootstrap)
+
+        try:
+            return await method(self, *args, **kwargs)
+        except SchemaMissingError as schemaError:
+            self._raiseDBError(schemaError.dbError, reverify=False)
+
+    return wrapper
+
+
+class AsyncDBAgent(DBAgent):
+    # upsert, query and advanceQuery are coroutines on an asyncio pool. Schema
+    # bootstrap and bulkUpsert stay on the blocking DBAgent pool, only the
+    # inherited streamQuery reads from replicas.
+    def __init__(self, cacheBackend=None):
+        super().__init__(cacheBackend)
+
+        self.asyncPool = AsyncConnectionPool(
+            self._establishAsyncConnection,
+            minSize=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            maxSize=int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "100")),
+            acquireTimeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5")),
+            idleTimeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+            pingInterval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+            name=f"{self.host}/{self.database} (async)",
+        )
+        if self.preparedStatements is not None:
+            # Coroutine reads use the text protocol, keep /stats truthful
+            logger.warning(
+                "DB_PREPARED_STATEMENTS has no effect in DB_MODE=async, using "
+                "plain text queries..."
+            )
+            self.preparedStatements = None
+        if self.replicas.enabled:
+            logger.warning(
+                "DB_REPLICA_HOSTS only routes streamed queries in DB_MODE=async, "
+                "query and advance query read from the primary..."
+            )
+
+    @lazyReverifyAsync
+    async def upsert(self, upsertInPayload):
+        logger.info(f"Upserting payload...")
+        try:
+            name, category, _ = upsertInPayload
+            async with self._connectionAsync() as connection:
+                async with await connection.cursor(buffered=True) as cursor:
+                    await cursor.execute(self._upsertQuery(), upsertInPayload)
+                    itemID = cursor.lastrowid
+                    upsertStatus = UPSERT_STATUS.get(cursor.rowcount, "updated")
+
+                    if not itemID:
+                        # Servers that do not report the id in the OK packet
+                        await cursor.execute(
+                            f"SELECT id FROM {self.table} WHERE name = %s", (name,)
+                        )
+                        itemID = (await cursor.fetchone())[0]
+
+                    if upsertStatus == "updated" and self.resultCache.enabled:
+                        # A duplicate keeps its stored category, not the payload's
+                        await cursor.execute(
+                            f"SELECT category FROM {self.table} WHERE id = %s",
+                            (itemID,),
+                        )
+                        category = (await cursor.fetchone())[0]
+
+                    await connection.commit()
+                    self.replicas.recordWrite()
+                    if upsertStatus != "unchanged":
+                        # After the commit, so a refill can only see the new row
+                        self.resultCache.invalidate(category)
+                    logger.info(f"Completed upserting payload - {upsertStatus}...")
+
+                    return itemID, upsertStatus
+
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
+
+    @lazyReverifyAsync
+    async def query(self, queryInPayload):
+        logger.info(f"Querying payload...")
+        hit, result, cacheKey = self.resultCache.lookup(
+            ("query", queryInPayload), tag=queryInPayload[2]
+        )
+        if hit:
+            return result
+
+        try:
+            async with self._connectionAsync() as connection:
+                async with await connection.cursor(buffered=True) as cursor:
+                    filterQuery, params = buildQuery(self.table, queryInPayload)
+                    await cursor.execute(filterQuery, params)
+
+                    result = await cursor.fetchall()
+                    await connection.commit()
+                    self.resultCache.store(cacheKey, result)
+                    logger.info(f"Completed querying payload...")
+
+                    return result
+
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
+
+    @lazyReverifyAsync
+    async def querySummary(self, queryInPayload, groupBy=None):
+        logger.info(f"Summarising query payload...")
+        hit, result, cacheKey = self.resultCache.lookup(
+            ("querySummary", queryInPayload, groupBy), tag=queryInPayload[2]
+        )
+        if hit:
+            return result
+
+        try:
+            async with self._connectionAsync() as connection:
+                async with await connection.cursor(buffered=True) as cursor:
+                    summaryQuery, params = buildQuerySummary(
+                        self.table, queryInPayload, groupBy
+                    )
+                    await cursor.execute(summaryQuery, params)
+
+                    result = await cursor.fetchall()
+                    await connection.commit()
+                    self.resultCache.store(cacheKey, result)
+                    logger.info(f"Completed summarising query payload...")
+
+                    return result
+
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
+
+    @lazyReverifyAsync
+    async def advanceQuery(self, advanceQueryInPayload):
+        logger.info(f"Querying advance payload...")
+        hit, resultTotal, cacheKey = self.resultCache.lookup(
+            ("advanceQuery", advanceQueryInPayload), tag=advanceQueryInPayload[1]
+        )
+        if hit:
+            return resultTotal
+
+        try:
+            async with self._connectionAsync() as connection:
+                async with await connection.cursor(buffered=True) as cursor:
+                    filterQuery, params = buildAdvanceQuery(
+                        self.table, advanceQueryInPayload
+                    )
+                    await cursor.execute(filterQuery, params)
+
+                    result = await cursor.fetchall()
+                    # Counted in the same snapshot as the page
+                    total = await self._advanceTotalAsync(
+                        cursor, advanceQueryInPayload, len(result)
+                    )
+                    await connection.commit()
+                    self.resultCache.store(cacheKey, (result, total))
+                    logger.info(f"Completed querying advance payload...")
+
+                    return result, total
+
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
+
+    def poolStats(self):
+        return self.asyncPool.stats()
+
+    def replicaStats(self):
+        # Only the inherited streamQuery is routed, the coroutine reads are not
+        return {**super().replicaStats(), "async_reads": "primary"}
+
+    @asynccontextmanager
+    async def _connectionAsync(self):
+        async with self.asyncPool.connection() as connection:
+            yield AsyncMeteredConnection(connection)
+
+    async def _advanceTotalAsync(self, cursor, advanceQueryInPayload, pageCount):
+        known, total = self._knownTotal(advanceQueryInPayload, pageCount)
+        if known:
+            return total
+
+        totalQuery, params = self._totalQuery(advanceQueryInPayload)
+        await cursor.execute(totalQuery, params)
+
+        return self._readTotal(
+            advanceQueryInPayload,
+            (totalQuery, params),
+            await cursor.fetchall(),
+            cursor.column_names,
+        )
+
+    async def _establishAsyncConnection(self):
+        host, port = self._address()
+        return await mysql.connector.aio.connect(
+            host=host,
+            port=port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+        )
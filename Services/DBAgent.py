@@ -3,160 +3,787 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import time
+import threading
+from decimal import Decimal
+from functools import wraps
+from contextlib import contextmanager
+
 import mysql.connector
+from mysql.connector import errorcode
+from mysql.connector.errors import PoolError
 from fastapi import status
 from fastapi.exceptions import HTTPException
 
 from Utils.Logger import createLogger
+from Utils.ConnectionPool import ConnectionPool
+from Utils.ResultCache import ResultCache, LocalCacheBackend, loadBackend
+from Utils.Metrics import MeteredConnection, MeteredCursor
+from Utils.PreparedStatements import PreparedStatementCache
+from Utils.ReplicaRouter import ReplicaRouter, ReplicaUnavailableError
+from Utils.QueryBuilder import (
+    buildQuery,
+    buildQuerySummary,
+    buildAdvanceQuery,
+    buildAdvanceCount,
+    buildChanges,
+)
+from Services.SchemaMigrations import (
+    MIGRATIONS,
+    LATEST_VERSION,
+    VERSION_TABLE,
+    SECONDARY_INDEXES,
+)
 
 # Logger
 logger = createLogger()
 logger.info("DBAgent's logger is warm...")
 
+# Affected rows of INSERT ... ON DUPLICATE KEY UPDATE (without CLIENT_FOUND_ROWS)
+UPSERT_STATUS = {1: "inserted", 2: "updated", 0: "unchanged"}
+
+# Lock conflicts that roll back a transaction which can simply run again
+RETRYABLE_LOCK_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+class SchemaMissingError(Exception):
+    def __init__(self, dbError):
+        super().__init__(str(dbError))
+        self.dbError = dbError
+
+
+def lazyReverify(method):
+    # Re-run the schema bootstrap once if the database or table went missing
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except SchemaMissingError as schemaError:
+            logger.warning(f"Schema missing ({schemaError}), re-verifying...")
+            self.bootstrap()
+
+        try:
+            return method(self, *args, **kwargs)
+        except SchemaMissingError as schemaError:
+            self._raiseDBError(schemaError.dbError, reverify=False)
+
+    return wrapper
+
+
+def replicaFailover(method):
+    # Retry a read once when its replica failed, the router now skips it
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except ReplicaUnavailableError as replicaError:
+            logger.warning(f"{replicaError}, retrying the read...")
+
+        try:
+            return method(self, *args, **kwargs)
+        except ReplicaUnavailableError as replicaError:
+            self._raiseDBError(replicaError.dbError, reverify=False)
+
+    return wrapper
+
+
+class RowStream:
+    # Yields fetchmany batches and owns the pooled connection until the last
+    # one. close(), or dropping it before it ever started, discards the
+    # connection, so a response cancelled before its first chunk cannot leak it.
+    def __init__(self, pool, connection, cursor, batchSize):
+        self.pool = pool
+        self.batchSize = batchSize
+        self._connection = connection
+        self._cursor = cursor
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._connection is None:
+            raise StopIteration
+
+        try:
+            rows = self._cursor.fetchmany(self.batchSize)
+            if rows:
+                return rows
+
+            self._cursor.close()
+            self._connection.commit()
+
+        except mysql.connector.Error as dbError:
+            logger.error(f"Database Error while streaming: {dbError}")
+            self.close()
+            raise
+
+        logger.info(f"Completed streaming query payload...")
+        self._release(discard=False)
+        raise StopIteration
+
+    def close(self):
+        # Unread rows would poison the next borrower, drop the connection
+        self._release(discard=True)
+
+    def __del__(self):
+        self.close()
+
+    def _release(self, discard):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self.pool.release(connection, discard=discard)
+
 
 class DBAgent:
-    def __init__(self):
+    def __init__(self, cacheBackend=None):
         self.host = os.getenv("DB_HOST")
         self.user = os.getenv("DB_USER")
         self.password = os.getenv("DB_PASSWORD")
         self.database = os.getenv("DB_DATABASE")
         self.table = os.getenv("DB_TABLE")
+        self.lazyReverify = os.getenv("DB_LAZY_REVERIFY", "0") == "1"
+        self.schemaVersion = None
+
+        # Exact advance-query totals reused by total_mode "cached"
+        self.countCacheTTL = float(os.getenv("DB_COUNT_CACHE_TTL", "30"))
+        self.countCacheSize = int(os.getenv("DB_COUNT_CACHE_SIZE", "1024"))
+        self._countCache = {}
+        self._countCacheLock = threading.Lock()
+
+        # Read-through cache of query/advanceQuery results, invalidated by writes.
+        # Opt-in: the local backend only sees this worker's writes, a shared one
+        # comes from cacheBackend or DB_RESULT_CACHE_BACKEND ("module:factory").
+        backendSpec = os.getenv("DB_RESULT_CACHE_BACKEND")
+        if cacheBackend is None and backendSpec:
+            cacheBackend = loadBackend(backendSpec)
+        self.resultCache = ResultCache(
+            ttl=float(os.getenv("DB_RESULT_CACHE_TTL", "0")),
+            maxSize=int(os.getenv("DB_RESULT_CACHE_SIZE", "1024")),
+            backend=cacheBackend,
+            name=f"{self.database}.{self.table}",
+        )
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        if (
+            self.resultCache.enabled
+            and workers > 1
+            and isinstance(self.resultCache.backend, LocalCacheBackend)
+        ):
+            logger.warning(
+                f"Result cache is per worker with {workers} workers, writes on "
+                f"one worker leave the others' results stale for up to "
+                f"{self.resultCache.ttl}s. Set DB_RESULT_CACHE_BACKEND to a shared "
+                "backend or DB_RESULT_CACHE_TTL=0."
+            )
+
+        # /changes leaves rows younger than this for the next poll, statements
+        # still running may yet commit rows stamped with an older second
+        self.changesSettleSeconds = int(os.getenv("DB_CHANGES_SETTLE_SECONDS", "2"))
+
+        # Rows per fetchmany round trip when streaming /query
+        self.streamBatchSize = int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+
+        # Rows per multi-row INSERT and rows per transaction for bulkUpsert
+        self.bulkChunkSize = int(os.getenv("DB_BULK_CHUNK_SIZE", "500"))
+        self.bulkTxnSize = int(os.getenv("DB_BULK_TXN_SIZE", "5000"))
+
+        # Times a group upsert is run again after a deadlock or lock wait timeout
+        self.deadlockRetries = int(os.getenv("DB_DEADLOCK_RETRIES", "3"))
 
+        # Opt-in server-side prepared statements for the request path SQL, kept
+        # per pooled connection. Saves parsing, costs a COM_STMT_RESET each.
+        self.preparedStatements = (
+            PreparedStatementCache(int(os.getenv("DB_PREPARED_CACHE_SIZE", "32")))
+            if os.getenv("DB_PREPARED_STATEMENTS", "0") == "1"
+            else None
+        )
+
+        # Connection pool shared by upsert, query and advanceQuery
+        self.pool = self._createPool(self.host)
+
+        # Read replicas (host or host:port) with a pool each, reads go there
+        # unless the session wrote within DB_REPLICA_STICKY_SECONDS
+        replicaHosts = os.getenv("DB_REPLICA_HOSTS", "")
+        self.replicas = ReplicaRouter(
+            [
+                self._createPool(host.strip())
+                for host in replicaHosts.split(",")
+                if host.strip()
+            ],
+            stickySeconds=float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5")),
+            cooldown=float(os.getenv("DB_REPLICA_COOLDOWN", "5")),
+        )
+
+    @lazyReverify
     def upsert(self, upsertInPayload):
         logger.info(f"Upserting payload...")
         try:
-            self._verifyDatabase()
-            self._verifyTable()
-            name, _, _ = upsertInPayload
-            connection = self._establishConnection(useDatabase=True)
-            cursor = connection.cursor(buffered=True)
-
-            insertQuery = f"""
-            INSERT INTO {self.table} (name, category, price)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                price = VALUES(price),
-                last_updated_dt = NOW()
-            """
+            name, category, _ = upsertInPayload
+            with self._connection() as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                _, upserted = self._run(
+                    connection, cursor, self._upsertQuery(), upsertInPayload
+                )
+                itemID = upserted.lastrowid
+                upsertStatus = UPSERT_STATUS.get(upserted.rowcount, "updated")
+
+                if not itemID:
+                    # Servers that do not report the id in the OK packet
+                    rows, _ = self._run(
+                        connection,
+                        cursor,
+                        f"SELECT id FROM {self.table} WHERE name = %s",
+                        (name,),
+                    )
+                    itemID = rows[0][0]
+
+                if upsertStatus == "updated" and self.resultCache.enabled:
+                    # A duplicate keeps its stored category, not the payload's
+                    rows, _ = self._run(
+                        connection,
+                        cursor,
+                        f"SELECT category FROM {self.table} WHERE id = %s",
+                        (itemID,),
+                    )
+                    category = rows[0][0]
+
+                connection.commit()
+                self.replicas.recordWrite()
+                if upsertStatus != "unchanged":
+                    # After the commit, so a refill can only see the new row
+                    self.resultCache.invalidate(category)
+                logger.info(f"Completed upserting payload - {upsertStatus}...")
+
+                return itemID, upsertStatus
 
-            cursor.execute(insertQuery, upsertInPayload)
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
 
-            searchQuery = f"""
-            SELECT id FROM {self.table}
-            WHERE name = %s
-            """
+    @lazyReverify
+    def bulkUpsert(self, bulkUpsertInPayload):
+        logger.info(f"Bulk upserting {len(bulkUpsertInPayload)} payloads...")
+        itemIDs, failures = {}, {}
+        if not bulkUpsertInPayload:
+            return itemIDs, failures
 
-            cursor.execute(searchQuery, (name,))
-            itemID = cursor.fetchone()
-            connection.commit()
-            logger.info(f"Completed upserting payload...")
-
-            return itemID
+        try:
+            with self._connection() as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                uncommitted, openedAt = 0, time.monotonic()
+                for chunkStart in range(
+                    0, len(bulkUpsertInPayload), self.bulkChunkSize
+                ):
+                    chunk = bulkUpsertInPayload[
+                        chunkStart : chunkStart + self.bulkChunkSize
+                    ]
+                    for index, rowError in self._upsertIsolated(
+                        cursor, chunk, itemIDs
+                    ).items():
+                        failures[index] = f"Database Error: {rowError}"
+
+                    # Rows are stamped when written but seen at commit, /changes
+                    # only waits changesSettleSeconds for them: commit early
+                    uncommitted += len(chunk)
+                    if (
+                        uncommitted >= self.bulkTxnSize
+                        or time.monotonic() - openedAt >= self.changesSettleSeconds / 2
+                    ):
+                        self._commitBulk(connection, openedAt)
+                        uncommitted, openedAt = 0, time.monotonic()
+
+                if uncommitted:
+                    self._commitBulk(connection, openedAt)
+                logger.info(
+                    f"Completed bulk upserting payloads - "
+                    f"{len(itemIDs)} upserted, {len(failures)} failed..."
+                )
+
+                return itemIDs, failures
 
         except mysql.connector.Error as dbError:
-            eMsg = f"Database Error: {dbError}"
-            logger.error(eMsg)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=eMsg,
-            )
+            self._raiseDBError(dbError)
 
         finally:
-            if "cursor" in locals():
-                cursor.close()
-            if "connection" in locals() and connection.is_connected():
-                connection.close()
+            # Earlier transactions may be committed even when a later one failed
+            self.replicas.recordWrite()
+            self.resultCache.invalidateAll()
+
+    @lazyReverify
+    def groupUpsert(self, upsertInPayloads):
+        # Upserts buffered together (API_GROUP_COMMIT) share one multi-row
+        # statement and one commit. Rows keep their arrival order, so the last
+        # write of a name wins. [(itemID, status) or HTTPException] in order.
+        logger.info(f"Group upserting {len(upsertInPayloads)} payloads...")
+        chunk = list(enumerate(upsertInPayloads))
+        for attempt in range(self.deadlockRetries + 1):
+            itemIDs = {}
+            try:
+                stored, failures = self._groupUpsertTxn(chunk, itemIDs)
+                break
+
+            except mysql.connector.Error as dbError:
+                # Concurrent batches locking the same gaps for new names: InnoDB
+                # rolled this one back, run it again from the start
+                if (
+                    dbError.errno in RETRYABLE_LOCK_ERRORS
+                    and attempt < self.deadlockRetries
+                ):
+                    logger.warning(f"{dbError}, retrying the group upsert...")
+                    time.sleep(0.01 * (attempt + 1))
+                    continue
+                self._raiseDBError(dbError)
+
+        results, touched = [], set()
+        for index, (_, category, price) in chunk:
+            if index in failures:
+                try:
+                    self._raiseDBError(failures[index], reverify=False)
+                except HTTPException as httpError:
+                    results.append(httpError)
+                continue
+
+            itemID = itemIDs[index]
+            previous = stored.get(itemID)
+            if previous is None:
+                upsertStatus = "inserted"
+            elif previous[1] == Decimal(price):
+                upsertStatus = "unchanged"
+            else:
+                upsertStatus = "updated"
+
+            # A duplicate keeps its stored category, not the payload's
+            category = previous[0] if previous else category
+            stored[itemID] = (category, Decimal(price))
+            if upsertStatus != "unchanged":
+                touched.add(category)
+            results.append((itemID, upsertStatus))
+
+        for category in touched:
+            self.resultCache.invalidate(category)
+        logger.info(
+            f"Completed group upserting payloads - "
+            f"{len(itemIDs)} upserted, {len(failures)} failed..."
+        )
+
+        return results
+
+    def _groupUpsertTxn(self, chunk, itemIDs):
+        # (stored rows before the write, {index: error}) of one transaction
+        with self._connection() as connection, connection.cursor(
+            buffered=True
+        ) as cursor:
+            # Rows before the write, to tell the status of each upsert. Locked
+            # (gaps included) so no other writer can upsert these names first.
+            names = sorted({name for _, (name, _, _) in chunk})
+            cursor.execute(
+                f"SELECT id, category, price FROM {self.table} "
+                f"WHERE name IN ({', '.join(['%s'] * len(names))}) FOR UPDATE",
+                names,
+            )
+            stored = {row[0]: row[1:] for row in cursor.fetchall()}
+
+            failures = self._upsertIsolated(cursor, chunk, itemIDs)
+            connection.commit()
 
+            return stored, failures
+
+    @lazyReverify
+    @replicaFailover
     def query(self, queryInPayload):
         logger.info(f"Querying payload...")
+        hit, result, cacheKey = self.resultCache.lookup(
+            ("query", queryInPayload), tag=queryInPayload[2]
+        )
+        if hit:
+            return result
+
+        replica = self.replicas.choose()
         try:
-            self._verifyDatabase()
-            self._verifyTable()
-            connection = self._establishConnection(useDatabase=True)
-            cursor = connection.cursor(buffered=True)
-
-            filterQuery = f"""
-            SELECT id, name, category, price FROM {self.table}
-            WHERE
-                last_updated_dt BETWEEN 
-                    COALESCE(%s, '1000-01-01') AND 
-                    COALESCE(%s, '9999-12-31')
-                AND (category = %s OR %s IS NULL)
-            """
+            with self._connection(replica) as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                filterQuery, params = buildQuery(self.table, queryInPayload)
+                result, _ = self._run(connection, cursor, filterQuery, params)
 
-            cursor.execute(filterQuery, queryInPayload)
+                connection.commit()
+                self._storeResult(cacheKey, result, replica)
+                logger.info(f"Completed querying payload...")
 
-            result = cursor.fetchall()
-            connection.commit()
-            logger.info(f"Completed querying payload...")
+                return result
 
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
+
+    @lazyReverify
+    @replicaFailover
+    def querySummary(self, queryInPayload, groupBy=None):
+        logger.info(f"Summarising query payload...")
+        hit, result, cacheKey = self.resultCache.lookup(
+            ("querySummary", queryInPayload, groupBy), tag=queryInPayload[2]
+        )
+        if hit:
             return result
 
+        replica = self.replicas.choose()
+        try:
+            with self._connection(replica) as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                summaryQuery, params = buildQuerySummary(
+                    self.table, queryInPayload, groupBy
+                )
+                result, _ = self._run(connection, cursor, summaryQuery, params)
+
+                connection.commit()
+                self._storeResult(cacheKey, result, replica)
+                logger.info(f"Completed summarising query payload...")
+
+                return result
+
         except mysql.connector.Error as dbError:
-            eMsg = f"Database Error: {dbError}"
-            logger.error(eMsg)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=eMsg,
-            )
+            self._raiseDBError(dbError)
+
+    @lazyReverify
+    @replicaFailover
+    def streamQuery(self, queryInPayload):
+        logger.info(f"Streaming query payload...")
+        replica = self.replicas.choose()
+        pool = self.pool if replica is None else replica.pool
+        try:
+            filterQuery, params = buildQuery(self.table, queryInPayload)
+            connection = pool.acquire()
+            try:
+                # Unbuffered: rows stay on the server until fetched
+                cursor = MeteredCursor(connection.cursor(buffered=False), False)
+                cursor.execute(filterQuery, params)
+            except BaseException:
+                pool.release(connection, discard=True)
+                raise
+
+        except (
+            mysql.connector.errors.OperationalError,
+            mysql.connector.errors.InterfaceError,
+        ) as dbError:
+            if replica is not None:
+                self.replicas.fail(replica, dbError)
+            self._raiseDBError(dbError)
 
-        finally:
-            if "cursor" in locals():
-                cursor.close()
-            if "connection" in locals() and connection.is_connected():
-                connection.close()
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
+
+        # Executed eagerly so errors surface before the response starts
+        return RowStream(pool, connection, cursor, self.streamBatchSize)
 
+    @lazyReverify
+    @replicaFailover
     def advanceQuery(self, advanceQueryInPayload):
         logger.info(f"Querying advance payload...")
+        hit, resultTotal, cacheKey = self.resultCache.lookup(
+            ("advanceQuery", advanceQueryInPayload), tag=advanceQueryInPayload[1]
+        )
+        if hit:
+            return resultTotal
+
+        replica = self.replicas.choose()
         try:
-            self._verifyDatabase()
-            self._verifyTable()
-            connection = self._establishConnection(useDatabase=True)
-            cursor = connection.cursor(buffered=True)
-
-            advanceQueryInPayload, sortDirection = (
-                advanceQueryInPayload[:-1],
-                advanceQueryInPayload[-1],
-            )
+            with self._connection(replica) as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                filterQuery, params = buildAdvanceQuery(
+                    self.table, advanceQueryInPayload
+                )
+                result, _ = self._run(connection, cursor, filterQuery, params)
+
+                # Counted in the same snapshot as the page
+                total = self._advanceTotal(
+                    connection, cursor, advanceQueryInPayload, len(result)
+                )
+                connection.commit()
+                self._storeResult(cacheKey, (result, total), replica)
+                logger.info(f"Completed querying advance payload...")
+
+                return result, total
 
-            orderDirection = "ASC" if sortDirection == "asc" else "DESC"
-
-            filterQuery = f"""
-            SELECT id, name, category, price 
-            FROM {self.table}
-            WHERE 
-                (%s IS NULL OR name = %s)
-                AND (%s IS NULL OR category = %s)
-                AND CAST(price AS DECIMAL(10, 2)) BETWEEN %s AND %s
-            ORDER BY 
-                CASE WHEN %s = 'price' THEN CAST(price AS DECIMAL(10, 2)) END 
-                    * {'1' if orderDirection == 'ASC' else '-1'},
-                CASE WHEN %s = 'category' THEN category END {orderDirection},
-                CASE WHEN %s = 'name' THEN name END {orderDirection}
-            LIMIT %s OFFSET %s;
-            """
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError)
 
-            cursor.execute(filterQuery, advanceQueryInPayload)
+    @lazyReverify
+    def changes(self, changesInPayload):
+        # Primary only: on a lagging replica the cursor could pass rows that
+        # replica has not applied yet, and they would never be sent
+        logger.info(f"Reading changes...")
+        try:
+            with self._connection() as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                changesQuery, params = buildChanges(
+                    self.table, changesInPayload, self.changesSettleSeconds
+                )
+                result, _ = self._run(connection, cursor, changesQuery, params)
 
-            result = cursor.fetchall()
-            connection.commit()
-            logger.info(f"Completed querying advance payload...")
+                connection.commit()
+                logger.info(f"Completed reading changes - {len(result)} rows...")
 
-            return result
+                return result
 
         except mysql.connector.Error as dbError:
-            eMsg = f"Database Error: {dbError}"
-            logger.error(eMsg)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=eMsg,
+            self._raiseDBError(dbError)
+
+    def bootstrap(self):
+        logger.info(f"Bootstrapping schema - {self.database}.{self.table}...")
+        self._verifyDatabase()
+        lockName = f"{self.database}.{self.table}.schema"
+        try:
+            with self.pool.connection() as connection, connection.cursor(
+                buffered=True
+            ) as cursor:
+                # Serialise concurrent bootstraps from several workers/hosts
+                cursor.execute("SELECT GET_LOCK(%s, 60)", (lockName,))
+                if cursor.fetchone()[0] != 1:
+                    raise mysql.connector.errors.OperationalError(
+                        f"Timed out waiting for schema lock {lockName}"
+                    )
+
+                try:
+                    self.schemaVersion = self._migrate(connection, cursor)
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", (lockName,))
+                    cursor.fetchone()
+
+                connection.commit()
+                logger.info(
+                    f"Completed bootstrapping schema - version {self.schemaVersion}..."
+                )
+
+                return self.schemaVersion
+
+        except mysql.connector.Error as dbError:
+            self._raiseDBError(dbError, reverify=False)
+
+    def poolStats(self):
+        return self.pool.stats()
+
+    def replicaStats(self):
+        return self.replicas.stats()
+
+    def preparedStats(self):
+        if self.preparedStatements is None:
+            return {"enabled": False}
+        return self.preparedStatements.stats()
+
+    def cacheStats(self):
+        return self.resultCache.stats()
+
+    def _migrate(self, connection, cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            table_name VARCHAR(64) NOT NULL,
+            version INT NOT NULL,
+            description VARCHAR(255) NOT NULL,
+            applied_dt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, version)
             )
+            """)
 
-        finally:
-            if "cursor" in locals():
-                cursor.close()
-            if "connection" in locals() and connection.is_connected():
-                connection.close()
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            """,
+            (self.table,),
+        )
+        tableExisted = cursor.fetchone()[0] > 0
+        cursor.execute(self._tableDefinition())
+
+        cursor.execute(
+            f"SELECT version FROM {VERSION_TABLE} WHERE table_name = %s",
+            (self.table,),
+        )
+        appliedVersions = {row[0] for row in cursor.fetchall()}
+
+        for version, description, migration in MIGRATIONS:
+            if version in appliedVersions:
+                continue
+
+            # A freshly created table already has the latest shape
+            if tableExisted:
+                logger.info(f"Applying schema migration {version} - {description}...")
+                migration(connection, cursor, self.table)
+
+            cursor.execute(
+                f"""
+                INSERT INTO {VERSION_TABLE} (table_name, version, description)
+                VALUES (%s, %s, %s)
+                """,
+                (self.table, version, description),
+            )
+
+        return LATEST_VERSION
+
+    @contextmanager
+    def _connection(self, replica=None):
+        # Pooled connection whose statements are timed for /metrics, from the
+        # primary unless a replica was chosen for the read
+        pooled = (
+            self.pool.connection()
+            if replica is None
+            else self.replicas.connection(replica)
+        )
+        with pooled as connection:
+            yield MeteredConnection(connection)
+
+    def _storeResult(self, cacheKey, result, replica):
+        # A lagging replica could refill the cache with rows a write replaced
+        if replica is None or self.replicas.settled():
+            self.resultCache.store(cacheKey, result)
+
+    def _run(self, connection, cursor, statement, params=None, prepare=True):
+        # (rows, cursor that ran it) - a prepared statement of this connection
+        # when enabled, the buffered text protocol cursor otherwise
+        if prepare and self.preparedStatements is not None:
+            return self.preparedStatements.execute(connection, statement, params)
+
+        cursor.execute(statement, params)
+        return (cursor.fetchall() if cursor.with_rows else []), cursor
+
+    def _upsertQuery(self, rowCount=1):
+        # LAST_INSERT_ID(id) hands back the existing id on a duplicate,
+        # last_updated_dt only moves when the price actually changes
+        values = ", ".join(["(%s, %s, %s)"] * rowCount)
+        return f"""
+        INSERT INTO {self.table} (name, category, price)
+        VALUES {values}
+        ON DUPLICATE KEY UPDATE
+            id = LAST_INSERT_ID(id),
+            price = VALUES(price)
+        """
+
+    def _commitBulk(self, connection, openedAt):
+        connection.commit()
+        openSeconds = time.monotonic() - openedAt
+        if openSeconds >= self.changesSettleSeconds:
+            logger.warning(
+                f"Bulk upsert transaction was open for {openSeconds:.1f}s, "
+                f"longer than DB_CHANGES_SETTLE_SECONDS="
+                f"{self.changesSettleSeconds}, /changes may have skipped its rows..."
+            )
+
+    def _upsertIsolated(self, cursor, chunk, itemIDs):
+        # {index: error} of the rows that failed, the others are upserted
+        try:
+            self._upsertChunk(cursor, chunk, itemIDs)
+            return {}
+        except (
+            mysql.connector.errors.DataError,
+            mysql.connector.errors.IntegrityError,
+        ):
+            pass
+
+        # InnoDB undid the failed statement only, isolate bad rows
+        failures = {}
+        for row in chunk:
+            try:
+                self._upsertChunk(cursor, [row], itemIDs)
+            except (
+                mysql.connector.errors.DataError,
+                mysql.connector.errors.IntegrityError,
+            ) as rowError:
+                failures[row[0]] = rowError
+
+        return failures
+
+    def _upsertChunk(self, cursor, chunk, itemIDs):
+        cursor.execute(
+            self._upsertQuery(len(chunk)),
+            [value for _, row in chunk for value in row],
+        )
+
+        names = {row[0] for _, row in chunk}
+        cursor.execute(
+            f"SELECT name, id FROM {self.table} "
+            f"WHERE name IN ({', '.join(['%s'] * len(names))})",
+            list(names),
+        )
+        nameIDs = dict(cursor.fetchall())
+
+        for index, (name, _, _) in chunk:
+            if name not in nameIDs:
+                # Stored under a collation-equal spelling, e.g. different case
+                cursor.execute(f"SELECT id FROM {self.table} WHERE name = %s", (name,))
+                nameIDs[name] = cursor.fetchone()[0]
+            itemIDs[index] = nameIDs[name]
+
+    def _advanceTotal(self, connection, cursor, advanceQueryInPayload, pageCount):
+        known, total = self._knownTotal(advanceQueryInPayload, pageCount)
+        if known:
+            return total
+
+        totalQuery, params = self._totalQuery(advanceQueryInPayload)
+        # EXPLAIN estimates stay on the text protocol
+        rows, executed = self._run(
+            connection,
+            cursor,
+            totalQuery,
+            params,
+            prepare=advanceQueryInPayload[10] != "estimate",
+        )
+
+        return self._readTotal(
+            advanceQueryInPayload, (totalQuery, params), rows, executed.column_names
+        )
+
+    def _knownTotal(self, advanceQueryInPayload, pageCount):
+        # (known, total) without touching the database
+        pagLimit, pagOffset, _, afterID, totalMode = advanceQueryInPayload[6:11]
+
+        if totalMode == "none":
+            return True, None
+
+        # A short (or empty first) offset page already pins the total down
+        if afterID is None and pageCount < pagLimit and (pageCount or not pagOffset):
+            return True, pagOffset + pageCount
+
+        if totalMode == "cached":
+            with self._countCacheLock:
+                cached = self._countCache.get(
+                    buildAdvanceCount(self.table, advanceQueryInPayload)
+                )
+            if cached and cached[1] > time.monotonic():
+                return True, cached[0]
+
+        return False, None
+
+    def _totalQuery(self, advanceQueryInPayload):
+        return buildAdvanceCount(
+            self.table,
+            advanceQueryInPayload,
+            estimate=advanceQueryInPayload[10] == "estimate",
+        )
+
+    def _readTotal(self, advanceQueryInPayload, cacheKey, rows, columns):
+        totalMode = advanceQueryInPayload[10]
+
+        if totalMode == "estimate":
+            plan = rows[0]
+            estimatedRows = plan[columns.index("rows")] or 0
+            filtered = plan[columns.index("filtered")] if "filtered" in columns else 100
+            return int(estimatedRows * float(filtered or 100) / 100)
+
+        total = rows[0][0]
+
+        if totalMode == "cached":
+            with self._countCacheLock:
+                self._countCache.pop(cacheKey, None)
+                if len(self._countCache) >= self.countCacheSize:
+                    # Oldest entry first, dicts keep insertion order
+                    self._countCache.pop(next(iter(self._countCache)))
+                self._countCache[cacheKey] = (
+                    total,
+                    time.monotonic() + self.countCacheTTL,
+                )
+
+        return total
 
     def _verifyDatabase(self):
         logger.info(f"Verifying/Creating database - {self.database}...")
@@ -168,12 +795,7 @@ class DBAgent:
             logger.info(f"Completed verifying/creating database - {self.database}...")
 
         except mysql.connector.Error as dbError:
-            eMsg = f"Database Error: {dbError}"
-            logger.error(eMsg)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=eMsg,
-            )
+            self._raiseDBError(dbError, reverify=False)
 
         finally:
             if "cursor" in locals():
@@ -181,44 +803,67 @@ class DBAgent:
             if "connection" in locals() and connection.is_connected():
                 connection.close()
 
-    def _verifyTable(self):
-        logger.info(f"Verifying/Creating table - {self.table}...")
-        try:
-            connection = self._establishConnection(useDatabase=True)
-            cursor = connection.cursor()
+    def _tableDefinition(self):
+        # Latest table shape, kept in step with the last entry of MIGRATIONS
+        indexes = ",\n".join(
+            f"INDEX {index} ({columns})" for index, columns in SECONDARY_INDEXES
+        )
+        return f"""
+        CREATE TABLE IF NOT EXISTS {self.table} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL UNIQUE,
+        category VARCHAR(100) NOT NULL,
+        price DECIMAL(10, 2) NOT NULL,
+        last_updated_dt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        {indexes}
+        )
+        """
+
+    def _createPool(self, host):
+        return ConnectionPool(
+            lambda: self._establishConnection(useDatabase=True, host=host),
+            minSize=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            maxSize=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            acquireTimeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5")),
+            idleTimeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+            pingInterval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+            name=f"{host}/{self.database}",
+        )
 
-            query = f"""
-            CREATE TABLE IF NOT EXISTS {self.table} (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(100) NOT NULL UNIQUE,
-            category VARCHAR(100) NOT NULL,
-            price VARCHAR(100) NOT NULL,
-            last_updated_dt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-            """
+    def _address(self, host=None):
+        # DB_HOST and DB_REPLICA_HOSTS entries are host or host:port
+        host, _, port = (host or self.host or "127.0.0.1").partition(":")
+        return host, int(port or 3306)
 
-            cursor.execute(query)
-            connection.commit()
-            logger.info(f"Completed verifying/creating table - {self.table}...")
+    def _establishConnection(self, useDatabase=None, host=None):
+        host, port = self._address(host)
+        return mysql.connector.connect(
+            host=host,
+            port=port,
+            user=self.user,
+            password=self.password,
+            database=self.database if useDatabase else None,
+        )
 
-        except mysql.connector.Error as dbError:
-            eMsg = f"Database Error: {dbError}"
+    def _raiseDBError(self, dbError, reverify=True):
+        if (
+            reverify
+            and self.lazyReverify
+            and dbError.errno in (errorcode.ER_NO_SUCH_TABLE, errorcode.ER_BAD_DB_ERROR)
+        ):
+            raise SchemaMissingError(dbError)
+
+        if isinstance(dbError, PoolError):
+            eMsg = f"Database Unavailable: {dbError}"
             logger.error(eMsg)
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=eMsg,
             )
 
-        finally:
-            if "cursor" in locals():
-                cursor.close()
-            if "connection" in locals() and connection.is_connected():
-                connection.close()
-
-    def _establishConnection(self, useDatabase=None):
-        return mysql.connector.connect(
-            host=self.host,
-            user=self.user,
-            password=self.password,
-            database=self.database if useDatabase else None,
+        eMsg = f"Database Error: {dbError}"
+        logger.error(eMsg)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=eMsg,
         )
@@ -3,18 +3,40 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from Utils.Logger import createLogger
+import json
+import base64
 from datetime import datetime
+from fastapi import status
+from fastapi.exceptions import HTTPException
+from pydantic import ValidationError
+
+from Utils.Logger import createLogger
+from Utils.Metrics import timed
+from Utils.Schemas import VAL_UPSERT
+from Utils.Serializers import dumps
 
 # Logger
 logger = createLogger()
 logger.info("PackagingAgent's logger is warm...")
 
+# Row position of each sortable field in (id, name, category, price)
+SORT_FIELD_INDEX = {"name": 1, "category": 2, "price": 3}
+
+# /changes positions: MySQL DATETIME text and the earliest DATETIME
+CHANGES_DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHANGES_EPOCH = datetime(1000, 1, 1)
+
+# Upper bound of items accepted by a single /upsert/bulk request
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "100000"))
+# Upper bound of its body, checked while reading, before anything is parsed
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(32 * 1024 * 1024)))
+
 
 class PackagingAgent:
     def __init__(self):
         pass
 
+    @timed("packaging")
     def upsertIn(self, upsertInPayload):
         logger.info("Packaging upsertIn payload...")
         return (
@@ -23,10 +45,61 @@ class PackagingAgent:
             f"{upsertInPayload.get('price'):.2f}",
         )
 
+    @timed("packaging")
     def upsertOut(self, upsertOutPayload):
         logger.info("Packaging upsertOut payload...")
-        return {"id": upsertOutPayload[0]}
+        itemID, upsertStatus = upsertOutPayload
+        return {"id": itemID, "status": upsertStatus}
+
+    @timed("packaging")
+    def bulkUpsertIn(self, bulkUpsertInBody, contentType=""):
+        logger.info("Packaging bulkUpsertIn payload...")
+        rawItems, failures = self._parseBulkBody(bulkUpsertInBody, contentType)
+
+        if len(rawItems) > BULK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Bulk upsert accepts at most {BULK_MAX_ITEMS} items.",
+            )
+
+        # (input index, upsert row) for every item that passed validation
+        bulkUpsertInPayload = []
+        for index, rawItem in enumerate(rawItems):
+            if index in failures:
+                continue
+            try:
+                item = VAL_UPSERT.model_validate(rawItem)
+            except ValidationError as validationError:
+                failures[index] = "; ".join(
+                    f"{'.'.join(str(loc) for loc in error['loc']) or 'item'}: "
+                    f"{error['msg']}"
+                    for error in validationError.errors()
+                )
+                continue
+
+            bulkUpsertInPayload.append(
+                (
+                    index,
+                    (item.name.strip(), item.category.strip(), f"{item.price:.2f}"),
+                )
+            )
 
+        return len(rawItems), bulkUpsertInPayload, failures
+
+    @timed("packaging")
+    def bulkUpsertOut(self, itemCount, itemIDs, failures):
+        logger.info("Packaging bulkUpsertOut payload...")
+        return {
+            "ids": [itemIDs.get(index) for index in range(itemCount)],
+            "failures": [
+                {"index": index, "detail": failures[index]}
+                for index in sorted(failures)
+            ],
+            "upserted": len(itemIDs),
+            "failed": len(failures),
+        }
+
+    @timed("packaging")
     def queryIn(self, queryInPayload):
         logger.info("Packaging queryIn payload...")
         dt_from = (
@@ -48,25 +121,75 @@ class PackagingAgent:
             dt_from,
             dt_to,
             category,
-            category,
         )
 
-    def queryOut(self, queryOutPayload):
+    @timed("packaging")
+    def queryOut(self, queryOutPayload, layout="items"):
         logger.info("Packaging queryOut payload...")
-        totalPrice = sum(float(item[3]) for item in queryOutPayload)
+        totalPrice = sum(item[3] for item in queryOutPayload)
         return {
-            "items": [
-                {
-                    "id": item[0],
-                    "name": item[1],
-                    "category": item[2],
-                    "price": float(item[3]),
-                }
-                for item in queryOutPayload
-            ],
+            **self._itemsOut(queryOutPayload, layout),
             "total_price": round(totalPrice, 2),
         }
 
+    @timed("packaging")
+    def querySummaryOut(self, querySummaryOutPayload, groupBy=None):
+        logger.info("Packaging querySummaryOut payload...")
+        # DECIMAL sums from MySQL, only turned into JSON numbers at the edge
+        if groupBy is None:
+            count, totalPrice = querySummaryOutPayload[0]
+            return {"count": count, "total_price": float(totalPrice)}
+
+        groups = [
+            {groupBy: group, "count": count, "total_price": float(totalPrice)}
+            for group, count, totalPrice in querySummaryOutPayload
+        ]
+        return {
+            "count": sum(count for _, count, _ in querySummaryOutPayload),
+            "total_price": float(
+                sum((totalPrice for _, _, totalPrice in querySummaryOutPayload), 0)
+            ),
+            "groups": groups,
+        }
+
+    def queryStreamOut(self, queryOutBatches, streamFormat="json"):
+        logger.info(f"Packaging queryOut stream as {streamFormat}...")
+        totalPrice = 0
+        separator = b", " if streamFormat == "json" else b"\n"
+        first = True
+
+        if streamFormat == "json":
+            yield b'{"items": ['
+
+        for batch in queryOutBatches:
+            chunk = separator.join(
+                [
+                    dumps(
+                        {
+                            "id": item[0],
+                            "name": item[1],
+                            "category": item[2],
+                            "price": item[3],
+                        }
+                    )
+                    for item in batch
+                ]
+            )
+            totalPrice += sum(item[3] for item in batch)
+
+            if streamFormat == "json":
+                yield chunk if first else separator + chunk
+            else:
+                yield chunk + separator
+            first = False
+
+        # Totals trail the items, the response never holds the full result
+        if streamFormat == "json":
+            yield b'], "total_price": ' + dumps(round(totalPrice, 2)) + b"}"
+        else:
+            yield dumps({"total_price": round(totalPrice, 2)}) + separator
+
+    @timed("packaging")
     def advanceQueryIn(self, advanceQueryInPayload):
         logger.info("Packaging advanceQueryIn payload...")
 
@@ -84,38 +207,226 @@ class PackagingAgent:
         maxPrice = round(advanceQueryInPayload.get("filters").get("price_range")[1], 2)
         pagLimit = advanceQueryInPayload.get("pagination").get("limit")
         pagPage = advanceQueryInPayload.get("pagination").get("page")
+        pagMode = advanceQueryInPayload.get("pagination").get("mode", "offset")
+        pagCursor = advanceQueryInPayload.get("pagination").get("cursor")
+        pagTotalMode = advanceQueryInPayload.get("pagination").get(
+            "total_mode", "exact"
+        )
         sortField = advanceQueryInPayload.get("sort").get("field")
         sortOrder = advanceQueryInPayload.get("sort").get("order")
 
+        # Keyset mode: seek past the last (sort key, id) instead of OFFSET
+        if pagMode == "cursor":
+            afterKey, afterID = (
+                self._decodeCursor(pagCursor, sortField, sortOrder)
+                if pagCursor
+                else (None, None)
+            )
+            pagOffset = 0
+        else:
+            afterKey, afterID = None, None
+            pagOffset = (pagPage - 1) * pagLimit
+
         return (
             name,
-            name,
-            category,
             category,
             minPrice,
             maxPrice,
             sortField,
-            sortField,
-            sortField,
-            pagLimit,
-            (pagPage - 1) * pagLimit,
             sortOrder,
+            pagLimit,
+            pagOffset,
+            afterKey,
+            afterID,
+            pagTotalMode,
         )
 
-    def advanceQueryOut(self, advanceQueryOutPayload, advanceQueryInPayload):
+    @timed("packaging")
+    def advanceQueryOut(
+        self, advanceQueryOutPayload, advanceQueryInPayload, layout="items"
+    ):
         logger.info("Packaging advanceQueryOut payload...")
+        advanceQueryOutPayload, total = advanceQueryOutPayload
         totalCount = len(advanceQueryOutPayload)
+        response = {
+            **self._itemsOut(advanceQueryOutPayload, layout),
+            "count": totalCount,
+            "total": total,
+            "page": advanceQueryInPayload.get("pagination").get("page"),
+            "limit": advanceQueryInPayload.get("pagination").get("limit"),
+        }
+
+        if advanceQueryInPayload.get("pagination").get("mode") == "cursor":
+            # A short page means the end of the result set
+            hasMore = totalCount == advanceQueryInPayload.get("pagination").get("limit")
+            response["next_cursor"] = (
+                self._encodeCursor(
+                    advanceQueryOutPayload[-1],
+                    advanceQueryInPayload.get("sort").get("field"),
+                    advanceQueryInPayload.get("sort").get("order"),
+                )
+                if hasMore and advanceQueryOutPayload
+                else None
+            )
+
+        return response
+
+    @timed("packaging")
+    def changesIn(self, changesInPayload):
+        logger.info("Packaging changesIn payload...")
+        if changesInPayload.get("cursor"):
+            afterDT, afterID = self._decodeChangesCursor(changesInPayload.get("cursor"))
+        else:
+            # Everything updated at or after since, ids start at 1
+            since = changesInPayload.get("since") or CHANGES_EPOCH
+            afterDT, afterID = datetime.strftime(since, CHANGES_DT_FORMAT), 0
+
+        return afterDT, afterID, changesInPayload.get("limit")
+
+    @timed("packaging")
+    def changesOut(self, changesOutPayload, changesInPayload):
+        logger.info("Packaging changesOut payload...")
+        afterDT, afterID, limit = changesInPayload
+        items = [
+            {
+                "id": row[0],
+                "name": row[1],
+                "category": row[2],
+                "price": row[3],
+                "last_updated_dt": datetime.strftime(row[4], CHANGES_DT_FORMAT),
+            }
+            for row in changesOutPayload
+        ]
+        if items:
+            afterDT, afterID = items[-1]["last_updated_dt"], items[-1]["id"]
+
+        return {
+            "items": items,
+            "count": len(items),
+            # Returned even when empty, polling resumes from the same position
+            "next_cursor": self._encodeChangesCursor(afterDT, afterID),
+            "has_more": len(items) == limit,
+        }
+
+    def _itemsOut(self, rows, layout):
+        if layout == "columnar":
+            # Parallel arrays, keys are sent once instead of once per row
+            ids, names, categories, prices = (
+                [list(column) for column in zip(*rows)] if rows else [[], [], [], []]
+            )
+            return {
+                "ids": ids,
+                "names": names,
+                "categories": categories,
+                "prices": prices,
+            }
+
         return {
             "items": [
                 {
                     "id": item[0],
                     "name": item[1],
                     "category": item[2],
-                    "price": float(item[3]),
+                    "price": item[3],
                 }
-                for item in advanceQueryOutPayload
-            ],
-            "count": totalCount,
-            "page": advanceQueryInPayload.get("pagination").get("page"),
-            "limit": advanceQueryInPayload.get("pagination").get("limit"),
+                for item in rows
+            ]
         }
+
+    def _parseBulkBody(self, bulkUpsertInBody, contentType):
+        # NDJSON: one item per line, a malformed line only fails that item
+        if contentType.split(";")[0].strip() in (
+            "application/x-ndjson",
+            "application/jsonl",
+        ):
+            rawItems, failures = [], {}
+            for line in bulkUpsertInBody.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    rawItems.append(json.loads(line))
+                except ValueError as parseError:
+                    failures[len(rawItems)] = f"Invalid JSON: {parseError}"
+                    rawItems.append(None)
+            return rawItems, failures
+
+        try:
+            rawItems = json.loads(bulkUpsertInBody)
+        except ValueError as parseError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON: {parseError}",
+            )
+
+        # Either a bare list or {"items": [...]}
+        if isinstance(rawItems, dict):
+            rawItems = rawItems.get("items")
+        if not isinstance(rawItems, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Expected a list of items or {"items": [...]}.',
+            )
+
+        return rawItems, {}
+
+    def _encodeCursor(self, lastRow, sortField, sortOrder):
+        cursorPayload = [
+            sortField,
+            sortOrder,
+            lastRow[SORT_FIELD_INDEX[sortField]],
+            lastRow[0],
+        ]
+        return (
+            base64.urlsafe_b64encode(json.dumps(cursorPayload).encode())
+            .decode()
+            .rstrip("=")
+        )
+
+    def _encodeChangesCursor(self, afterDT, afterID):
+        return (
+            base64.urlsafe_b64encode(json.dumps(["changes", afterDT, afterID]).encode())
+            .decode()
+            .rstrip("=")
+        )
+
+    def _decodeChangesCursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            feed, afterDT, afterID = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            datetime.strptime(afterDT, CHANGES_DT_FORMAT)
+            if feed != "changes" or not isinstance(afterID, int) or afterID < 0:
+                raise ValueError(feed)
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid changes cursor.",
+            )
+
+        return afterDT, afterID
+
+    def _decodeCursor(self, cursor, sortField, sortOrder):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            cursorField, cursorOrder, afterKey, afterID = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor.",
+            )
+
+        keyType = (int, float) if sortField == "price" else str
+        if (
+            (cursorField, cursorOrder) != (sortField, sortOrder)
+            or not isinstance(afterKey, keyType)
+            or not isinstance(afterID, int)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Pagination cursor does not match the requested sort.",
+            )
+
+        return afterKey, afterID
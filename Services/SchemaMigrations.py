@@ -0,0 +1,152 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from Utils.Logger import createLogger
+
+# Logger
+logger = createLogger()
+
+# Bookkeeping table shared by every inventory table in the database
+VERSION_TABLE = "SCHEMA_VERSION"
+
+# (index, columns) serving the /query and /advance-query access patterns:
+# category + date window, category + price range/sort, price range/sort and
+# date-only windows. Name lookups and name sorts use the UNIQUE(name) index.
+SECONDARY_INDEXES = [
+    ("idx_category_updated", "category, last_updated_dt"),
+    ("idx_category_price", "category, price"),
+    ("idx_price_id", "price, id"),
+    ("idx_updated_id", "last_updated_dt, id"),
+]
+
+# Rows copied per transaction by online backfills
+CHUNK_SIZE = int(os.getenv("DB_MIGRATION_CHUNK_SIZE", "5000"))
+
+
+def initialSchema(connection, cursor, table):
+    # Created by DBAgent._migrate from _tableDefinition, nothing to change
+    pass
+
+
+def numericPrice(connection, cursor, table):
+    if columnType(cursor, table, "price") == "decimal":
+        if not indexExists(cursor, table, "idx_price_id"):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX idx_price_id (price, id)")
+        return
+
+    # Online copy: shadow table kept in sync by triggers, backfilled in chunks,
+    # then swapped in with an atomic RENAME TABLE.
+    shadow, retired = f"_{table}_new", f"_{table}_old"
+    triggers = [f"{table}_price_ins", f"{table}_price_upd", f"{table}_price_del"]
+
+    for trigger in triggers:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute(f"DROP TABLE IF EXISTS {shadow}, {retired}")
+    cursor.execute(f"CREATE TABLE {shadow} LIKE {table}")
+    cursor.execute(
+        f"""
+        ALTER TABLE {shadow}
+            MODIFY price DECIMAL(10, 2) NOT NULL,
+            ADD INDEX idx_price_id (price, id)
+        """
+    )
+
+    copyColumns = "id, name, category, price, last_updated_dt"
+    copyValues = """
+        (NEW.id, NEW.name, NEW.category,
+         CAST(NEW.price AS DECIMAL(10, 2)), NEW.last_updated_dt)
+    """
+    cursor.execute(
+        f"""
+        CREATE TRIGGER {triggers[0]} AFTER INSERT ON {table} FOR EACH ROW
+        REPLACE INTO {shadow} ({copyColumns}) VALUES {copyValues}
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER {triggers[1]} AFTER UPDATE ON {table} FOR EACH ROW
+        REPLACE INTO {shadow} ({copyColumns}) VALUES {copyValues}
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER {triggers[2]} AFTER DELETE ON {table} FOR EACH ROW
+        DELETE FROM {shadow} WHERE id = OLD.id
+        """
+    )
+
+    cursor.execute(f"SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM {table}")
+    lowID, highID = cursor.fetchone()
+
+    for chunkStart in range(lowID, highID + 1, CHUNK_SIZE):
+        chunkEnd = chunkStart + CHUNK_SIZE - 1
+        # Rows already mirrored by a trigger are at least as new, keep them
+        cursor.execute(
+            f"""
+            INSERT IGNORE INTO {shadow} ({copyColumns})
+            SELECT id, name, category, CAST(price AS DECIMAL(10, 2)), last_updated_dt
+            FROM {table}
+            WHERE id BETWEEN %s AND %s
+            LOCK IN SHARE MODE
+            """,
+            (chunkStart, chunkEnd),
+        )
+        connection.commit()
+        logger.info(f"Backfilled {table} ids {chunkStart}-{min(chunkEnd, highID)}...")
+
+    cursor.execute(f"RENAME TABLE {table} TO {retired}, {shadow} TO {table}")
+    for trigger in triggers:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute(f"DROP TABLE {retired}")
+
+
+def compositeIndexes(connection, cursor, table):
+    missingIndexes = [
+        f"ADD INDEX {index} ({columns})"
+        for index, columns in SECONDARY_INDEXES
+        if not indexExists(cursor, table, index)
+    ]
+
+    if missingIndexes:
+        # In-place build, reads and writes continue while the indexes are built
+        cursor.execute(
+            f"ALTER TABLE {table} {', '.join(missingIndexes)}, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+
+
+# (version, description, migration(connection, cursor, table)) - append only,
+# never reorder. Migrations must be idempotent: tables created before
+# versioning existed replay the whole list once.
+MIGRATIONS = [
+    (1, "Initial inventory schema", initialSchema),
+    (2, "Numeric DECIMAL(10, 2) price with (price, id) index", numericPrice),
+    (3, "Composite indexes for /query and /advance-query", compositeIndexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def columnType(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column),
+    )
+    row = cursor.fetchone()
+    return row[0].lower() if row else None
+
+
+def indexExists(cursor, table, index):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """,
+        (table, index),
+    )
+    return cursor.fetchone()[0] > 0
@@ -0,0 +1,137 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import unittest
+import httpx
+from unittest.mock import patch
+
+import API
+from Utils.SessionMiddleware import clientSessionVar
+from Utils.ReplicaRouter import ReplicaRouter
+from Utils.SingleFlight import SingleFlight
+
+
+class FakePool:
+    name = "replica"
+
+    def stats(self):
+        return {"name": self.name, "in_use": 0, "waiting": 0}
+
+
+class TestAPI(unittest.IsolatedAsyncioTestCase):
+    async def test_1_readDBCallSticky(self):
+        """Test that a session that just wrote never joins a shared read."""
+
+        router = ReplicaRouter([FakePool()])
+        calls = []
+
+        async def query(queryInPayload):
+            calls.append(clientSessionVar.get())
+            await asyncio.sleep(0.01)
+            return "primary" if router.choose() is None else "replica"
+
+        async def read(session):
+            token = clientSessionVar.set(session)
+            try:
+                if session == "writer":
+                    router.recordWrite()
+                return await API.readDBCall(query, (None, None, None))
+            finally:
+                clientSessionVar.reset(token)
+
+        with patch.object(API.dbAgent, "replicas", router), patch.object(
+            API, "singleFlight", SingleFlight()
+        ):
+            # Test case 1: The writer reads alone, from the primary
+            results = await asyncio.gather(read("reader"), read("writer"))
+            self.assertEqual(results, ["replica", "primary"])
+            self.assertEqual(sorted(calls), ["reader", "writer"])
+
+            # Test case 2: Other sessions still share one read
+            calls.clear()
+            results = await asyncio.gather(read("reader"), read("other"))
+            self.assertEqual(results, ["replica", "replica"])
+            self.assertEqual(calls, ["reader"])
+
+    async def test_2_bulkUpsertBodyLimit(self):
+        """Test that oversized bulk bodies are rejected before they are parsed."""
+
+        async def chunks():
+            for _ in range(4):
+                yield b"x" * 16
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=API.app), base_url="http://test"
+        )
+        with patch.object(API, "BULK_MAX_BYTES", 32), patch.object(
+            API.packagingAgent, "bulkUpsertIn"
+        ) as bulkUpsertIn:
+            # Test case 1: Declared Content-Length over the limit
+            response = await client.post("/upsert/bulk", content=b"[" * 33)
+            self.assertEqual(response.status_code, 413)
+
+            # Test case 2: Chunked body without a Content-Length
+            response = await client.post("/upsert/bulk", content=chunks())
+            self.assertEqual(response.status_code, 413)
+
+        bulkUpsertIn.assert_not_called()
+        await client.aclose()
+
+    async def test_3_readYourWrites(self):
+        """Test that a client's query after its upsert reads from the primary."""
+
+        router = ReplicaRouter([FakePool()])
+
+        def upsert(upsertInPayload):
+            router.recordWrite()
+            return 1, "inserted"
+
+        def query(queryInPayload):
+            source = "primary" if router.choose() is None else "replica"
+            return [(1, source, "Drinks", 1.0)]
+
+        async def source(client, **kwargs):
+            response = await client.post("/query", json={}, **kwargs)
+            return response.json()["items"][0]["name"]
+
+        def newClient():
+            return httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=API.app), base_url="http://test"
+            )
+
+        item = {"name": "Item A", "category": "Drinks", "price": 1.0}
+        with patch.object(API.dbAgent, "replicas", router), patch.object(
+            API.dbAgent, "upsert", upsert
+        ), patch.object(API.dbAgent, "query", query):
+            writer, other, headerClient = newClient(), newClient(), newClient()
+
+            # Test case 1: Session cookie issued on the first request
+            self.assertEqual(await source(writer), "replica")
+            response = await writer.post("/upsert", json=item)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(await source(writer), "primary")
+
+            # Test case 2: Other clients keep reading from the replica
+            self.assertEqual(await source(other), "replica")
+
+            # Test case 3: X-Session-ID, with a new X-Request-ID per request
+            headers = {"X-Session-ID": "frontend-tab-1"}
+            await headerClient.post(
+                "/upsert", json=item, headers={**headers, "X-Request-ID": "req-1"}
+            )
+            self.assertEqual(
+                await source(
+                    headerClient, headers={**headers, "X-Request-ID": "req-2"}
+                ),
+                "primary",
+            )
+
+            for client in (writer, other, headerClient):
+                await client.aclose()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -120,7 +120,13 @@ class TestAPIValidation(unittest.TestCase):
                         "category": "Stationary",
                         "price_range": [10.0, 50.0],
                     },
-                    "pagination": {"page": 1, "limit": 10},
+                    "pagination": {
+                        "page": 1,
+                        "limit": 10,
+                        "mode": "offset",
+                        "cursor": None,
+                        "total_mode": "exact",
+                    },
                     "sort": {"field": "price", "order": "asc"},
                 },
             ),
@@ -141,7 +147,13 @@ class TestAPIValidation(unittest.TestCase):
                         "category": "Stationary",
                         "price_range": [1.0, 5.0],
                     },
-                    "pagination": {"page": 2, "limit": 20},
+                    "pagination": {
+                        "page": 2,
+                        "limit": 20,
+                        "mode": "offset",
+                        "cursor": None,
+                        "total_mode": "exact",
+                    },
                     "sort": {"field": "name", "order": "desc"},
                 },
             ),
@@ -162,7 +174,13 @@ class TestAPIValidation(unittest.TestCase):
                         "category": "Stationary",
                         "price_range": [10.0, 10.0],
                     },
-                    "pagination": {"page": 1, "limit": 5},
+                    "pagination": {
+                        "page": 1,
+                        "limit": 5,
+                        "mode": "offset",
+                        "cursor": None,
+                        "total_mode": "exact",
+                    },
                     "sort": {"field": "category", "order": "asc"},
                 },
             ),
@@ -181,10 +199,39 @@ class TestAPIValidation(unittest.TestCase):
                         "category": None,
                         "price_range": [10.0, 10.0],
                     },
-                    "pagination": {"page": 1, "limit": 5},
+                    "pagination": {
+                        "page": 1,
+                        "limit": 5,
+                        "mode": "offset",
+                        "cursor": None,
+                        "total_mode": "exact",
+                    },
                     "sort": {"field": "category", "order": "asc"},
                 },
             ),
+            # Test case 5: Cursor mode without page
+            (
+                {
+                    "filters": {"price_range": [1.0, 10.0]},
+                    "pagination": {"limit": 5, "mode": "cursor", "cursor": "abc"},
+                    "sort": {"field": "price", "order": "desc"},
+                },
+                {
+                    "filters": {
+                        "name": None,
+                        "category": None,
+                        "price_range": [1.0, 10.0],
+                    },
+                    "pagination": {
+                        "page": 1,
+                        "limit": 5,
+                        "mode": "cursor",
+                        "cursor": "abc",
+                        "total_mode": "exact",
+                    },
+                    "sort": {"field": "price", "order": "desc"},
+                },
+            ),
         ]
 
         for validTestCase, expected in validTestCases:
@@ -263,12 +310,44 @@ class TestAPIValidation(unittest.TestCase):
                     "sort": {"field": "price", "order": "invalid_order"},
                 }
             ),
+            # Test case 7: Cursor given in offset mode
+            (
+                {
+                    "filters": {"price_range": [10.0, 50.0]},
+                    "pagination": {"page": 1, "limit": 10, "cursor": "abc"},
+                    "sort": {"field": "price", "order": "asc"},
+                }
+            ),
         ]
 
         for invalidTestCase in invalidTestCases:
             with self.assertRaises(ValidationError):
                 VAL_ADVANCE_QUERY(**invalidTestCase)
 
+    def test_4_val_changes(self):
+        """Test the payload validation schema for changes API."""
+
+        # Test case 1: Defaults start from the beginning without waiting
+        self.assertEqual(
+            VAL_CHANGES().model_dump(),
+            {"cursor": None, "since": None, "limit": 100, "wait": 0},
+        )
+
+        invalidTestCases = [
+            # Test case 2: Both start positions
+            {"cursor": "abc", "since": datetime.now()},
+            # Test case 3: Limit out of range
+            {"limit": 0},
+            {"limit": 1001},
+            # Test case 4: Wait beyond the long-poll cap
+            {"wait": 31},
+            {"wait": -1},
+        ]
+
+        for invalidTestCase in invalidTestCases:
+            with self.assertRaises(ValidationError):
+                VAL_CHANGES(**invalidTestCase)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,141 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import unittest
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+from Utils.AsyncConnectionPool import AsyncConnectionPool
+
+
+class FakeAsyncConnection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    async def ping(self, reconnect=False):
+        if not self.healthy:
+            raise InterfaceError("Connection not available.")
+
+    async def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    async def close(self):
+        self.closed = True
+
+
+class TestAsyncConnectionPool(unittest.IsolatedAsyncioTestCase):
+    def _createPool(self, **kwargs):
+        self.opened = []
+
+        async def factory():
+            connection = FakeAsyncConnection()
+            self.opened.append(connection)
+            return connection
+
+        return AsyncConnectionPool(factory, **kwargs)
+
+    async def test_1_reuse(self):
+        """Test that released connections are reused instead of reopened."""
+
+        pool = self._createPool(minSize=0, maxSize=2)
+
+        for _ in range(5):
+            async with pool.connection():
+                pass
+
+        stats = pool.stats()
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(stats["acquired"], 5)
+        self.assertEqual(stats["idle"], 1)
+        self.assertEqual(stats["in_use"], 0)
+
+    async def test_2_concurrency(self):
+        """Test that concurrent tasks share max size connections without blocking."""
+
+        pool = self._createPool(minSize=0, maxSize=3)
+
+        async def borrow():
+            async with pool.connection():
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[borrow() for _ in range(30)])
+
+        stats = pool.stats()
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(stats["acquired"], 30)
+        self.assertEqual(stats["waiting"], 0)
+
+    async def test_3_acquire_timeout(self):
+        """Test that acquire raises PoolError once max size is exhausted."""
+
+        pool = self._createPool(minSize=0, maxSize=1, acquireTimeout=0.05)
+        connection = await pool.acquire()
+
+        with self.assertRaises(PoolError):
+            await pool.acquire()
+
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+        # Test case 2: A waiter is woken up by a release
+        pool.acquireTimeout = 1.0
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        await pool.release(connection)
+        self.assertIs(await waiter, connection)
+
+    async def test_4_health_check(self):
+        """Test that unhealthy idle connections are replaced on checkout."""
+
+        pool = self._createPool(minSize=0, maxSize=1, pingInterval=0)
+
+        async with pool.connection() as connection:
+            connection.healthy = False
+
+        async with pool.connection() as replacement:
+            self.assertIsNot(replacement, connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()["health_check_failures"], 1)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    async def test_5_release(self):
+        """Test rollback, and discarding of broken or cancelled connections."""
+
+        pool = self._createPool(minSize=0, maxSize=1)
+
+        async with pool.connection() as connection:
+            connection.in_transaction = True
+
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertFalse(connection.closed)
+
+        with self.assertRaises(OperationalError):
+            async with pool.connection() as connection:
+                raise OperationalError("Lost connection to MySQL server")
+
+        self.assertTrue(connection.closed)
+
+        # Test case 3: Cancelled mid-query
+        async def borrow():
+            async with pool.connection() as connection:
+                borrowed.append(connection)
+                await asyncio.sleep(10)
+
+        borrowed = []
+        task = asyncio.create_task(borrow())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertTrue(borrowed[0].closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
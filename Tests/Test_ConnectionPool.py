@@ -0,0 +1,159 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import threading
+import unittest
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+from Utils.ConnectionPool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = False
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.pings = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.healthy:
+            raise InterfaceError("Connection not available.")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def _createPool(self, **kwargs):
+        self.opened = []
+
+        def factory():
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        return ConnectionPool(factory, **kwargs)
+
+    def test_1_reuse(self):
+        """Test that released connections are reused instead of reopened."""
+
+        pool = self._createPool(minSize=0, maxSize=2)
+
+        for _ in range(5):
+            with pool.connection():
+                pass
+
+        stats = pool.stats()
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(stats["acquired"], 5)
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["idle"], 1)
+        self.assertEqual(stats["in_use"], 0)
+
+    def test_2_acquire_timeout(self):
+        """Test that acquire raises PoolError once max size is exhausted."""
+
+        pool = self._createPool(minSize=0, maxSize=1, acquireTimeout=0.05)
+        connection = pool.acquire()
+
+        with self.assertRaises(PoolError):
+            pool.acquire()
+
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+        # Test case 2: A waiter is woken up by a release
+        threading.Timer(0.05, pool.release, args=(connection,)).start()
+        pool.acquireTimeout = 1.0
+        self.assertIs(pool.acquire(), connection)
+
+    def test_3_health_check(self):
+        """Test that unhealthy idle connections are replaced on checkout."""
+
+        pool = self._createPool(minSize=0, maxSize=1, pingInterval=0)
+
+        with pool.connection() as connection:
+            connection.healthy = False
+
+        with pool.connection() as replacement:
+            self.assertIsNot(replacement, connection)
+
+        stats = pool.stats()
+        self.assertTrue(connection.closed)
+        self.assertEqual(stats["health_check_failures"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_4_idle_eviction(self):
+        """Test that idle connections above min size are evicted."""
+
+        pool = self._createPool(minSize=1, maxSize=3, idleTimeout=0.01)
+        connections = [pool.acquire() for _ in range(3)]
+        for connection in connections:
+            pool.release(connection)
+
+        time.sleep(0.02)
+        pool.acquire()
+
+        stats = pool.stats()
+        self.assertEqual(stats["evicted_idle"], 2)
+        self.assertEqual(stats["size"], 1)
+
+    def test_5_release(self):
+        """Test rollback of open transactions and discarding of broken connections."""
+
+        pool = self._createPool(minSize=0, maxSize=1)
+
+        with pool.connection() as connection:
+            connection.in_transaction = True
+
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertFalse(connection.closed)
+
+        with self.assertRaises(OperationalError):
+            with pool.connection() as connection:
+                raise OperationalError("Lost connection to MySQL server")
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_6_warm(self):
+        """Test that warm opens min size connections up front."""
+
+        pool = self._createPool(minSize=2, maxSize=4)
+        pool.warm()
+
+        stats = pool.stats()
+        self.assertEqual(stats["size"], 2)
+        self.assertEqual(stats["idle"], 2)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "Requires os.fork")
+    def test_7_fork(self):
+        """Test that a forked child starts from an empty pool without closing sockets."""
+
+        pool = self._createPool(minSize=2, maxSize=4)
+        pool.warm()
+        inherited = pool.acquire()
+
+        pid = os.fork()
+        if pid == 0:
+            stats = pool.stats()
+            healthy = (stats["size"], stats["idle"]) == (0, 0)
+            with pool.connection() as connection:
+                healthy = healthy and connection is not inherited
+            healthy = healthy and not any(opened.closed for opened in self.opened[:2])
+            os._exit(0 if healthy else 1)
+
+        _, exitStatus = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(exitStatus), 0)
+        self.assertEqual(pool.stats()["size"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
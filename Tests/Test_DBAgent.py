@@ -6,9 +6,23 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import mysql.connector
 
 # TestDBAgent.py
+import time
+import asyncio
+import inspect
 import unittest
+import threading
+from unittest.mock import patch
 import mysql
+from mysql.connector import errorcode
+from decimal import Decimal
 from Services.DBAgent import DBAgent
+from Services.AsyncDBAgent import AsyncDBAgent
+from Utils.QueryBuilder import buildQuery, buildAdvanceQuery
+from Utils.PreparedStatements import PreparedStatementCache
+from Utils.ReplicaRouter import ReplicaRouter
+from Utils.SessionMiddleware import clientSessionVar
+from Services import SchemaMigrations
+from Services.SchemaMigrations import MIGRATIONS, LATEST_VERSION, VERSION_TABLE
 
 
 class TestDatabaseAgent(unittest.TestCase):
@@ -21,6 +35,10 @@ class TestDatabaseAgent(unittest.TestCase):
         self.table = os.getenv("DB_TABLE")
         self.dbAgent = DBAgent()
 
+    @classmethod
+    def setUpClass(cls):
+        DBAgent().bootstrap()
+
     def test_1_create_database(self):
         """Test the internal create database method."""
 
@@ -43,10 +61,10 @@ class TestDatabaseAgent(unittest.TestCase):
                 connection.close()
 
     def test_2_create_table(self):
-        """Test the internal create table method."""
+        """Test that bootstrap creates the table."""
 
         try:
-            self.dbAgent._verifyTable()
+            self.dbAgent.bootstrap()
             connection = mysql.connector.connect(
                 host=self.host,
                 user=self.user,
@@ -96,7 +114,7 @@ class TestDatabaseAgent(unittest.TestCase):
             self.assertIsInstance(itemID, expected)
             self.assertEqual(result[0], testCase[0])
             self.assertEqual(result[1], testCase[1])
-            self.assertEqual(result[2], testCase[2])
+            self.assertEqual(result[2], Decimal(testCase[2]))
 
         finally:
             if "cursor" in locals():
@@ -121,17 +139,17 @@ class TestDatabaseAgent(unittest.TestCase):
 
             testCases = [
                 # Test case 1: All records
-                ((None, None, None, None), sampleUpsert),
+                ((None, None, None), sampleUpsert),
                 # Test case 2: Date range ending in future (should get all)
-                ((None, "3000-12-28", None, None), sampleUpsert),
+                ((None, "3000-12-28", None), sampleUpsert),
                 # Test case 3: Date range starting from ancient time (should get all)
-                (("1000-12-28", None, None, None), sampleUpsert),
+                (("1000-12-28", None, None), sampleUpsert),
                 # Test case 4: Stationery category
-                ((None, None, "Stationary", "Stationary"), sampleUpsert[:2]),
+                ((None, None, "Stationary"), sampleUpsert[:2]),
                 # Test case 5: Non-existent category
-                ((None, None, "NonExistent", "NonExistent"), []),
+                ((None, None, "NonExistent"), []),
                 # Test case 6: Specific date range + category
-                (("2023-01-01", "2025-12-31", "Drinks", "Drinks"), sampleUpsert[2:]),
+                (("2023-01-01", "2025-12-31", "Drinks"), sampleUpsert[2:]),
             ]
 
             for sample in sampleUpsert:
@@ -140,7 +158,7 @@ class TestDatabaseAgent(unittest.TestCase):
             for testCase, expected in testCases:
                 result = self.dbAgent.query(testCase)
 
-                resultData = [(row[1], row[2], row[3]) for row in result]
+                resultData = [(row[1], row[2], f"{row[3]:.2f}") for row in result]
 
                 expectedSorted = sorted(expected)
                 resultSorted = sorted(resultData)
@@ -190,18 +208,17 @@ class TestDatabaseAgent(unittest.TestCase):
                 # Test case 1: Query for Stationary items within price range 1-5
                 (
                     (
-                        "Item B",
                         "Item B",
                         "Stationary",
-                        "Stationary",
                         1.00,
                         5.00,
                         "price",
-                        "price",
-                        "price",
+                        "asc",
                         1,
                         0,
-                        "asc",
+                        None,
+                        None,
+                        "exact",
                     ),
                     [("Item B", "Stationary", "2.75")],
                 ),
@@ -209,35 +226,33 @@ class TestDatabaseAgent(unittest.TestCase):
                 (
                     (
                         "Item C",
-                        "Item C",
-                        "Art Supplies",
                         "Art Supplies",
                         5.00,
                         20.00,
                         "price",
-                        "price",
-                        "price",
+                        "asc",
                         1,
                         0,
-                        "asc",
+                        None,
+                        None,
+                        "exact",
                     ),
                     [("Item C", "Art Supplies", "5.99")],
                 ),
                 # Test case 3: Query with no results
                 (
                     (
-                        "NonExistent",
-                        "NonExistent",
                         "NonExistent",
                         "NonExistent",
                         1.00,
                         100.00,
                         "price",
-                        "price",
-                        "price",
+                        "asc",
                         10,
                         0,
-                        "asc",
+                        None,
+                        None,
+                        "exact",
                     ),
                     [],
                 ),
@@ -245,35 +260,33 @@ class TestDatabaseAgent(unittest.TestCase):
                 (
                     (
                         "Item A",
-                        "Item A",
-                        "Stationary",
                         "Stationary",
                         10.00,
                         15.00,
                         "name",
-                        "name",
-                        "name",
+                        "desc",
                         1,
                         0,
-                        "desc",
+                        None,
+                        None,
+                        "exact",
                     ),
                     [("Item A", "Stationary", "12.50")],
                 ),
                 # Test case 5: Query without name and category
                 (
                     (
-                        None,
-                        None,
                         None,
                         None,
                         2.50,
                         7.00,
                         "price",
-                        "price",
-                        "price",
+                        "asc",
                         10,
                         0,
-                        "asc",
+                        None,
+                        None,
+                        "exact",
                     ),
                     [
                         ("Item B", "Stationary", "2.75"),
@@ -283,18 +296,17 @@ class TestDatabaseAgent(unittest.TestCase):
                 # Test case 6: Query with page offset and limit
                 (
                     (
-                        None,
-                        None,
                         None,
                         None,
                         2.50,
                         7.00,
                         "price",
-                        "price",
-                        "price",
+                        "asc",
                         1,
                         0,
-                        "asc",
+                        None,
+                        None,
+                        "exact",
                     ),
                     [
                         ("Item B", "Stationary", "2.75"),
@@ -303,11 +315,11 @@ class TestDatabaseAgent(unittest.TestCase):
             ]
 
             for testCase, expected in testCases:
-                result = self.dbAgent.advanceQuery(testCase)
+                result, _ = self.dbAgent.advanceQuery(testCase)
                 processed_result = []
 
                 for row in result:
-                    processed_result.append((row[1], row[2], row[3]))
+                    processed_result.append((row[1], row[2], f"{row[3]:.2f}"))
 
                 self.assertEqual(
                     processed_result,
@@ -335,6 +347,897 @@ class TestDatabaseAgent(unittest.TestCase):
             cursor.close()
             connection.close()
 
+    def test_6_bootstrap(self):
+        """Test that bootstrap records the schema version and is idempotent."""
+
+        try:
+            self.assertEqual(self.dbAgent.bootstrap(), LATEST_VERSION)
+            self.assertEqual(self.dbAgent.bootstrap(), LATEST_VERSION)
+
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(
+                f"SELECT version FROM {VERSION_TABLE} WHERE table_name = %s",
+                (self.table,),
+            )
+            versions = [row[0] for row in cursor.fetchall()]
+
+            self.assertEqual(versions, [version for version, _, _ in MIGRATIONS])
+
+        finally:
+            if "cursor" in locals():
+                cursor.close()
+            if "connection" in locals() and connection.is_connected():
+                connection.close()
+
+    def test_7_lazy_reverify(self):
+        """Test that a dropped table is recreated on first use when opted in."""
+
+        testCase = ("Test Item", "Stationary", "1.70")
+
+        try:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DROP TABLE {self.table}")
+
+            self.dbAgent.lazyReverify = True
+            itemID = self.dbAgent.upsert(testCase)[0]
+
+            self.assertIsInstance(itemID, int)
+
+        finally:
+            if "cursor" in locals():
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE name = %s", (testCase[0],)
+                )
+                connection.commit()
+                cursor.close()
+            if "connection" in locals() and connection.is_connected():
+                connection.close()
+
+    def test_8_numeric_price_migration(self):
+        """Test migrating a legacy VARCHAR price table to DECIMAL."""
+
+        legacyTable = f"{self.table}_LEGACY"
+
+        try:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor(buffered=True)
+            cursor.execute(f"DROP TABLE IF EXISTS {legacyTable}")
+            cursor.execute(f"""
+                CREATE TABLE {legacyTable} (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(100) NOT NULL UNIQUE,
+                category VARCHAR(100) NOT NULL,
+                price VARCHAR(100) NOT NULL,
+                last_updated_dt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+                """)
+            cursor.executemany(
+                f"""
+                INSERT INTO {legacyTable} (name, category, price, last_updated_dt)
+                VALUES (%s, %s, %s, '2024-01-01 00:00:00')
+                """,
+                [(f"Item {i}", "Stationary", f"{i}.50") for i in range(1, 8)],
+            )
+            connection.commit()
+
+            with patch.object(SchemaMigrations, "CHUNK_SIZE", 3):
+                SchemaMigrations.numericPrice(connection, cursor, legacyTable)
+
+            cursor.execute(f"SELECT name, price, last_updated_dt FROM {legacyTable}")
+            rows = sorted(cursor.fetchall())
+
+            self.assertEqual(
+                SchemaMigrations.columnType(cursor, legacyTable, "price"), "decimal"
+            )
+            self.assertTrue(
+                SchemaMigrations.indexExists(cursor, legacyTable, "idx_price_id")
+            )
+            self.assertEqual(len(rows), 7)
+            self.assertEqual(rows[0][1], Decimal("1.50"))
+            # Backfill must not bump last_updated_dt
+            self.assertEqual(str(rows[0][2]), "2024-01-01 00:00:00")
+
+        finally:
+            if "cursor" in locals():
+                cursor.execute(f"DROP TABLE IF EXISTS {legacyTable}")
+                cursor.close()
+            if "connection" in locals() and connection.is_connected():
+                connection.close()
+
+    def test_9_keysetPagination(self):
+        """Test that keyset pages cover the result set once and in order."""
+
+        try:
+            sampleUpsert = [
+                ("Item A", "Stationary", "2.50"),
+                ("Item B", "Stationary", "2.50"),
+                ("Item C", "Art Supplies", "5.99"),
+                ("Item D", "Stationary", "1.25"),
+                ("Item E", "Art Supplies", "2.50"),
+            ]
+
+            for sample in sampleUpsert:
+                self.dbAgent.upsert(sample)
+
+            for sortField, sortOrder in [("price", "asc"), ("name", "desc")]:
+                baseQuery = (None, None, 0.00, 10.00, sortField, sortOrder)
+                expected = [
+                    row[1]
+                    for row in self.dbAgent.advanceQuery(
+                        (*baseQuery, 10, 0, None, None, "none")
+                    )[0]
+                ]
+
+                pages, afterKey, afterID = [], None, None
+                while True:
+                    page, _ = self.dbAgent.advanceQuery(
+                        (*baseQuery, 2, 0, afterKey, afterID, "none")
+                    )
+                    pages += [row[1] for row in page]
+                    if len(page) < 2:
+                        break
+                    lastRow = page[-1]
+                    afterKey = lastRow[3] if sortField == "price" else lastRow[1]
+                    afterID = lastRow[0]
+
+                self.assertEqual(len(expected), len(sampleUpsert))
+                self.assertEqual(pages, expected, f"Keyset failed for {sortField}")
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_10_explain(self):
+        """Test that every filtered /query and /advance-query shape uses an index."""
+
+        statements = [
+            # /query: category + date window, category only, date window only
+            buildQuery(
+                self.table, ("2024-01-01 00:00:00", "2024-01-31 00:00:00", "Cat 3")
+            ),
+            buildQuery(self.table, (None, None, "Cat 3")),
+            buildQuery(
+                self.table, ("2024-01-01 00:00:00", "2024-01-02 00:00:00", None)
+            ),
+            # /advance-query: every filter, category + price, price only
+            buildAdvanceQuery(
+                self.table,
+                ("Item 42", "Cat 2", 1.0, 50.0, "price", "asc", 10, 0, None, None),
+            ),
+            buildAdvanceQuery(
+                self.table,
+                (None, "Cat 3", 10.0, 12.0, "price", "desc", 10, 0, None, None),
+            ),
+            buildAdvanceQuery(
+                self.table,
+                (None, None, 10.0, 10.5, "price", "asc", 10, 0, None, None),
+            ),
+            # /advance-query: keyset page sorted by name / category
+            buildAdvanceQuery(
+                self.table,
+                (None, None, 0.0, 100.0, "name", "asc", 10, 0, "Item 900", 900),
+            ),
+            buildAdvanceQuery(
+                self.table,
+                (None, "Cat 4", 0.0, 100.0, "category", "asc", 10, 0, "Cat 4", 500),
+            ),
+        ]
+
+        try:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            cursor.executemany(
+                f"""
+                INSERT INTO {self.table} (name, category, price, last_updated_dt)
+                VALUES (%s, %s, %s, %s)
+                """,
+                [
+                    (
+                        f"Item {i}",
+                        f"Cat {i % 10}",
+                        f"{i % 100}.{i % 7}0",
+                        f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} 00:00:00",
+                    )
+                    for i in range(2000)
+                ],
+            )
+            connection.commit()
+            cursor.execute(f"ANALYZE TABLE {self.table}")
+            cursor.fetchall()
+
+            for statement, params in statements:
+                cursor.execute(f"EXPLAIN {statement}", params)
+                plan = cursor.fetchall()[0]
+                self.assertNotEqual(
+                    plan["type"], "ALL", f"Full table scan for:\n{statement}\n{plan}"
+                )
+                self.assertIsNotNone(plan["key"], f"No index used for:\n{statement}")
+
+        finally:
+            if "cursor" in locals():
+                cursor.execute(f"DELETE FROM {self.table}")
+                connection.commit()
+                cursor.close()
+            if "connection" in locals() and connection.is_connected():
+                connection.close()
+
+    def test_11_advanceTotal(self):
+        """Test the total reported by advanceQuery for each total mode."""
+
+        try:
+            for i in range(7):
+                self.dbAgent.upsert((f"Item {i}", "Stationary", f"{i}.50"))
+            self.dbAgent.upsert(("Item X", "Drinks", "3.50"))
+
+            baseQuery = (None, "Stationary", 1.00, 10.00, "price", "asc")
+            testCases = [
+                # Test case 1: Exact total on a full first page
+                ((*baseQuery, 2, 0, None, None, "exact"), 6),
+                # Test case 2: Exact total on a keyset page
+                ((*baseQuery, 2, 0, 2.5, 2, "exact"), 6),
+                # Test case 3: Short page pins the total without counting
+                ((*baseQuery, 4, 4, None, None, "exact"), 6),
+                # Test case 4: Cached total
+                ((*baseQuery, 2, 0, None, None, "cached"), 6),
+                # Test case 5: Total skipped
+                ((*baseQuery, 2, 0, None, None, "none"), None),
+            ]
+
+            for testCase, expected in testCases:
+                _, total = self.dbAgent.advanceQuery(testCase)
+                self.assertEqual(total, expected, f"Total failed for {testCase}")
+
+            # Test case 6: Estimate is a non-negative integer
+            _, total = self.dbAgent.advanceQuery(
+                (*baseQuery, 2, 0, None, None, "estimate")
+            )
+            self.assertIsInstance(total, int)
+            self.assertGreaterEqual(total, 0)
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_12_bulkUpsert(self):
+        """Test the bulkUpsert method."""
+
+        try:
+            self.dbAgent.bulkChunkSize = 2
+            self.dbAgent.bulkTxnSize = 3
+            listID = self.dbAgent.upsert(("Item 0", "Stationary", "1.00"))
+
+            payload = [
+                (0, ("Item 0", "Stationary", "9.99")),
+                (1, ("Item 1", "Stationary", "2.00")),
+                (3, ("x" * 101, "Stationary", "3.00")),
+                (4, ("item 1", "Stationary", "4.00")),
+                (5, ("Item 2", "Drinks", "5.00")),
+            ]
+            itemIDs, failures = self.dbAgent.bulkUpsert(payload)
+
+            # Test case 1: Ids in input positions, duplicates map to one id
+            self.assertEqual(sorted(itemIDs), [0, 1, 4, 5])
+            self.assertEqual(itemIDs[0], listID[0])
+            self.assertEqual(itemIDs[1], itemIDs[4])
+
+            # Test case 2: Rejected row reported without failing its chunk
+            self.assertEqual(list(failures), [3])
+
+            # Test case 3: Last write wins and every row is committed
+            result = self.dbAgent.query((None, None, None))
+            self.assertEqual(
+                sorted((item[1], item[3]) for item in result),
+                [("Item 0", 9.99), ("Item 1", 4.0), ("Item 2", 5.0)],
+            )
+
+            # Test case 4: Transactions end within the /changes settle window
+            self.dbAgent.bulkTxnSize = 5000
+            for settleSeconds, commits in [(60, 1), (0, 3)]:
+                self.dbAgent.changesSettleSeconds = settleSeconds
+                with patch.object(
+                    DBAgent,
+                    "_commitBulk",
+                    autospec=True,
+                    side_effect=DBAgent._commitBulk,
+                ) as commitBulk:
+                    self.dbAgent.bulkUpsert(payload)
+                self.assertEqual(commitBulk.call_count, commits)
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_13_upsertStatus(self):
+        """Test the id and status returned by upsert in a single statement."""
+
+        try:
+            itemID, upsertStatus = self.dbAgent.upsert(("Item 0", "Stationary", "1.00"))
+            self.assertEqual(upsertStatus, "inserted")
+
+            testCases = [
+                # Test case 1: Same price leaves the row untouched
+                (("Item 0", "Stationary", "1.00"), "unchanged"),
+                # Test case 2: New price updates the row
+                (("Item 0", "Stationary", "2.00"), "updated"),
+                # Test case 3: Collation-equal name resolves to the same row
+                (("item 0", "Stationary", "2.00"), "unchanged"),
+            ]
+
+            for testCase, expected in testCases:
+                self.assertEqual(
+                    self.dbAgent.upsert(testCase),
+                    (itemID, expected),
+                    f"Upsert failed for {testCase}",
+                )
+
+            # Test case 4: The statement's id is not reused by the next insert
+            otherID, upsertStatus = self.dbAgent.upsert(
+                ("Item 1", "Stationary", "1.00")
+            )
+            self.assertEqual(upsertStatus, "inserted")
+            self.assertNotEqual(otherID, itemID)
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_14_resultCache(self):
+        """Test that cached query results are invalidated by upserts."""
+
+        def prices(queryInPayload):
+            return sorted(
+                (row[1], row[3]) for row in self.dbAgent.query(queryInPayload)
+            )
+
+        self.dbAgent.resultCache.ttl = 30
+        try:
+            self.dbAgent.upsert(("Item A", "Drinks", "1.00"))
+            self.dbAgent.upsert(("Item B", "Stationary", "1.00"))
+
+            # Test case 1: Repeated shape is served from the cache
+            self.assertEqual(prices((None, None, "Drinks")), [("Item A", 1.0)])
+            self.assertEqual(prices((None, None, "Drinks")), [("Item A", 1.0)])
+            self.assertEqual(self.dbAgent.cacheStats()["hits"], 1)
+
+            # Test case 2: Insert into the category
+            self.dbAgent.upsert(("Item C", "drinks", "3.00"))
+            self.assertEqual(
+                prices((None, None, "Drinks")), [("Item A", 1.0), ("Item C", 3.0)]
+            )
+
+            # Test case 3: Update under another payload category keeps the stored one
+            self.dbAgent.upsert(("Item A", "Stationary", "2.00"))
+            self.assertEqual(
+                prices((None, None, "Drinks")), [("Item A", 2.0), ("Item C", 3.0)]
+            )
+
+            # Test case 4: Unfiltered results follow every write
+            prices((None, None, None))
+            self.dbAgent.upsert(("Item B", "Stationary", "5.00"))
+            self.assertIn(("Item B", 5.0), prices((None, None, None)))
+
+            # Test case 5: Bulk upserts drop every entry
+            self.dbAgent.bulkUpsert([(0, ("Item C", "Drinks", "4.00"))])
+            self.assertIn(("Item C", 4.0), prices((None, None, "Drinks")))
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_15_streamQuery(self):
+        """Test that streamQuery yields every row in batches and frees its connection."""
+
+        try:
+            for i in range(5):
+                self.dbAgent.upsert((f"Item {i}", "Stationary", f"{i}.50"))
+            self.dbAgent.streamBatchSize = 2
+
+            # Test case 1: Fully consumed stream
+            batches = list(self.dbAgent.streamQuery((None, None, "Stationary")))
+            self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+            self.assertEqual(
+                sorted(row for batch in batches for row in batch),
+                sorted(self.dbAgent.query((None, None, "Stationary"))),
+            )
+            self.assertEqual(self.dbAgent.pool.stats()["in_use"], 0)
+
+            # Test case 2: Client went away after the first batch
+            stream = self.dbAgent.streamQuery((None, None, None))
+            next(stream)
+            stream.close()
+            self.assertEqual(self.dbAgent.pool.stats()["in_use"], 0)
+
+            # Test case 3: Response cancelled before the first batch
+            stream = self.dbAgent.streamQuery((None, None, None))
+            self.assertEqual(self.dbAgent.pool.stats()["in_use"], 1)
+            del stream
+            self.assertEqual(self.dbAgent.pool.stats()["in_use"], 0)
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_16_querySummary(self):
+        """Test that querySummary sums DECIMAL prices exactly in SQL."""
+
+        try:
+            for i in range(10):
+                self.dbAgent.upsert((f"Item {i}", "Stationary", "0.10"))
+            self.dbAgent.upsert(("Item X", "Drinks", "0.20"))
+
+            testCases = [
+                # Test case 1: Whole table
+                (((None, None, None), None), [(11, Decimal("1.20"))]),
+                # Test case 2: Category filter
+                (((None, None, "Drinks"), None), [(1, Decimal("0.20"))]),
+                # Test case 3: Grouped by category
+                (
+                    ((None, None, None), "category"),
+                    [
+                        ("Drinks", 1, Decimal("0.20")),
+                        ("Stationary", 10, Decimal("1.00")),
+                    ],
+                ),
+                # Test case 4: Nothing matches
+                (((None, None, "NonExistent"), None), [(0, Decimal("0"))]),
+            ]
+
+            for (testCase, groupBy), expected in testCases:
+                result = self.dbAgent.querySummary(testCase, groupBy)
+                self.assertEqual(
+                    [tuple(row) for row in result],
+                    expected,
+                    f"Summary failed for {testCase} grouped by {groupBy}",
+                )
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_17_groupUpsert(self):
+        """Test that groupUpsert applies buffered upserts in order with a status each."""
+
+        try:
+            itemID, _ = self.dbAgent.upsert(("Item 0", "Stationary", "1.00"))
+
+            results = self.dbAgent.groupUpsert(
+                [
+                    ("Item 0", "Stationary", "1.00"),
+                    ("Item 1", "Drinks", "2.00"),
+                    ("x" * 101, "Stationary", "3.00"),
+                    ("item 1", "Stationary", "4.00"),
+                    ("Item 0", "Drinks", "5.00"),
+                    ("Item 1", "Drinks", "4.00"),
+                ]
+            )
+
+            # Test case 1: Status of each upsert against the rows before it
+            self.assertEqual(results[0], (itemID, "unchanged"))
+            self.assertEqual(results[1][1], "inserted")
+            self.assertEqual(results[3], (results[1][0], "updated"))
+            self.assertEqual(results[4], (itemID, "updated"))
+            self.assertEqual(results[5], (results[1][0], "unchanged"))
+
+            # Test case 2: Rejected row fails alone
+            self.assertEqual(results[2].status_code, 400)
+
+            # Test case 3: Last write wins, stored categories are kept
+            result = self.dbAgent.query((None, None, None))
+            self.assertEqual(
+                sorted((item[1], item[2], item[3]) for item in result),
+                [("Item 0", "Stationary", 5.0), ("Item 1", "Drinks", 4.0)],
+            )
+
+            # Test case 4: Names stay locked from the status read to the commit
+            upsertIsolated = DBAgent._upsertIsolated
+            blocked = []
+
+            def concurrentUpsert(agent, cursor, chunk, itemIDs):
+                other = mysql.connector.connect(
+                    host=self.host,
+                    user=self.user,
+                    password=self.password,
+                    database=self.database,
+                )
+                otherCursor = other.cursor()
+                otherCursor.execute("SET SESSION innodb_lock_wait_timeout = 1")
+                try:
+                    otherCursor.execute(
+                        f"INSERT INTO {self.table} (name, category, price) "
+                        "VALUES (%s, %s, %s)",
+                        ("Item 2", "Drinks", "1.00"),
+                    )
+                except mysql.connector.errors.DatabaseError as lockError:
+                    blocked.append(lockError.errno)
+                finally:
+                    otherCursor.close()
+                    other.close()
+
+                return upsertIsolated(agent, cursor, chunk, itemIDs)
+
+            with patch.object(DBAgent, "_upsertIsolated", concurrentUpsert):
+                results = self.dbAgent.groupUpsert([("Item 2", "Stationary", "1.00")])
+            self.assertEqual(blocked, [errorcode.ER_LOCK_WAIT_TIMEOUT])
+            self.assertEqual(results[0][1], "inserted")
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_18_changes(self):
+        """Test that changes pages by (last_updated_dt, id) and skips unsettled rows."""
+
+        try:
+            ids = [
+                self.dbAgent.upsert((f"Item {i}", "Stationary", "1.00"))[0]
+                for i in range(4)
+            ]
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            for itemID, updated in zip(
+                ids,
+                [
+                    "2024-01-01 10:00:02",
+                    "2024-01-01 10:00:01",
+                    "2024-01-01 10:00:02",
+                    None,
+                ],
+            ):
+                cursor.execute(
+                    f"UPDATE {self.table} SET last_updated_dt = "
+                    "COALESCE(%s, NOW()) WHERE id = %s",
+                    (updated, itemID),
+                )
+            connection.commit()
+            cursor.close()
+            connection.close()
+            self.dbAgent.changesSettleSeconds = 60
+
+            # Test case 1: Oldest first, ties broken by id
+            page = self.dbAgent.changes(("1000-01-01 00:00:00", 0, 2))
+            self.assertEqual([row[0] for row in page], [ids[1], ids[0]])
+
+            # Test case 2: Next page seeks past the last (last_updated_dt, id)
+            page = self.dbAgent.changes(("2024-01-01 10:00:02", ids[0], 2))
+            self.assertEqual([row[0] for row in page], [ids[2]])
+
+            # Test case 3: Row updated within the settle window waits
+            self.assertEqual(
+                self.dbAgent.changes(("2024-01-01 10:00:02", ids[2], 2)), []
+            )
+            self.dbAgent.changesSettleSeconds = 0
+            time.sleep(1)
+            page = self.dbAgent.changes(("2024-01-01 10:00:02", ids[2], 2))
+            self.assertEqual([row[0] for row in page], [ids[3]])
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+    def test_19_hostPort(self):
+        """Test that the blocking and asyncio connect paths both split host:port."""
+
+        with patch.dict(os.environ, {"DB_HOST": "db.internal:3307"}):
+            agent = AsyncDBAgent()
+
+        # Test case 1: Blocking connections
+        with patch("mysql.connector.connect") as connect:
+            agent._establishConnection(useDatabase=True)
+        self.assertEqual(
+            (connect.call_args.kwargs["host"], connect.call_args.kwargs["port"]),
+            ("db.internal", 3307),
+        )
+
+        # Test case 2: asyncio connections
+        with patch("mysql.connector.aio.connect") as connect:
+            asyncio.run(agent._establishAsyncConnection())
+        self.assertEqual(
+            (connect.call_args.kwargs["host"], connect.call_args.kwargs["port"]),
+            ("db.internal", 3307),
+        )
+
+        # Test case 3: Default port
+        self.assertEqual(agent._address("db.internal"), ("db.internal", 3306))
+
+    def test_20_groupUpsertConcurrent(self):
+        """Test that concurrent group upserts of new names retry lock conflicts."""
+
+        try:
+            for roundIndex in range(10):
+                start = threading.Barrier(2)
+                results = [None, None]
+
+                def groupUpsert(worker):
+                    start.wait()
+                    results[worker] = self.dbAgent.groupUpsert(
+                        [
+                            (f"New {roundIndex} {worker}", "Stationary", "1.00"),
+                            (
+                                f"New {roundIndex} shared",
+                                "Stationary",
+                                f"{worker + 2}.00",
+                            ),
+                        ]
+                    )
+
+                threads = [
+                    threading.Thread(target=groupUpsert, args=(worker,))
+                    for worker in range(2)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                # Test case 1: Both batches are written, neither fails as a whole
+                self.assertEqual([result[0][1] for result in results], ["inserted"] * 2)
+
+                # Test case 2: The shared name is inserted once and updated once
+                self.assertEqual(
+                    sorted(result[1][1] for result in results), ["inserted", "updated"]
+                )
+                self.assertEqual(results[0][1][0], results[1][1][0])
+
+        finally:
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+
+class AsyncAgentRunner:
+    # Drives AsyncDBAgent coroutines to completion on a private event loop
+    def __init__(self, agent):
+        object.__setattr__(self, "agent", agent)
+        object.__setattr__(self, "loop", asyncio.new_event_loop())
+
+    def __getattr__(self, name):
+        attribute = getattr(self.agent, name)
+        if inspect.iscoroutinefunction(attribute):
+            return lambda *args, **kwargs: self.loop.run_until_complete(
+                attribute(*args, **kwargs)
+            )
+        return attribute
+
+    def __setattr__(self, name, value):
+        setattr(self.agent, name, value)
+
+    def close(self):
+        self.loop.run_until_complete(self.agent.asyncPool.close())
+        self.agent.pool.close()
+        self.loop.close()
+
+
+class TestAsyncDatabaseAgent(TestDatabaseAgent):
+    """Runs the DBAgent suite against AsyncDBAgent (DB_MODE=async)."""
+
+    def setUp(self):
+        self.dbAgent = AsyncAgentRunner(AsyncDBAgent())
+
+    def tearDown(self):
+        self.dbAgent.close()
+
+
+class TestPreparedDatabaseAgent(TestDatabaseAgent):
+    """Runs the DBAgent suite with server-side prepared statements enabled."""
+
+    def setUp(self):
+        self.dbAgent.preparedStatements = PreparedStatementCache(maxSize=4)
+
+    def tearDown(self):
+        self.dbAgent.pool.close()
+
+
+@unittest.skipUnless(
+    os.getenv("DB_TEST_REPLICA_HOST"), "Requires a second MySQL instance"
+)
+class TestReplicaDatabaseAgent(unittest.TestCase):
+    """Routes reads to DB_TEST_REPLICA_HOST, an instance that never replicates,
+    so a row is only visible from a read that went to the primary."""
+
+    @classmethod
+    def setUpClass(cls):
+        DBAgent().bootstrap()
+        replicaAgent = DBAgent()
+        replicaAgent.host = os.getenv("DB_TEST_REPLICA_HOST")
+        replicaAgent.pool = replicaAgent._createPool(replicaAgent.host)
+        replicaAgent.bootstrap()
+        replicaAgent.pool.close()
+
+    def setUp(self):
+        self.dbAgent = DBAgent()
+        self.replicaPool = self.dbAgent._createPool(os.getenv("DB_TEST_REPLICA_HOST"))
+        self.dbAgent.replicas = ReplicaRouter([self.replicaPool], stickySeconds=0.5)
+
+    def tearDown(self):
+        for pool in [self.dbAgent.pool, self.replicaPool]:
+            with pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.dbAgent.table}")
+                connection.commit()
+            pool.close()
+
+    def _names(self, clientSession, queryInPayload=(None, None, None)):
+        token = clientSessionVar.set(clientSession)
+        try:
+            return [row[1] for row in self.dbAgent.query(queryInPayload)]
+        finally:
+            clientSessionVar.reset(token)
+
+    def _upsert(self, clientSession, upsertInPayload):
+        token = clientSessionVar.set(clientSession)
+        try:
+            return self.dbAgent.upsert(upsertInPayload)
+        finally:
+            clientSessionVar.reset(token)
+
+    def test_1_routing(self):
+        """Test that reads go to the replica except right after the session's write."""
+
+        self.dbAgent.resultCache.ttl = 0
+        self._upsert("writer", ("Item A", "Drinks", "1.00"))
+
+        # Test case 1: Writer reads its own write from the primary
+        self.assertEqual(self._names("writer"), ["Item A"])
+
+        # Test case 2: Other sessions read from the replica
+        self.assertEqual(self._names("reader"), [])
+
+        # Test case 3: Writer is back on the replica after the window
+        time.sleep(0.6)
+        self.assertEqual(self._names("writer"), [])
+
+        stats = self.dbAgent.replicaStats()
+        self.assertEqual(stats["sticky_reads"], 1)
+        self.assertEqual(stats["replicas"][0]["reads"], 2)
+
+    def test_2_failover(self):
+        """Test that reads fall back to the primary when the replica is unreachable."""
+
+        self.dbAgent.replicas = ReplicaRouter(
+            [self.dbAgent._createPool("127.0.0.1:1")], cooldown=60
+        )
+        self.dbAgent.resultCache.ttl = 0
+        self._upsert("writer", ("Item A", "Drinks", "1.00"))
+
+        # Test case 1: Failed read is retried on the primary
+        self.assertEqual(self._names("reader"), ["Item A"])
+
+        # Test case 2: Replica is skipped during the cooldown
+        self.assertEqual(self._names("reader"), ["Item A"])
+
+        stats = self.dbAgent.replicaStats()
+        self.assertEqual((stats["failovers"], stats["fallback_reads"]), (1, 2))
+        self.assertTrue(stats["replicas"][0]["down"])
+
+    def test_3_resultCache(self):
+        """Test that replica reads do not refill the cache right after a write."""
+
+        self.dbAgent.resultCache.ttl = 30
+        self._upsert("writer", ("Item A", "Drinks", "1.00"))
+
+        # Test case 1: Replica result is not stored while replicas may lag
+        self.assertEqual(self._names("reader", (None, None, "Drinks")), [])
+        self.assertEqual(self.dbAgent.cacheStats()["stores"], 0)
+
+        # Test case 2: Primary result is stored
+        self.assertEqual(self._names("writer", (None, None, "Drinks")), ["Item A"])
+        self.assertEqual(self.dbAgent.cacheStats()["stores"], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
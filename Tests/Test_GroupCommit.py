@@ -0,0 +1,116 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import unittest
+from Utils.Logger import sessionIDVar
+from Utils.GroupCommit import GroupCommitBuffer
+
+
+class TestGroupCommit(unittest.IsolatedAsyncioTestCase):
+    def _createBuffer(self, delay=0.0, **kwargs):
+        self.batches = []
+
+        async def flush(items):
+            self.batches.append((list(items), sessionIDVar.get()))
+            await asyncio.sleep(delay)
+            return [
+                ValueError(item) if item.startswith("bad") else f"id-{item}"
+                for item in items
+            ]
+
+        return GroupCommitBuffer(flush, **kwargs)
+
+    async def test_1_batching(self):
+        """Test that items within the window or up to maxItems share one flush."""
+
+        upsertBuffer = self._createBuffer(window=0.01, maxItems=3)
+        token = sessionIDVar.set("request-a")
+        results = await asyncio.gather(
+            *[upsertBuffer.submit(f"item-{i}") for i in range(7)]
+        )
+        sessionIDVar.reset(token)
+
+        # Test case 1: Each caller gets its own result
+        self.assertEqual(results, [f"id-item-{i}" for i in range(7)])
+
+        # Test case 2: Batches keep arrival order and run outside any request
+        self.assertEqual(
+            self.batches,
+            [
+                (["item-0", "item-1", "item-2"], "NO_SESSION"),
+                (["item-3", "item-4", "item-5"], "NO_SESSION"),
+                (["item-6"], "NO_SESSION"),
+            ],
+        )
+
+        stats = upsertBuffer.stats()
+        self.assertEqual(
+            (stats["items"], stats["batches"], stats["largest_batch"]), (7, 3, 3)
+        )
+
+    async def test_2_groupWhileFlushing(self):
+        """Test that items arriving during a flush join the next batch."""
+
+        upsertBuffer = self._createBuffer(delay=0.02, window=0.001, maxItems=100)
+
+        first = asyncio.ensure_future(upsertBuffer.submit("a"))
+        await asyncio.sleep(0.005)
+        rest = [asyncio.ensure_future(upsertBuffer.submit(item)) for item in "bcd"]
+
+        self.assertEqual(await first, "id-a")
+        self.assertEqual(await asyncio.gather(*rest), ["id-b", "id-c", "id-d"])
+        self.assertEqual([items for items, _ in self.batches], [["a"], list("bcd")])
+
+    async def test_3_errors(self):
+        """Test that a failed item only fails its caller and close flushes."""
+
+        upsertBuffer = self._createBuffer(window=60)
+
+        results = asyncio.gather(
+            upsertBuffer.submit("good"),
+            upsertBuffer.submit("bad"),
+            return_exceptions=True,
+        )
+        await asyncio.sleep(0)
+        await upsertBuffer.close()
+        good, bad = await results
+
+        self.assertEqual(good, "id-good")
+        self.assertIsInstance(bad, ValueError)
+
+        # Test case 2: A failed flush fails every caller of its batch
+        async def flush(items):
+            raise ConnectionError("Database Unavailable")
+
+        upsertBuffer = GroupCommitBuffer(flush, window=0.001)
+        results = await asyncio.gather(
+            upsertBuffer.submit("a"), upsertBuffer.submit("b"), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+
+        with self.assertRaises(ValueError):
+            GroupCommitBuffer(flush, maxItems=0)
+
+    async def test_4_cancelledFlush(self):
+        """Test that cancelling the flusher cancels its batch and the buffered items."""
+
+        upsertBuffer = self._createBuffer(delay=60, window=0, maxItems=1)
+
+        results = asyncio.gather(
+            *[upsertBuffer.submit(item) for item in "abc"], return_exceptions=True
+        )
+        await asyncio.sleep(0.01)
+        upsertBuffer._flusher.cancel()
+
+        self.assertTrue(
+            all(isinstance(result, asyncio.CancelledError) for result in await results)
+        )
+        self.assertEqual([items for items, _ in self.batches], [["a"]])
+        self.assertEqual(upsertBuffer.stats()["pending"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import importlib.util
+import unittest
+from unittest.mock import patch
+
+
+def loadConfig(environ):
+    # Imported like gunicorn -c does, its pool sizes land in os.environ
+    spec = importlib.util.spec_from_file_location(
+        "GunicornConfig",
+        os.path.join(os.path.dirname(__file__), "..", "Configs", "GunicornConfig.py"),
+    )
+    config = importlib.util.module_from_spec(spec)
+    with patch.dict(os.environ, environ, clear=True):
+        spec.loader.exec_module(config)
+        return config, dict(os.environ)
+
+
+class TestGunicornConfig(unittest.TestCase):
+    def test_1_workerCount(self):
+        """Test worker counts derived from CPUs, overrides and caps."""
+
+        config, _ = loadConfig({"WEB_CONCURRENCY": "3"})
+        self.assertEqual(config.workers, 3)
+
+        testCases = [
+            ((8, 1, None), 8),
+            ((8, 2, None), 16),
+            ((8, 1, 4), 4),
+            ((1, 0.5, None), 1),
+        ]
+        for testCase, expected in testCases:
+            self.assertEqual(config.workerCount(*testCase), expected)
+
+    def test_2_poolSizes(self):
+        """Test that per-worker pool sizes follow the worker count."""
+
+        # Test case 1: Budget split across workers
+        _, environ = loadConfig({"WEB_CONCURRENCY": "4", "DB_CONNECTION_BUDGET": "100"})
+        self.assertEqual(environ["DB_POOL_MAX_SIZE"], "25")
+        self.assertNotIn("DB_ASYNC_POOL_MAX_SIZE", environ)
+
+        # Test case 2: Async mode keeps a small blocking pool
+        _, environ = loadConfig(
+            {"WEB_CONCURRENCY": "4", "DB_CONNECTION_BUDGET": "100", "DB_MODE": "async"}
+        )
+        self.assertEqual(environ["DB_POOL_MAX_SIZE"], "6")
+        self.assertEqual(environ["DB_ASYNC_POOL_MAX_SIZE"], "19")
+
+        # Test case 3: Explicit sizes win, min is clamped to max
+        _, environ = loadConfig(
+            {
+                "WEB_CONCURRENCY": "64",
+                "DB_POOL_MAX_SIZE": "2",
+                "DB_POOL_MIN_SIZE": "5",
+            }
+        )
+        self.assertEqual(environ["DB_POOL_MAX_SIZE"], "2")
+        self.assertEqual(environ["DB_POOL_MIN_SIZE"], "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import time
+import queue
+import logging
+import threading
+import unittest
+from Utils.Logger import (
+    SessionIDFilter,
+    DroppingQueueHandler,
+    enableQueueLogging,
+    sessionIDVar,
+)
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+        super().flush()
+
+
+class TestLogger(unittest.TestCase):
+    def _logger(self, name, stream):
+        logger = logging.getLogger(f"Test_Logger.{name}")
+        logger.handlers.clear()
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(session_id)s %(message)s"))
+        logger.addHandler(handler)
+
+        return logger
+
+    def test_1_sessionIDFilter(self):
+        """Test that the filter keeps a session id set when the record was created."""
+
+        record = logging.makeLogRecord({"msg": "Handled", "session_id": "abc"})
+        SessionIDFilter().filter(record)
+        self.assertEqual(record.session_id, "abc")
+
+        record = logging.makeLogRecord({"msg": "Handled"})
+        SessionIDFilter().filter(record)
+        self.assertEqual(record.session_id, "NO_SESSION")
+
+    def test_2_queueLogging(self):
+        """Test that queued records keep their session id and are written in batches."""
+
+        stream = CountingStream()
+        logger = self._logger("queue", stream)
+        queueHandler = enableQueueLogging(logger, maxSize=100, batchSize=50)
+
+        def request(sessionID):
+            sessionIDVar.set(sessionID)
+            for i in range(10):
+                logger.info(f"Line {i}")
+
+        # Each thread has its own context, the listener thread has none
+        threads = [
+            threading.Thread(target=request, args=(f"session-{i}",)) for i in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        queueHandler.listener.stop()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 30)
+        for i in range(3):
+            self.assertEqual(
+                sum(line.startswith(f"session-{i} ") for line in lines), 10
+            )
+        self.assertLessEqual(stream.flushes, queueHandler.listener.batches)
+        self.assertEqual(queueHandler.dropped, 0)
+
+    def test_3_overflow(self):
+        """Test that a full queue drops records without waiting and keeps room for errors."""
+
+        queueHandler = DroppingQueueHandler(queue.Queue(3), errorReserve=1)
+        for i in range(5):
+            queueHandler.handle(
+                logging.makeLogRecord({"msg": f"Line {i}", "levelno": logging.INFO})
+            )
+
+        # Test case 1: Errors take the reserved slot, then are dropped too
+        started = time.monotonic()
+        for _ in range(2):
+            queueHandler.handle(
+                logging.makeLogRecord({"msg": "Failed", "levelno": logging.ERROR})
+            )
+
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(queueHandler.queue.qsize(), 3)
+        self.assertEqual(queueHandler.dropped, 4)
+        self.assertEqual(queueHandler.queue.queue[-1].msg, "Failed")
+
+
+if __name__ == "__main__":
+    unittest.main()
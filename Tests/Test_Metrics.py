@@ -0,0 +1,139 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import contextvars
+import unittest
+from Utils.Metrics import (
+    Histogram,
+    RequestMetrics,
+    MeteredConnection,
+    AsyncMeteredConnection,
+    requestMetricsVar,
+    recordPhase,
+    timed,
+)
+
+
+class FakeCursor:
+    def execute(self, operation, params=None):
+        self.operation = operation
+
+    def fetchall(self):
+        return [(1, "Pen", "Stationary", 1.1)]
+
+    def fetchmany(self, size=1):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self, buffered=True):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+
+class AsyncFakeCursor(FakeCursor):
+    async def execute(self, operation, params=None):
+        self.operation = operation
+
+    async def fetchall(self):
+        return [(1, "Pen", "Stationary", 1.1)]
+
+    async def close(self):
+        pass
+
+
+class AsyncFakeConnection:
+    async def cursor(self, buffered=True):
+        return AsyncFakeCursor()
+
+    async def commit(self):
+        pass
+
+
+class TestMetrics(unittest.TestCase):
+    def _inRequest(self, function):
+        # Each test request gets its own context, like a request task
+        def run():
+            requestMetrics = RequestMetrics()
+            requestMetricsVar.set(requestMetrics)
+            function()
+            return requestMetrics
+
+        return contextvars.copy_context().run(run)
+
+    def test_1_histogram(self):
+        """Test cumulative buckets, sum and count in the exposition format."""
+
+        histogram = Histogram("test_seconds", "Test.", ("endpoint",), (0.1, 1))
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.observe(("/query",), value)
+
+        lines = histogram.render().splitlines()
+        self.assertEqual(lines[1], "# TYPE test_seconds histogram")
+        self.assertEqual(
+            lines[2:],
+            [
+                'test_seconds_bucket{endpoint="/query",le="0.1"} 2',
+                'test_seconds_bucket{endpoint="/query",le="1"} 3',
+                'test_seconds_bucket{endpoint="/query",le="+Inf"} 4',
+                'test_seconds_sum{endpoint="/query"} 2.65',
+                'test_seconds_count{endpoint="/query"} 4',
+            ],
+        )
+
+    def test_2_meteredConnection(self):
+        """Test that statements are timed per phase and counted as round trips."""
+
+        def request():
+            connection = MeteredConnection(FakeConnection())
+            with connection.cursor(buffered=True) as cursor:
+                cursor.execute("SELECT 1")
+                self.assertEqual(cursor.fetchall()[0][0], 1)
+                self.assertEqual(cursor.operation, "SELECT 1")
+            with connection.cursor(buffered=False) as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchmany(10)
+            connection.commit()
+
+        requestMetrics = self._inRequest(request)
+        self.assertEqual(set(requestMetrics.phases), {"execute", "fetch", "commit"})
+        self.assertEqual(requestMetrics.roundTrips, 4)
+
+    def test_3_asyncMeteredConnection(self):
+        """Test the asyncio flavour of the metered connection."""
+
+        async def request():
+            connection = AsyncMeteredConnection(AsyncFakeConnection())
+            async with await connection.cursor(buffered=True) as cursor:
+                await cursor.execute("SELECT 1")
+                await cursor.fetchall()
+            await connection.commit()
+
+        requestMetrics = self._inRequest(lambda: asyncio.run(request()))
+        self.assertEqual(requestMetrics.roundTrips, 2)
+
+    def test_4_outsideRequest(self):
+        """Test that timing code outside of a request is a no-op."""
+
+        @timed("packaging")
+        def package():
+            return "packaged"
+
+        self.assertEqual(package(), "packaged")
+        recordPhase("execute", 1.0)
+        self.assertIsNone(requestMetricsVar.get())
+
+        requestMetrics = self._inRequest(package)
+        self.assertIn("packaging", requestMetrics.phases)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,11 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import json
 import unittest
+from decimal import Decimal
 from datetime import datetime
+from fastapi.exceptions import HTTPException
 from Services.PackagingAgent import PackagingAgent
 
 
@@ -46,11 +49,16 @@ class TestPackagingAgent(unittest.TestCase):
     def test_2_upsertOut(self):
         """Test the upsertOut method."""
 
-        # Test case 1: Normal input
-        testCase, expected = ((123,), {"id": 123})
+        testCases = [
+            # Test case 1: Normal input
+            ((123, "inserted"), {"id": 123, "status": "inserted"}),
+            # Test case 2: Existing row left as is
+            ((123, "unchanged"), {"id": 123, "status": "unchanged"}),
+        ]
 
-        result = self.packagingAgent.upsertOut(testCase)
-        self.assertEqual(result, expected)
+        for testCase, expected in testCases:
+            result = self.packagingAgent.upsertOut(testCase)
+            self.assertEqual(result, expected)
 
     def test_3_queryIn(self):
         """Test the queryIn method."""
@@ -66,28 +74,27 @@ class TestPackagingAgent(unittest.TestCase):
                     "2023-01-01 00:00:00",
                     "2023-12-31 23:59:59",
                     "Electronics",
-                    "Electronics",
                 ),
             ),
             # Test case 2: With only dt_from
             (
                 {"dt_from": dt_from, "category": "Electronics"},
-                ("2023-01-01 00:00:00", None, "Electronics", "Electronics"),
+                ("2023-01-01 00:00:00", None, "Electronics"),
             ),
             # Test case 3: With only dt_to
             (
                 {"dt_to": dt_to, "category": "Electronics"},
-                (None, "2023-12-31 23:59:59", "Electronics", "Electronics"),
+                (None, "2023-12-31 23:59:59", "Electronics"),
             ),
             # Test case 4: Without dates
             (
                 {"category": "Electronics"},
-                (None, None, "Electronics", "Electronics"),
+                (None, None, "Electronics"),
             ),
             # Test case 5: With trailing white spaces
             (
                 {"category": "Electronics  "},
-                (None, None, "Electronics", "Electronics"),
+                (None, None, "Electronics"),
             ),
         ]
 
@@ -107,9 +114,9 @@ class TestPackagingAgent(unittest.TestCase):
             # Test case 1: Multiple items
             (
                 [
-                    (1, "Item 1", "Electronics", "99.99"),
-                    (2, "Item 2", "Books", "19.99"),
-                    (3, "Item 3", "Clothing", "29.99"),
+                    (1, "Item 1", "Electronics", 99.99),
+                    (2, "Item 2", "Books", 19.99),
+                    (3, "Item 3", "Clothing", 29.99),
                 ],
                 {
                     "items": [
@@ -142,7 +149,7 @@ class TestPackagingAgent(unittest.TestCase):
             ),
             # Test case 3: Single item
             (
-                [(1, "Item 1", "Electronics", "99.99")],
+                [(1, "Item 1", "Electronics", 99.99)],
                 {
                     "items": [
                         {
@@ -182,18 +189,17 @@ class TestPackagingAgent(unittest.TestCase):
                     "sort": {"field": "price", "order": "asc"},
                 },
                 (
-                    "notebook",
                     "notebook",
                     "Stationary",
-                    "Stationary",
                     10.50,
                     50.75,
                     "price",
-                    "price",
-                    "price",
+                    "asc",
                     10,
                     0,
-                    "asc",
+                    None,
+                    None,
+                    "exact",
                 ),
             ),
             # Test case 2: Different pagination values
@@ -208,18 +214,17 @@ class TestPackagingAgent(unittest.TestCase):
                     "sort": {"field": "name", "order": "desc"},
                 },
                 (
-                    "pen",
                     "pen",
                     "Office Supplies",
-                    "Office Supplies",
                     1.99,
                     5.99,
                     "name",
-                    "name",
-                    "name",
+                    "desc",
                     20,
                     20,
-                    "desc",
+                    None,
+                    None,
+                    "exact",
                 ),
             ),
             # Test case 3: Rounding of price values
@@ -235,17 +240,16 @@ class TestPackagingAgent(unittest.TestCase):
                 },
                 (
                     "eraser",
-                    "eraser",
-                    "School Supplies",
                     "School Supplies",
                     0.33,
                     9.67,
                     "category",
-                    "category",
-                    "category",
+                    "asc",
                     15,
                     30,
-                    "asc",
+                    None,
+                    None,
+                    "exact",
                 ),
             ),
             # Test case 4: Large pagination values
@@ -261,17 +265,16 @@ class TestPackagingAgent(unittest.TestCase):
                 },
                 (
                     "marker",
-                    "marker",
-                    "Art Supplies",
                     "Art Supplies",
                     5.00,
                     25.00,
                     "price",
-                    "price",
-                    "price",
+                    "desc",
                     100,
                     900,
-                    "desc",
+                    None,
+                    None,
+                    "exact",
                 ),
             ),
             # Test case 5: With trailing white spaces
@@ -286,18 +289,17 @@ class TestPackagingAgent(unittest.TestCase):
                     "sort": {"field": "price", "order": "desc"},
                 },
                 (
-                    "marker",
                     "marker",
                     "Art Supplies",
-                    "Art Supplies",
                     5.00,
                     25.00,
                     "price",
-                    "price",
-                    "price",
+                    "desc",
                     100,
                     900,
-                    "desc",
+                    None,
+                    None,
+                    "exact",
                 ),
             ),
         ]
@@ -311,172 +313,431 @@ class TestPackagingAgent(unittest.TestCase):
                 f"Expected: {expected}\nGot: {result}",
             )
 
+    def test_7_cursorPagination(self):
+        """Test the keyset cursor round trip of advanceQueryIn/advanceQueryOut."""
 
-def test_6_advanceQueryOut(self):
-    """Test the advanceQueryOut method."""
+        payload = {
+            "filters": {"name": None, "category": None, "price_range": [1.0, 5.0]},
+            "pagination": {"page": 1, "limit": 2, "mode": "cursor", "cursor": None},
+            "sort": {"field": "price", "order": "desc"},
+        }
 
-    testCases = [
-        # Test case 1: Empty result set
-        (
-            [],
-            {
-                "filters": {
-                    "name": "notebook",
-                    "category": "Stationary",
-                    "price_range": [10.5, 50.75],
+        # Test case 1: First page has no seek position
+        self.assertEqual(
+            self.packagingAgent.advanceQueryIn(payload)[4:],
+            ("price", "desc", 2, 0, None, None, "exact"),
+        )
+
+        # Test case 2: Full page yields a cursor on the last (price, id)
+        result = self.packagingAgent.advanceQueryOut(
+            (
+                [(7, "Red Pen", "Stationary", 4.5), (3, "Blue Pen", "Stationary", 2.5)],
+                9,
+            ),
+            payload,
+        )
+        self.assertIsNotNone(result["next_cursor"])
+
+        payload["pagination"]["cursor"] = result["next_cursor"]
+        self.assertEqual(
+            self.packagingAgent.advanceQueryIn(payload)[4:],
+            ("price", "desc", 2, 0, 2.5, 3, "exact"),
+        )
+
+        # Test case 3: Short page ends the result set
+        result = self.packagingAgent.advanceQueryOut(
+            ([(2, "Pencil", "Stationary", 1.5)], 9), payload
+        )
+        self.assertIsNone(result["next_cursor"])
+
+        # Test case 4: Cursor reused with a different sort
+        payload["sort"] = {"field": "name", "order": "desc"}
+        with self.assertRaises(HTTPException):
+            self.packagingAgent.advanceQueryIn(payload)
+
+        # Test case 5: Garbage cursor
+        payload["pagination"]["cursor"] = "not-a-cursor"
+        with self.assertRaises(HTTPException):
+            self.packagingAgent.advanceQueryIn(payload)
+
+    def test_6_advanceQueryOut(self):
+        """Test the advanceQueryOut method."""
+
+        testCases = [
+            # Test case 1: Empty result set
+            (
+                ([], 0),
+                {
+                    "filters": {
+                        "name": "notebook",
+                        "category": "Stationary",
+                        "price_range": [10.5, 50.75],
+                    },
+                    "pagination": {"page": 1, "limit": 10},
+                    "sort": {"field": "price", "order": "asc"},
                 },
-                "pagination": {"page": 1, "limit": 10},
-                "sort": {"field": "price", "order": "asc"},
-            },
-            {
-                "items": [],
-                "count": 0,
-                "page": 1,
-                "limit": 10,
-            },
-        ),
-        # Test case 2: Single item result
-        (
-            [(1, "Blue Pen", "Stationary", "2.50")],
-            {
-                "filters": {
-                    "name": "pen",
-                    "category": "Stationary",
-                    "price_range": [1.0, 5.0],
+                {
+                    "items": [],
+                    "count": 0,
+                    "total": 0,
+                    "page": 1,
+                    "limit": 10,
                 },
-                "pagination": {"page": 1, "limit": 10},
-                "sort": {"field": "price", "order": "asc"},
-            },
-            {
-                "items": [
-                    {
-                        "id": 1,
-                        "name": "Blue Pen",
+            ),
+            # Test case 2: Single item result
+            (
+                ([(1, "Blue Pen", "Stationary", 2.50)], 1),
+                {
+                    "filters": {
+                        "name": "pen",
                         "category": "Stationary",
-                        "price": 2.50,
-                    }
-                ],
-                "count": 1,
-                "page": 1,
-                "limit": 10,
-            },  # expected result
-        ),
-        # Test case 3: Multiple items result
-        (
-            [
-                (1, "Blue Pen", "Stationary", "2.50"),
-                (2, "Red Pen", "Stationary", "2.50"),
-                (3, "Black Pen", "Stationary", "2.75"),
-            ],
-            {
-                "filters": {
-                    "name": "pen",
-                    "category": "Stationary",
-                    "price_range": [1.0, 5.0],
+                        "price_range": [1.0, 5.0],
+                    },
+                    "pagination": {"page": 1, "limit": 10},
+                    "sort": {"field": "price", "order": "asc"},
                 },
-                "pagination": {"page": 1, "limit": 10},
-                "sort": {"field": "name", "order": "asc"},
-            },
-            {
-                "items": [
-                    {
-                        "id": 1,
-                        "name": "Blue Pen",
+                {
+                    "items": [
+                        {
+                            "id": 1,
+                            "name": "Blue Pen",
+                            "category": "Stationary",
+                            "price": 2.50,
+                        }
+                    ],
+                    "count": 1,
+                    "total": 1,
+                    "page": 1,
+                    "limit": 10,
+                },  # expected result
+            ),
+            # Test case 3: Multiple items result
+            (
+                (
+                    [
+                        (1, "Blue Pen", "Stationary", 2.50),
+                        (2, "Red Pen", "Stationary", 2.50),
+                        (3, "Black Pen", "Stationary", 2.75),
+                    ],
+                    3,
+                ),
+                {
+                    "filters": {
+                        "name": "pen",
                         "category": "Stationary",
-                        "price": 2.50,
+                        "price_range": [1.0, 5.0],
                     },
-                    {
-                        "id": 2,
-                        "name": "Red Pen",
+                    "pagination": {"page": 1, "limit": 10},
+                    "sort": {"field": "name", "order": "asc"},
+                },
+                {
+                    "items": [
+                        {
+                            "id": 1,
+                            "name": "Blue Pen",
+                            "category": "Stationary",
+                            "price": 2.50,
+                        },
+                        {
+                            "id": 2,
+                            "name": "Red Pen",
+                            "category": "Stationary",
+                            "price": 2.50,
+                        },
+                        {
+                            "id": 3,
+                            "name": "Black Pen",
+                            "category": "Stationary",
+                            "price": 2.75,
+                        },
+                    ],
+                    "count": 3,
+                    "total": 3,
+                    "page": 1,
+                    "limit": 10,
+                },
+            ),
+            # Test case 4: Different pagination values
+            (
+                (
+                    [
+                        (4, "Notebook", "Stationary", 12.99),
+                        (5, "Planner", "Stationary", 15.50),
+                    ],
+                    7,
+                ),
+                {
+                    "filters": {
+                        "name": "notebook",
                         "category": "Stationary",
-                        "price": 2.50,
+                        "price_range": [10.0, 20.0],
                     },
-                    {
-                        "id": 3,
-                        "name": "Black Pen",
-                        "category": "Stationary",
-                        "price": 2.75,
+                    "pagination": {"page": 2, "limit": 5},
+                    "sort": {"field": "price", "order": "desc"},
+                },
+                {
+                    "items": [
+                        {
+                            "id": 4,
+                            "name": "Notebook",
+                            "category": "Stationary",
+                            "price": 12.99,
+                        },
+                        {
+                            "id": 5,
+                            "name": "Planner",
+                            "category": "Stationary",
+                            "price": 15.50,
+                        },
+                    ],
+                    "count": 2,
+                    "total": 7,
+                    "page": 2,
+                    "limit": 5,
+                },
+            ),
+            # Test case 5: Price passed through unrounded
+            (
+                ([(6, "Premium Marker", "Art Supplies", 7.99999)], 1),
+                {
+                    "filters": {
+                        "name": "marker",
+                        "category": "Art Supplies",
+                        "price_range": [5.0, 10.0],
                     },
-                ],
-                "count": 3,
-                "page": 1,
-                "limit": 10,
-            },
-        ),
-        # Test case 4: Different pagination values
-        (
-            [
-                (4, "Notebook", "Stationary", "12.99"),
-                (5, "Planner", "Stationary", "15.50"),
-            ],
-            {
-                "filters": {
-                    "name": "notebook",
-                    "category": "Stationary",
-                    "price_range": [10.0, 20.0],
+                    "pagination": {"page": 1, "limit": 10},
+                    "sort": {"field": "price", "order": "asc"},
                 },
-                "pagination": {"page": 2, "limit": 5},
-                "sort": {"field": "price", "order": "desc"},
-            },
+                {
+                    "items": [
+                        {
+                            "id": 6,
+                            "name": "Premium Marker",
+                            "category": "Art Supplies",
+                            "price": 7.99999,
+                        }
+                    ],
+                    "count": 1,
+                    "total": 1,
+                    "page": 1,
+                    "limit": 10,
+                },
+            ),
+        ]
+
+        for testCaseOutPayload, testCaseInPayload, expected in testCases:
+            result = self.packagingAgent.advanceQueryOut(
+                testCaseOutPayload, testCaseInPayload
+            )
+            self.assertEqual(
+                result,
+                expected,
+                f"Test failed for params {testCaseOutPayload, testCaseInPayload}\n"
+                f"Expected: {expected}\nGot: {result}",
+            )
+
+    def test_8_bulkUpsertIn(self):
+        """Test the bulkUpsertIn method."""
+
+        # Test case 1: JSON list with one invalid item
+        body = json.dumps(
+            [
+                {"name": "Pen ", "category": "Stationary", "price": 1.5},
+                {"name": "Cup", "category": "Kitchen"},
+                {"name": "Tea", "category": " Drinks", "price": "2"},
+            ]
+        ).encode()
+        itemCount, payload, failures = self.packagingAgent.bulkUpsertIn(body)
+        self.assertEqual(itemCount, 3)
+        self.assertEqual(
+            payload,
+            [(0, ("Pen", "Stationary", "1.50")), (2, ("Tea", "Drinks", "2.00"))],
+        )
+        self.assertEqual(list(failures), [1])
+        self.assertIn("price", failures[1])
+
+        # Test case 2: {"items": [...]} wrapper
+        body = json.dumps(
+            {"items": [{"name": "Pen", "category": "Stationary", "price": 1}]}
+        ).encode()
+        itemCount, payload, failures = self.packagingAgent.bulkUpsertIn(body)
+        self.assertEqual((itemCount, failures), (1, {}))
+
+        # Test case 3: NDJSON with a malformed line and a blank line
+        body = (
+            b'{"name": "Pen", "category": "Stationary", "price": 1}\n'
+            b"{not json\n"
+            b"\n"
+            b'{"name": "Tea", "category": "Drinks", "price": 2}\n'
+        )
+        itemCount, payload, failures = self.packagingAgent.bulkUpsertIn(
+            body, "application/x-ndjson; charset=utf-8"
+        )
+        self.assertEqual(itemCount, 3)
+        self.assertEqual([index for index, _ in payload], [0, 2])
+        self.assertEqual(list(failures), [1])
+
+        # Test case 4: Malformed JSON body and non-list body
+        for body in [b"[{", b'{"name": "Pen"}']:
+            with self.assertRaises(HTTPException):
+                self.packagingAgent.bulkUpsertIn(body, "application/json")
+
+    def test_9_bulkUpsertOut(self):
+        """Test the bulkUpsertOut method."""
+
+        result = self.packagingAgent.bulkUpsertOut(
+            4, {0: 11, 2: 12, 3: 11}, {1: "price: Field required"}
+        )
+        self.assertEqual(
+            result,
             {
-                "items": [
-                    {
-                        "id": 4,
-                        "name": "Notebook",
-                        "category": "Stationary",
-                        "price": 12.99,
-                    },
-                    {
-                        "id": 5,
-                        "name": "Planner",
-                        "category": "Stationary",
-                        "price": 15.50,
-                    },
-                ],
-                "count": 2,
-                "page": 2,
-                "limit": 5,
+                "ids": [11, None, 12, 11],
+                "failures": [{"index": 1, "detail": "price: Field required"}],
+                "upserted": 3,
+                "failed": 1,
             },
-        ),
-        # Test case 5: String price conversion to float
-        (
-            [(6, "Premium Marker", "Art Supplies", "7.99999")],
-            {
-                "filters": {
-                    "name": "marker",
-                    "category": "Art Supplies",
-                    "price_range": [5.0, 10.0],
+        )
+
+    def test_10_queryStreamOut(self):
+        """Test that the streamed body matches queryOut in both formats."""
+
+        batches = [
+            [(1, "Pen", "Stationary", 1.1), (2, "Ink", "Stationary", 2.2)],
+            [(3, "Tea", "Drinks", 3.3)],
+        ]
+        rows = [row for batch in batches for row in batch]
+
+        testCases = [
+            # Test case 1: Several batches
+            (batches, rows),
+            # Test case 2: Empty result
+            ([], []),
+        ]
+
+        for testBatches, testRows in testCases:
+            body = b"".join(self.packagingAgent.queryStreamOut(testBatches, "json"))
+            self.assertEqual(json.loads(body), self.packagingAgent.queryOut(testRows))
+
+            lines = b"".join(
+                self.packagingAgent.queryStreamOut(testBatches, "ndjson")
+            ).splitlines()
+            expected = self.packagingAgent.queryOut(testRows)
+            self.assertEqual(
+                [json.loads(line) for line in lines[:-1]], expected["items"]
+            )
+            self.assertEqual(
+                json.loads(lines[-1]), {"total_price": expected["total_price"]}
+            )
+
+    def test_11_querySummaryOut(self):
+        """Test the querySummaryOut method."""
+
+        testCases = [
+            # Test case 1: Ungrouped
+            (([(3, Decimal("0.30"))], None), {"count": 3, "total_price": 0.3}),
+            # Test case 2: Empty result
+            (([(0, Decimal("0"))], None), {"count": 0, "total_price": 0.0}),
+            # Test case 3: Grouped by category, totals summed exactly
+            (
+                (
+                    [("Drinks", 2, Decimal("0.10")), ("Food", 1, Decimal("0.20"))],
+                    "category",
+                ),
+                {
+                    "count": 3,
+                    "total_price": 0.3,
+                    "groups": [
+                        {"category": "Drinks", "count": 2, "total_price": 0.1},
+                        {"category": "Food", "count": 1, "total_price": 0.2},
+                    ],
                 },
-                "pagination": {"page": 1, "limit": 10},
-                "sort": {"field": "price", "order": "asc"},
+            ),
+        ]
+
+        for (testCase, groupBy), expected in testCases:
+            result = self.packagingAgent.querySummaryOut(testCase, groupBy)
+            self.assertEqual(result, expected)
+
+    def test_12_columnarOut(self):
+        """Test the columnar layout of queryOut and advanceQueryOut."""
+
+        rows = [(1, "Pen", "Stationary", 1.1), (2, "Tea", "Drinks", 2.25)]
+        inPayload = {
+            "filters": {},
+            "pagination": {"page": 1, "limit": 10},
+            "sort": {"field": "id", "order": "asc"},
+        }
+
+        # Test case 1: Parallel arrays in row order
+        self.assertEqual(
+            self.packagingAgent.queryOut(rows, "columnar"),
+            {
+                "ids": [1, 2],
+                "names": ["Pen", "Tea"],
+                "categories": ["Stationary", "Drinks"],
+                "prices": [1.1, 2.25],
+                "total_price": 3.35,
             },
+        )
+
+        # Test case 2: Empty result keeps every array
+        self.assertEqual(
+            self.packagingAgent.advanceQueryOut(([], 0), inPayload, "columnar"),
             {
-                "items": [
-                    {
-                        "id": 6,
-                        "name": "Premium Marker",
-                        "category": "Art Supplies",
-                        "price": 7.99999,
-                    }
-                ],
-                "count": 1,
+                "ids": [],
+                "names": [],
+                "categories": [],
+                "prices": [],
+                "count": 0,
+                "total": 0,
                 "page": 1,
                 "limit": 10,
             },
-        ),
-    ]
+        )
 
-    for testCaseOutPayload, testCaseInPayload, expected in testCases:
-        result = self.packagingAgent.advanceQueryOut(
-            testCaseOutPayload, testCaseInPayload
+    def test_13_changes(self):
+        """Test the change feed cursor round trip of changesIn/changesOut."""
+
+        # Test case 1: Start positions
+        self.assertEqual(
+            self.packagingAgent.changesIn({"cursor": None, "since": None, "limit": 2}),
+            ("1000-01-01 00:00:00", 0, 2),
+        )
+        changesInPayload = self.packagingAgent.changesIn(
+            {"cursor": None, "since": datetime(2024, 1, 1, 10), "limit": 2}
+        )
+        self.assertEqual(changesInPayload, ("2024-01-01 10:00:00", 0, 2))
+
+        # Test case 2: Full page resumes after its last (last_updated_dt, id)
+        result = self.packagingAgent.changesOut(
+            [
+                (7, "Red Pen", "Stationary", 4.5, datetime(2024, 1, 1, 10, 0, 1)),
+                (3, "Blue Pen", "Stationary", 2.5, datetime(2024, 1, 1, 10, 0, 1)),
+            ],
+            changesInPayload,
         )
+        self.assertEqual(result["count"], 2)
+        self.assertTrue(result["has_more"])
+        self.assertEqual(result["items"][1]["last_updated_dt"], "2024-01-01 10:00:01")
         self.assertEqual(
-            result,
-            expected,
-            f"Test failed for params {testCaseOutPayload, testCaseInPayload}\n"
-            f"Expected: {expected}\nGot: {result}",
+            self.packagingAgent.changesIn(
+                {"cursor": result["next_cursor"], "since": None, "limit": 2}
+            ),
+            ("2024-01-01 10:00:01", 3, 2),
         )
 
+        # Test case 3: Empty page keeps the position
+        empty = self.packagingAgent.changesOut([], ("2024-01-01 10:00:01", 3, 2))
+        self.assertEqual(empty["next_cursor"], result["next_cursor"])
+        self.assertFalse(empty["has_more"])
+
+        # Test case 4: Garbage and /advance-query cursors
+        for cursor in ["not-a-cursor", "WyJwcmljZSIsICJhc2MiLCAyLjUsIDNd"]:
+            with self.assertRaises(HTTPException):
+                self.packagingAgent.changesIn(
+                    {"cursor": cursor, "since": None, "limit": 2}
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
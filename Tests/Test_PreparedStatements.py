@@ -0,0 +1,108 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import unittest
+from mysql.connector import errorcode
+from mysql.connector.errors import DatabaseError
+from Utils.PreparedStatements import PreparedStatementCache
+
+
+class FakePreparedCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = None
+        self.prepares = 0
+        self.closed = False
+        self.with_rows = False
+
+    def execute(self, statement, params=None):
+        if self.connection.sessionReset:
+            self.connection.sessionReset = False
+            raise DatabaseError(errno=errorcode.ER_UNKNOWN_STMT_HANDLER)
+        # Same rule as mysql.connector: re-prepare unless the very same object
+        if statement is not self.executed:
+            self.executed = statement
+            self.prepares += 1
+        self.with_rows = statement.startswith("SELECT")
+        self.params = params
+
+    def fetchall(self):
+        return [self.params]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursors = []
+        self.sessionReset = False
+
+    def cursor(self, prepared=False):
+        self.cursors.append(FakePreparedCursor(self))
+        return self.cursors[-1]
+
+
+class TestPreparedStatements(unittest.TestCase):
+    def test_1_reuse(self):
+        """Test that equal SQL text reuses one prepared statement per connection."""
+
+        cache = PreparedStatementCache()
+        connection, otherConnection = FakeConnection(), FakeConnection()
+
+        for i in range(3):
+            # A new but equal str every call, like an f-string
+            rows, cursor = cache.execute(
+                connection, "".join(["SELECT id ", "WHERE name = %s"]), (f"Pen {i}",)
+            )
+            self.assertEqual(rows, [(f"Pen {i}",)])
+        cache.execute(otherConnection, "SELECT id WHERE name = %s", ("Pen",))
+        rows, _ = cache.execute(connection, "INSERT INTO t VALUES (%s)", ("Pen",))
+
+        self.assertEqual(rows, [])
+        self.assertEqual(len(connection.cursors), 2)
+        self.assertEqual(cursor.prepares, 1)
+        stats = cache.stats()
+        self.assertEqual((stats["prepared"], stats["reused"]), (3, 2))
+        self.assertEqual((stats["connections"], stats["statements"]), (2, 3))
+
+    def test_2_eviction(self):
+        """Test that the least recently used statement is closed at max size."""
+
+        cache = PreparedStatementCache(maxSize=2)
+        connection = FakeConnection()
+
+        for statement in ["SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"]:
+            cache.execute(connection, statement)
+
+        self.assertTrue(connection.cursors[1].closed)
+        self.assertFalse(connection.cursors[0].closed)
+        self.assertEqual(cache.stats()["evicted"], 1)
+
+    def test_3_reprepare(self):
+        """Test that statements lost to a reconnect are prepared again."""
+
+        cache = PreparedStatementCache()
+        connection = FakeConnection()
+        cache.execute(connection, "SELECT 1")
+
+        connection.sessionReset = True
+        rows, cursor = cache.execute(connection, "SELECT 1", ("again",))
+
+        self.assertEqual(rows, [("again",)])
+        self.assertIs(cursor, connection.cursors[-1])
+        self.assertEqual(len(connection.cursors), 2)
+        self.assertEqual(cache.stats()["reprepared"], 1)
+
+        # Other errors are raised and the failed statement is dropped
+        connection.cursors[-1].execute = lambda *args: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            cache.execute(connection, "SELECT 1")
+        self.assertTrue(connection.cursors[-1].closed)
+        self.assertEqual(cache.stats()["statements"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import unittest
+from Utils.QueryBuilder import (
+    buildQuery,
+    buildQuerySummary,
+    buildAdvanceQuery,
+    buildAdvanceCount,
+    buildChanges,
+    compileAdvanceQuery,
+)
+
+
+class TestQueryBuilder(unittest.TestCase):
+    def normalise(self, query):
+        return " ".join(query.split())
+
+    def test_1_buildAdvanceQuery(self):
+        """Test that only requested predicates and one ORDER BY column are emitted."""
+
+        testCases = [
+            # Test case 1: All filters
+            (
+                ("pen", "Stationary", 1.0, 5.0, "price", "asc", 10, 0, None, None),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY "
+                    "WHERE name = %s AND category = %s AND price BETWEEN %s AND %s "
+                    "ORDER BY price ASC, id ASC LIMIT %s OFFSET %s",
+                    ("pen", "Stationary", 1.0, 5.0, 10, 0),
+                ),
+            ),
+            # Test case 2: Only price range, descending name sort
+            (
+                (None, None, 1.0, 5.0, "name", "desc", 20, 40, None, None),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY "
+                    "WHERE price BETWEEN %s AND %s "
+                    "ORDER BY name DESC, id DESC LIMIT %s OFFSET %s",
+                    (1.0, 5.0, 20, 40),
+                ),
+            ),
+            # Test case 3: Keyset seek position
+            (
+                (None, "Stationary", 1.0, 5.0, "category", "asc", 5, 0, "Drinks", 7),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY "
+                    "WHERE category = %s AND price BETWEEN %s AND %s "
+                    "AND (category > %s OR (category = %s AND id > %s)) "
+                    "ORDER BY category ASC, id ASC LIMIT %s OFFSET %s",
+                    ("Stationary", 1.0, 5.0, "Drinks", "Drinks", 7, 5, 0),
+                ),
+            ),
+            # Test case 4: No filters at all
+            (
+                (None, None, None, None, "price", "desc", 5, 0, None, None),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY "
+                    "ORDER BY price DESC, id DESC LIMIT %s OFFSET %s",
+                    (5, 0),
+                ),
+            ),
+        ]
+
+        for testCase, (expectedQuery, expectedParams) in testCases:
+            query, params = buildAdvanceQuery("INVENTORY", testCase)
+            self.assertEqual(self.normalise(query), expectedQuery)
+            self.assertEqual(params, expectedParams)
+
+    def test_2_whitelist(self):
+        """Test that sort fields and directions outside the whitelist are rejected."""
+
+        invalidTestCases = [
+            ("price; DROP TABLE INVENTORY", "asc"),
+            ("price", "asc, id"),
+        ]
+
+        for sortField, sortOrder in invalidTestCases:
+            with self.assertRaises(ValueError):
+                compileAdvanceQuery(
+                    "INVENTORY", False, False, True, True, sortField, sortOrder, False
+                )
+
+    def test_3_statement_cache(self):
+        """Test that statement text is compiled once per filter shape."""
+
+        compileAdvanceQuery.cache_clear()
+        for name in ["pen", "pencil", "eraser"]:
+            buildAdvanceQuery(
+                "INVENTORY", (name, None, 1.0, 5.0, "price", "asc", 10, 0, None, None)
+            )
+        buildAdvanceQuery(
+            "INVENTORY", (None, None, 1.0, 5.0, "price", "asc", 10, 0, None, None)
+        )
+
+        cacheInfo = compileAdvanceQuery.cache_info()
+        self.assertEqual(cacheInfo.misses, 2)
+        self.assertEqual(cacheInfo.hits, 2)
+
+    def test_4_buildQuery(self):
+        """Test that /query only filters on the fields it was given."""
+
+        testCases = [
+            # Test case 1: Category and date window
+            (
+                ("2023-01-01 00:00:00", "2023-12-31 23:59:59", "Drinks"),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY "
+                    "WHERE category = %s AND last_updated_dt >= %s "
+                    "AND last_updated_dt <= %s",
+                    ("Drinks", "2023-01-01 00:00:00", "2023-12-31 23:59:59"),
+                ),
+            ),
+            # Test case 2: Only dt_to
+            (
+                (None, "2023-12-31 23:59:59", None),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY "
+                    "WHERE last_updated_dt <= %s",
+                    ("2023-12-31 23:59:59",),
+                ),
+            ),
+            # Test case 3: No filters
+            (
+                (None, None, None),
+                (
+                    "SELECT id, name, category, CAST(price AS DOUBLE) FROM INVENTORY",
+                    (),
+                ),
+            ),
+        ]
+
+        for testCase, (expectedQuery, expectedParams) in testCases:
+            query, params = buildQuery("INVENTORY", testCase)
+            self.assertEqual(self.normalise(query), expectedQuery)
+            self.assertEqual(params, expectedParams)
+
+    def test_5_buildAdvanceCount(self):
+        """Test that the total counts the filtered set without seek or paging."""
+
+        testCase = ("pen", None, 1.0, 5.0, "price", "asc", 10, 0, 2.5, 3, "exact")
+
+        query, params = buildAdvanceCount("INVENTORY", testCase)
+        self.assertEqual(
+            self.normalise(query),
+            "SELECT COUNT(*) FROM INVENTORY WHERE name = %s AND price BETWEEN %s AND %s",
+        )
+        self.assertEqual(params, ("pen", 1.0, 5.0))
+
+        query, params = buildAdvanceCount("INVENTORY", testCase, estimate=True)
+        self.assertEqual(
+            self.normalise(query),
+            "EXPLAIN SELECT 1 FROM INVENTORY WHERE name = %s AND price BETWEEN %s AND %s",
+        )
+
+    def test_6_buildQuerySummary(self):
+        """Test that summaries aggregate in SQL with a whitelisted GROUP BY."""
+
+        query, params = buildQuerySummary("INVENTORY", (None, None, "Drinks"))
+        self.assertEqual(
+            self.normalise(query),
+            "SELECT COUNT(*), COALESCE(SUM(price), 0) FROM INVENTORY "
+            "WHERE category = %s",
+        )
+        self.assertEqual(params, ("Drinks",))
+
+        query, params = buildQuerySummary(
+            "INVENTORY", ("2023-01-01 00:00:00", None, None), "category"
+        )
+        self.assertEqual(
+            self.normalise(query),
+            "SELECT category, COUNT(*), COALESCE(SUM(price), 0) FROM INVENTORY "
+            "WHERE last_updated_dt >= %s GROUP BY category ORDER BY category",
+        )
+        self.assertEqual(params, ("2023-01-01 00:00:00",))
+
+        with self.assertRaises(ValueError):
+            buildQuerySummary("INVENTORY", (None, None, None), "name; DROP")
+
+    def test_7_buildChanges(self):
+        """Test that the change feed seeks past its cursor and skips unsettled rows."""
+
+        query, params = buildChanges("INVENTORY", ("2024-01-01 10:00:00", 42, 100), 2)
+        self.assertEqual(
+            self.normalise(query),
+            "SELECT id, name, category, CAST(price AS DOUBLE), last_updated_dt "
+            "FROM INVENTORY WHERE last_updated_dt >= %s "
+            "AND (last_updated_dt > %s OR id > %s) "
+            "AND last_updated_dt < NOW() - INTERVAL %s SECOND "
+            "ORDER BY last_updated_dt, id LIMIT %s",
+        )
+        self.assertEqual(
+            params, ("2024-01-01 10:00:00", "2024-01-01 10:00:00", 42, 2, 100)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import unittest
+from contextlib import contextmanager
+from mysql.connector.errors import OperationalError, ProgrammingError
+from Utils.SessionMiddleware import clientSessionVar
+from Utils.ReplicaRouter import ReplicaRouter, ReplicaUnavailableError
+
+
+class FakePool:
+    def __init__(self, name, inUse=0):
+        self.name = name
+        self.inUse = inUse
+
+    @contextmanager
+    def connection(self):
+        self.inUse += 1
+        try:
+            yield self
+        finally:
+            self.inUse -= 1
+
+    def stats(self):
+        return {"name": self.name, "in_use": self.inUse, "waiting": 0}
+
+
+class TestReplicaRouter(unittest.TestCase):
+    def setUp(self):
+        self.token = clientSessionVar.set("reader")
+
+    def tearDown(self):
+        clientSessionVar.reset(self.token)
+
+    def test_1_balance(self):
+        """Test that reads go to the least loaded replica, or the primary without any."""
+
+        self.assertIsNone(ReplicaRouter([]).choose())
+
+        busy, idle = FakePool("busy", inUse=3), FakePool("idle")
+        router = ReplicaRouter([busy, idle])
+        self.assertEqual({router.choose().pool.name for _ in range(4)}, {"idle"})
+
+        # Equally loaded replicas take turns
+        busy.inUse = 0
+        self.assertEqual(
+            {router.choose().pool.name for _ in range(4)}, {"busy", "idle"}
+        )
+        self.assertEqual(
+            [replica["reads"] for replica in router.stats()["replicas"]], [2, 6]
+        )
+
+    def test_2_sticky(self):
+        """Test that a session reads from the primary shortly after its own write."""
+
+        router = ReplicaRouter([FakePool("replica")], stickySeconds=0.05)
+        self.assertTrue(router.settled())
+
+        writer = clientSessionVar.set("writer")
+        router.recordWrite()
+        self.assertTrue(router.isSticky())
+        self.assertIsNone(router.choose())
+        clientSessionVar.reset(writer)
+        self.assertFalse(router.isSticky())
+
+        # Other sessions keep reading from the replica, the cache waits
+        self.assertIsNotNone(router.choose())
+        self.assertFalse(router.settled())
+
+        time.sleep(0.06)
+        writer = clientSessionVar.set("writer")
+        self.assertIsNotNone(router.choose())
+        clientSessionVar.reset(writer)
+        self.assertTrue(router.settled())
+
+        stats = router.stats()
+        self.assertEqual((stats["sticky_reads"], stats["sticky_sessions"]), (1, 1))
+
+        # Writes outside a client session add none, expired ones are dropped
+        outside = clientSessionVar.set(None)
+        router.recordWrite()
+        self.assertFalse(router.isSticky())
+        clientSessionVar.reset(outside)
+        self.assertEqual(router.stats()["sticky_sessions"], 0)
+
+    def test_3_failover(self):
+        """Test that a failed replica is skipped until its cooldown is over."""
+
+        first, second = FakePool("first"), FakePool("second", inUse=1)
+        router = ReplicaRouter([first, second], cooldown=0.05)
+
+        # Query errors say nothing about the replica's health
+        with self.assertRaises(ProgrammingError):
+            with router.connection(router.choose()):
+                raise ProgrammingError("You have an error in your SQL syntax")
+
+        with self.assertRaises(ReplicaUnavailableError) as raised:
+            with router.connection(router.choose()):
+                raise OperationalError("Lost connection to MySQL server")
+        self.assertIsInstance(raised.exception.dbError, OperationalError)
+
+        self.assertEqual(router.choose().pool.name, "second")
+        with self.assertRaises(ReplicaUnavailableError):
+            with router.connection(router.choose()):
+                raise OperationalError("Lost connection to MySQL server")
+
+        # Every replica down, the primary serves the read
+        self.assertIsNone(router.choose())
+        stats = router.stats()
+        self.assertEqual((stats["failovers"], stats["fallback_reads"]), (2, 1))
+        self.assertEqual(
+            [replica["down"] for replica in stats["replicas"]], [True, True]
+        )
+
+        time.sleep(0.06)
+        self.assertEqual(router.choose().pool.name, "first")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import unittest
+from decimal import Decimal
+from datetime import datetime
+from unittest.mock import patch
+from Utils.ResultCache import ResultCache, LocalCacheBackend, loadBackend
+
+
+class StrictBackend:
+    # Stores like redis-py: bytes values, whole-second TTLs, counters as bytes
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ttl):
+        if not isinstance(value, bytes) or not isinstance(ttl, int):
+            raise TypeError(f"Invalid input of type {type(value).__name__}")
+        self.values[key] = value
+        self.ttls[key] = ttl
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+        return int(self.values[key])
+
+
+class TestResultCache(unittest.TestCase):
+    def _fill(self, cache, key, value, tag=None):
+        hit, _, entryKey = cache.lookup(key, tag)
+        self.assertFalse(hit)
+        cache.store(entryKey, value)
+
+    def test_1_readThrough(self):
+        """Test hits, misses and TTL expiry."""
+
+        cache = ResultCache(ttl=0.05)
+        self._fill(cache, ("query", (None, None, "Drinks")), [(1,)], "Drinks")
+
+        hit, value, _ = cache.lookup(("query", (None, None, "Drinks")), "Drinks")
+        self.assertTrue(hit)
+        self.assertEqual(value, [(1,)])
+
+        # TTLs are rounded up to whole seconds
+        expired = time.monotonic() + 1.01
+        with patch("time.monotonic", return_value=expired):
+            hit, _, _ = cache.lookup(("query", (None, None, "Drinks")), "Drinks")
+        self.assertFalse(hit)
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_2_eviction(self):
+        """Test that the least recently used entry is evicted at max size."""
+
+        cache = ResultCache(maxSize=2)
+        self._fill(cache, "a", 1)
+        self._fill(cache, "b", 2)
+        cache.lookup("a")
+        self._fill(cache, "c", 3)
+
+        self.assertTrue(cache.lookup("a")[0])
+        self.assertFalse(cache.lookup("b")[0])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_3_invalidate(self):
+        """Test that a write drops its category and every unfiltered entry."""
+
+        cache = ResultCache()
+        self._fill(cache, "drinks", 1, "Drinks")
+        self._fill(cache, "food", 2, "Food")
+        self._fill(cache, "everything", 3)
+
+        # Test case 1: Category compared like MySQL's case-insensitive collation
+        cache.invalidate("DRINKS")
+        self.assertFalse(cache.lookup("drinks", "Drinks")[0])
+        self.assertTrue(cache.lookup("food", "Food")[0])
+        self.assertFalse(cache.lookup("everything")[0])
+
+        # Test case 2: Drop everything
+        cache.invalidateAll()
+        self.assertFalse(cache.lookup("food", "Food")[0])
+
+    def test_4_raceWithWrite(self):
+        """Test that a read started before an invalidation is never served after it."""
+
+        cache = ResultCache()
+        _, _, entryKey = cache.lookup("drinks", "Drinks")
+        cache.invalidate("Drinks")
+        cache.store(entryKey, "stale")
+
+        self.assertFalse(cache.lookup("drinks", "Drinks")[0])
+
+    def test_5_sharedBackend(self):
+        """Test that caches sharing a backend see each other's invalidations."""
+
+        backend = LocalCacheBackend()
+        workerA, workerB = ResultCache(backend=backend), ResultCache(backend=backend)
+        self._fill(workerA, "drinks", 1, "Drinks")
+
+        self.assertTrue(workerB.lookup("drinks", "Drinks")[0])
+        workerB.invalidate("Drinks")
+        self.assertFalse(workerA.lookup("drinks", "Drinks")[0])
+
+    def test_6_disabled(self):
+        """Test that a zero TTL turns the cache off."""
+
+        cache = ResultCache(ttl=0)
+        self.assertEqual(cache.lookup("drinks", "Drinks"), (False, None, None))
+        cache.store(None, 1)
+        cache.invalidate("Drinks")
+        self.assertEqual(cache.stats()["stores"], 0)
+
+    def test_7_byteBackend(self):
+        """Test that shared backends only get bytes values and whole-second TTLs."""
+
+        backend = StrictBackend()
+        workerA = ResultCache(ttl=2.5, backend=backend)
+        workerB = ResultCache(ttl=2.5, backend=backend)
+        rows = [(1, "Item A", "Drinks", Decimal("1.50"), datetime(2024, 1, 1))]
+        self._fill(workerA, "drinks", rows, "Drinks")
+
+        # Test case 1: Rows round-trip with their types
+        hit, value, _ = workerB.lookup("drinks", "Drinks")
+        self.assertTrue(hit)
+        self.assertEqual(value, rows)
+        self.assertEqual(set(backend.ttls.values()), {3})
+
+        # Test case 2: Generations read back as bytes still invalidate
+        workerB.invalidate("Drinks")
+        self.assertFalse(workerA.lookup("drinks", "Drinks")[0])
+
+        # Test case 3: Backend chosen by "module:factory"
+        self.assertIsInstance(
+            loadBackend("Utils.ResultCache:LocalCacheBackend"), LocalCacheBackend
+        )
+        with self.assertRaises(ValueError):
+            loadBackend("Utils.ResultCache")
+
+
+if __name__ == "__main__":
+    unittest.main()
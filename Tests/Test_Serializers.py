@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import unittest
+from unittest.mock import patch
+from fastapi.responses import JSONResponse
+from Services.PackagingAgent import PackagingAgent
+from Utils import Serializers
+from Utils.Serializers import (
+    SERIALIZERS,
+    MsgPackResponse,
+    ResponseClass,
+    getSerializer,
+    negotiateResponseClass,
+)
+
+
+class TestSerializers(unittest.TestCase):
+    def test_1_sameDocument(self):
+        """Test that every serializer encodes responses to the same JSON document."""
+
+        response = PackagingAgent().queryOut(
+            [(1, "Pen", "Stationary", 1.1), (2, "Café au lait", "Drinks", 2.25)]
+        )
+
+        for name, (responseClass, dumps) in SERIALIZERS.items():
+            if name == "orjson" and Serializers.orjson is None:
+                continue
+            self.assertEqual(json.loads(dumps(response)), response, name)
+            self.assertEqual(json.loads(responseClass(response).body), response, name)
+
+    def test_2_getSerializer(self):
+        """Test serializer selection, fallback and rejection of unknown names."""
+
+        self.assertIs(getSerializer("json")[0], JSONResponse)
+
+        with patch.object(Serializers, "orjson", None):
+            self.assertIs(getSerializer("orjson")[0], JSONResponse)
+
+        with self.assertRaises(ValueError):
+            getSerializer("pickle")
+
+    @unittest.skipIf(Serializers.msgpack is None, "msgpack is not installed")
+    def test_3_negotiateResponseClass(self):
+        """Test Accept negotiation between JSON and MessagePack."""
+
+        testCases = [
+            # Test case 1: No preference
+            (None, ResponseClass),
+            ("*/*", ResponseClass),
+            # Test case 2: Explicit MessagePack
+            ("application/msgpack", MsgPackResponse),
+            ("application/x-msgpack, */*;q=0.1", MsgPackResponse),
+            # Test case 3: Quality values, JSON wins ties
+            ("application/msgpack;q=0.5, application/json", ResponseClass),
+            ("application/msgpack, application/json", ResponseClass),
+            ("application/msgpack, application/json;q=0.9", MsgPackResponse),
+        ]
+
+        for accept, expected in testCases:
+            self.assertIs(negotiateResponseClass(accept), expected, accept)
+
+        with patch.object(Serializers, "msgpack", None):
+            self.assertIs(negotiateResponseClass("application/msgpack"), ResponseClass)
+
+        response = {"ids": [1], "names": ["Pen"], "prices": [1.1]}
+        body = MsgPackResponse(response).body
+        self.assertEqual(Serializers.msgpack.unpackb(body), response)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import logging
+import unittest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from Utils.Logger import createLogger
+from Utils.SessionMiddleware import (
+    SessionTrackingMiddleware,
+    newSessionID,
+    clientSessionVar,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestSessionMiddleware(unittest.TestCase):
+    def _client(self, sampleRate=1.0):
+        app = FastAPI()
+        logger = createLogger()
+
+        @app.get("/session")
+        async def session(request: Request):
+            logger.info("Invoked session API...")
+            logger.warning("Session API warning...")
+            return {
+                "session_id": request.state.session_id,
+                "client_session": clientSessionVar.get(),
+            }
+
+        app.add_middleware(SessionTrackingMiddleware, sampleRate=sampleRate)
+        return TestClient(app)
+
+    def test_1_requestID(self):
+        """Test that a valid X-Request-ID is reused and echoed, others replaced."""
+
+        client = self._client()
+
+        # Test case 1: Incoming id reused
+        response = client.get("/session", headers={"X-Request-ID": "frontend-42"})
+        self.assertEqual(response.json()["session_id"], "frontend-42")
+        self.assertEqual(response.headers["x-request-id"], "frontend-42")
+
+        # Test case 2: Unsafe or missing ids are generated
+        for headers in [{"X-Request-ID": "a b\r\nc"}, {"X-Request-ID": "x" * 129}, {}]:
+            response = client.get("/session", headers=headers)
+            self.assertEqual(
+                response.json()["session_id"], response.headers["x-request-id"]
+            )
+            self.assertNotIn(" ", response.headers["x-request-id"])
+
+        # Test case 3: Generated ids are unique
+        self.assertEqual(len({newSessionID() for _ in range(1000)}), 1000)
+
+    def test_2_sampling(self):
+        """Test that unsampled requests only log warnings and above."""
+
+        handler = ListHandler()
+        logging.getLogger().addHandler(handler)
+        try:
+            self._client(sampleRate=0).get("/session")
+            self._client(sampleRate=1).get("/session")
+        finally:
+            logging.getLogger().removeHandler(handler)
+
+        messages = [record.getMessage() for record in handler.records]
+        self.assertEqual(messages.count("Session API warning..."), 2)
+        self.assertEqual(messages.count("Invoked session API..."), 1)
+        self.assertEqual(messages.count("Handling new request..."), 1)
+
+    def test_3_clientSession(self):
+        """Test that the client session comes from X-Session-ID or its cookie."""
+
+        client = self._client()
+
+        # Test case 1: New session issued as a cookie, kept across requests
+        first = client.get("/session")
+        second = client.get("/session")
+        self.assertIn("ims_session=", first.headers["set-cookie"])
+        self.assertNotIn("set-cookie", second.headers)
+        self.assertEqual(
+            second.json()["client_session"], first.json()["client_session"]
+        )
+        self.assertNotEqual(second.json()["session_id"], first.json()["session_id"])
+
+        # Test case 2: X-Session-ID wins and is echoed, independent of X-Request-ID
+        response = client.get(
+            "/session", headers={"X-Session-ID": "tab-1", "X-Request-ID": "req-1"}
+        )
+        self.assertEqual(
+            response.json(), {"session_id": "req-1", "client_session": "tab-1"}
+        )
+        self.assertEqual(response.headers["x-session-id"], "tab-1")
+
+        # Test case 3: Unsafe session ids are replaced
+        response = self._client().get("/session", headers={"X-Session-ID": "a b"})
+        self.assertNotEqual(response.json()["client_session"], "a b")
+        self.assertIn("set-cookie", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
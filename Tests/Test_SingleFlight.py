@@ -0,0 +1,101 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import unittest
+from Utils.SingleFlight import SingleFlight, SingleFlightTimeout
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    def _call(self, result, delay=0.01, error=None):
+        self.calls = getattr(self, "calls", 0)
+
+        async def call():
+            self.calls += 1
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return result
+
+        return call
+
+    async def test_1_coalesce(self):
+        """Test that identical concurrent calls share one call and its result."""
+
+        singleFlight = SingleFlight()
+        query = ("advanceQuery", (None, "Drinks", 1.0, 5.0))
+
+        # Test case 1: Five identical calls and one other
+        results = await asyncio.gather(
+            *[singleFlight.do(query, self._call([(1, "Item A")])) for _ in range(5)],
+            singleFlight.do(("query", (None, None, None)), self._call([])),
+        )
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(results, [[(1, "Item A")]] * 5 + [[]])
+        self.assertIs(results[0], results[4])
+
+        # Test case 2: Finished flights are not reused
+        await singleFlight.do(query, self._call([(1, "Item A")]))
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(
+            singleFlight.stats(),
+            {
+                "enabled": True,
+                "max_wait": None,
+                "in_flight": 0,
+                "calls": 3,
+                "coalesced": 4,
+                "timeouts": 0,
+            },
+        )
+
+    async def test_2_errors(self):
+        """Test that errors are shared and a cancelled caller leaves the call running."""
+
+        singleFlight = SingleFlight()
+
+        results = await asyncio.gather(
+            *[
+                singleFlight.do("key", self._call(None, error=ValueError("bad")))
+                for _ in range(3)
+            ],
+            return_exceptions=True,
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+        # Test case 2: First caller goes away, the other still gets the result
+        first = asyncio.ensure_future(singleFlight.do("key", self._call("rows")))
+        second = asyncio.ensure_future(singleFlight.do("key", self._call("rows")))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertEqual(await second, "rows")
+        self.assertTrue(first.cancelled())
+        self.assertEqual(self.calls, 2)
+
+    async def test_3_waitCap(self):
+        """Test the wait cap for joined calls and that forget starts new flights."""
+
+        singleFlight = SingleFlight(maxWait=0.01)
+        slow = asyncio.ensure_future(singleFlight.do("key", self._call("old", 0.05)))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(SingleFlightTimeout):
+            await singleFlight.do("key", self._call("old"))
+
+        # Test case 2: After a write, calls no longer join the older flight
+        singleFlight.forget()
+        self.assertEqual(await singleFlight.do("key", self._call("new")), "new")
+        self.assertEqual(await slow, "old")
+
+        stats = singleFlight.stats()
+        self.assertEqual((stats["calls"], stats["timeouts"]), (2, 1))
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+import os
+import time
+import weakref
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+from Utils.Logger import createLogger
+from Utils.Metrics import recordPhase, countRoundTrips
+
+# Logger
+logger = createLogger()
+
+
+class AsyncConnectionPool:
+    # asyncio counterpart of Utils.ConnectionPool, bound to one event loop
+    def __init__(
+        self,
+        connectionFactory,
+        minSize=1,
+        maxSize=10,
+        acquireTimeout=5.0,
+        idleTimeout=300.0,
+        pingInterval=30.0,
+        name="default",
+    ):
+        if minSize < 0 or maxSize < 1 or minSize > maxSize:
+            raise ValueError(
+                f"Invalid pool size (min={minSize}, max={maxSize}). "
+                "Expected 0 <= min <= max and max >= 1."
+            )
+
+        self.connectionFactory = connectionFactory
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.acquireTimeout = acquireTimeout
+        self.idleTimeout = idleTimeout
+        self.pingInterval = pingInterval
+        self.name = name
+
+        self._condition = asyncio.Condition()
+        self._idle = deque()  # (connection, lastReleased) - most recent on the right
+        self._size = 0  # open connections, idle + checked out + being opened
+        self._waiting = 0
+        self._counters = {
+            "created": 0,
+            "closed": 0,
+            "acquired": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "evicted_idle": 0,
+            "acquire_wait_seconds": 0.0,
+        }
+
+        # A forked child (gunicorn --preload) starts from an empty pool
+        if hasattr(os, "register_at_fork"):
+            afterFork = weakref.WeakMethod(self._afterFork)
+            os.register_at_fork(
+                after_in_child=lambda: afterFork() is not None and afterFork()()
+            )
+
+    async def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.acquireTimeout
+
+        async with self._condition:
+            stale = self._evictIdle()
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        connection, lastReleased = self._idle.pop()
+                        break
+
+                    if self._size < self.maxSize:
+                        # Reserve the slot, open the socket outside the lock
+                        self._size += 1
+                        connection, lastReleased = None, None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolError(
+                            f"Timed out after {self.acquireTimeout}s waiting for a "
+                            f"connection from pool '{self.name}' (max={self.maxSize})"
+                        )
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting -= 1
+
+        for staleConnection in stale:
+            await self._close(staleConnection)
+
+        if connection is None:
+            return self._acquired(await self._open(), started)
+
+        try:
+            healthy = await self._isHealthy(connection, lastReleased)
+        except BaseException:
+            # Cancelled mid-ping, the connection state is unknown
+            await self._discard(connection)
+            raise
+
+        if not healthy:
+            # Keep the slot reserved while swapping in a fresh connection
+            await self._close(connection)
+            self._counters["closed"] += 1
+            self._counters["health_check_failures"] += 1
+            connection = await self._open()
+
+        return self._acquired(connection, started)
+
+    async def release(self, connection, discard=False):
+        if not discard:
+            try:
+                # Never hand a half-finished transaction to the next borrower
+                if connection.in_transaction:
+                    await connection.rollback()
+            except mysql.connector.Error:
+                discard = True
+
+        if discard:
+            await self._discard(connection)
+            return
+
+        async with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        connection = await self.acquire()
+        try:
+            yield connection
+        except (
+            mysql.connector.errors.OperationalError,
+            mysql.connector.errors.InterfaceError,
+            asyncio.CancelledError,
+        ):
+            # Broken socket, or a cancelled request that may have left unread
+            # packets on the wire, do not recycle it
+            await self.release(connection, discard=True)
+            raise
+        except BaseException:
+            await self.release(connection)
+            raise
+        else:
+            await self.release(connection)
+
+    async def warm(self):
+        # Open up to minSize connections ahead of the first request
+        connections = []
+        try:
+            while self._size < self.minSize:
+                self._size += 1
+                connections.append(await self._open())
+        finally:
+            for connection in connections:
+                await self.release(connection)
+
+    async def close(self):
+        idle, self._idle = list(self._idle), deque()
+
+        for connection, _ in idle:
+            await self._discard(connection)
+
+    def stats(self):
+        idle = len(self._idle)
+        return {
+            "name": self.name,
+            "min_size": self.minSize,
+            "max_size": self.maxSize,
+            "size": self._size,
+            "idle": idle,
+            "in_use": self._size - idle,
+            "waiting": self._waiting,
+            **self._counters,
+        }
+
+    def _acquired(self, connection, started):
+        waited = time.monotonic() - started
+        recordPhase("pool_acquire", waited)
+        self._counters["acquired"] += 1
+        self._counters["acquire_wait_seconds"] += waited
+
+        return connection
+
+    async def _open(self):
+        try:
+            connection = await self.connectionFactory()
+        except BaseException:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        self._counters["created"] += 1
+
+        return connection
+
+    async def _discard(self, connection):
+        await self._close(connection)
+
+        async with self._condition:
+            self._size -= 1
+            self._counters["closed"] += 1
+            self._condition.notify()
+
+    async def _isHealthy(self, connection, lastReleased):
+        if time.monotonic() - lastReleased < self.pingInterval:
+            return True
+
+        try:
+            countRoundTrips()
+            await connection.ping(reconnect=False)
+            return True
+        except (mysql.connector.Error, OSError):
+            logger.warning(f"Dropping unhealthy connection from pool '{self.name}'...")
+            return False
+
+    def _afterFork(self):
+        # The sockets belong to the parent, closing them here would end its
+        # sessions, so they are only forgotten. Locks may have been held.
+        self._condition = asyncio.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._waiting = 0
+
+    def _evictIdle(self):
+        # Caller holds the lock. Oldest idle connections sit on the left.
+        now = time.monotonic()
+        stale = []
+        while (
+            self._idle
+            and self._size > self.minSize
+            and now - self._idle[0][1] > self.idleTimeout
+        ):
+            connection, _ = self._idle.popleft()
+            stale.append(connection)
+            self._size -= 1
+            self._counters["closed"] += 1
+            self._counters["evicted_idle"] += 1
+
+        return stale
+
+    @staticmethod
+    async def _close(connection):
+        try:
+            await connection.close()
+        except (mysql.connector.Error, OSError):
+            pass
@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+
+
+class GroupCommitBuffer:
+    # Collects items submitted within `window` seconds, or until maxItems, and
+    # hands them to flush(items) -> one result per item. A single flusher sends
+    # batches one at a time in arrival order, items arriving during a flush
+    # join the next batch. A result that is an exception goes to its caller.
+    # Event loop thread only.
+    def __init__(self, flush, window=0.005, maxItems=100):
+        if window < 0 or maxItems < 1:
+            raise ValueError(
+                f"Invalid group commit (window={window}, maxItems={maxItems}). "
+                "Expected window >= 0 and maxItems >= 1."
+            )
+
+        self.flush = flush
+        self.window = window
+        self.maxItems = maxItems
+
+        self._pending = []  # (item, future) in arrival order
+        self._timer = None
+        self._flusher = None
+        self._counters = {"items": 0, "batches": 0, "largest_batch": 0}
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._counters["items"] += 1
+
+        if self._flusher is not None and not self._flusher.done():
+            pass  # Picked up once the running batch has committed
+        elif len(self._pending) >= self.maxItems:
+            self._startFlusher()
+        elif self._timer is None:
+            # Flushes run outside any request's context (session, metrics)
+            self._timer = loop.call_later(
+                self.window, self._startFlusher, context=contextvars.Context()
+            )
+
+        return await future
+
+    async def close(self):
+        # Flush whatever is still buffered, e.g. on shutdown
+        if self._pending:
+            self._startFlusher()
+        if self._flusher is not None:
+            await self._flusher
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "window": self.window,
+            "max_items": self.maxItems,
+            "pending": len(self._pending),
+            **self._counters,
+        }
+
+    def _startFlusher(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(
+                self._flushPending(), context=contextvars.Context()
+            )
+
+    async def _flushPending(self):
+        while self._pending:
+            batch = self._pending[: self.maxItems]
+            del self._pending[: self.maxItems]
+            self._counters["batches"] += 1
+            self._counters["largest_batch"] = max(
+                self._counters["largest_batch"], len(batch)
+            )
+
+            try:
+                results = await self.flush([item for item, _ in batch])
+            except asyncio.CancelledError:
+                # Flusher cancelled, e.g. at shutdown, nobody is left to resolve
+                # the batch or what is still buffered
+                for _, future in batch + self._pending:
+                    future.cancel()
+                self._pending.clear()
+                raise
+            except Exception as error:
+                results = [error] * len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue  # Caller went away, the item was still written
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
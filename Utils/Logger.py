@@ -1,19 +1,196 @@
 import logging
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 from contextvars import ContextVar
 import yaml
 import os
+import queue
+import atexit
 
 sessionIDVar = ContextVar("sessionID", default="NO_SESSION")
+# False for requests left out by LOG_REQUEST_SAMPLE_RATE
+requestSampledVar = ContextVar("requestSampled", default=True)
+
+# Queue mode: records beyond LOG_QUEUE_SIZE are dropped, the last
+# LOG_ERROR_RESERVE slots are kept for errors
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 256))
+LOG_ERROR_RESERVE = int(os.getenv("LOG_ERROR_RESERVE", 100))
 
 
 class SessionIDFilter(logging.Filter):
     def filter(self, record):
         # If session_id is not already set, use the default value
-        record.session_id = sessionIDVar.get()
+        if not hasattr(record, "session_id"):
+            record.session_id = sessionIDVar.get()
         return True
 
 
+class RequestSamplingFilter(logging.Filter):
+    def filter(self, record):
+        # Warnings and errors are always kept
+        return record.levelno >= logging.WARNING or requestSampledVar.get()
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, queue, errorReserve=LOG_ERROR_RESERVE):
+        super().__init__(queue)
+        self.errorReserve = errorReserve
+        self.dropped = 0
+
+    def enqueue(self, record):
+        # Never waits, records are logged from the event loop thread. A full
+        # queue drops the record, below ERROR it is full errorReserve earlier
+        # (at most half of the queue is reserved).
+        reserve = min(self.errorReserve, self.queue.maxsize // 2)
+        if (
+            record.levelno < logging.ERROR
+            and self.queue.maxsize > 0
+            and self.queue.qsize() >= self.queue.maxsize - reserve
+        ):
+            self.dropped += 1
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(QueueListener):
+    def __init__(self, queueHandler, *handlers, batchSize=LOG_BATCH_SIZE):
+        super().__init__(queueHandler.queue, *handlers, respect_handler_level=True)
+        self.queueHandler = queueHandler
+        self.batchSize = batchSize
+        self.batches = 0
+        self._reportedDrops = 0
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+    def _monitor(self):
+        # Drain whatever is queued (up to batchSize) and write it in one go
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+
+            if self._sentinel in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._sentinel]
+
+            self._reportDrops(batch)
+            self.handleBatch(batch)
+            for _ in range(len(batch) + stopping):
+                self.queue.task_done()
+
+    def handleBatch(self, records):
+        if not records:
+            return
+
+        self.batches += 1
+        for handler in self.handlers:
+            selected = [
+                record
+                for record in records
+                if record.levelno >= handler.level and handler.filter(record)
+            ]
+            if not selected:
+                continue
+
+            if getattr(handler, "stream", None) is None:
+                for record in selected:
+                    handler.handle(record)
+                continue
+
+            # One write and one flush per batch instead of per record
+            handler.acquire()
+            try:
+                handler.stream.write(
+                    "".join(
+                        handler.format(record) + handler.terminator
+                        for record in selected
+                    )
+                )
+                handler.flush()
+            except Exception:
+                handler.handleError(selected[-1])
+            finally:
+                handler.release()
+
+    def _reportDrops(self, batch):
+        dropped = self.queueHandler.dropped
+        if dropped > self._reportedDrops:
+            record = logging.makeLogRecord(
+                {
+                    "name": "Logger",
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": f"Log queue full, dropped {dropped - self._reportedDrops}"
+                    " records...",
+                    "session_id": sessionIDVar.get(),
+                }
+            )
+            batch.append(record)
+            self._reportedDrops = dropped
+
+
+def enableQueueLogging(logger, maxSize=LOG_QUEUE_SIZE, batchSize=LOG_BATCH_SIZE):
+    # Move the logger's handlers behind a bounded queue and a writer thread
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+
+    queueHandler = DroppingQueueHandler(queue.Queue(maxSize))
+    queueHandler.addFilter(SessionIDFilter())
+    queueHandler.listener = BatchingQueueListener(
+        queueHandler, *handlers, batchSize=batchSize
+    )
+    logger.addHandler(queueHandler)
+    queueHandler.listener.start()
+    atexit.register(queueHandler.listener.stop)
+
+    def restartAfterFork():
+        # The writer thread does not survive a fork (gunicorn --preload), and
+        # records still queued are the parent's to write
+        queueHandler.queue = queueHandler.listener.queue = queue.Queue(maxSize)
+        queueHandler.listener.start()
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=restartAfterFork)
+
+    return queueHandler
+
+
+def loggingStats():
+    queueHandler = next(
+        (
+            handler
+            for handler in logging.getLogger().handlers
+            if isinstance(handler, DroppingQueueHandler)
+        ),
+        None,
+    )
+    if queueHandler is None:
+        return {"mode": "sync"}
+
+    return {
+        "mode": "queue",
+        "queued": queueHandler.queue.qsize(),
+        "capacity": queueHandler.queue.maxsize,
+        "dropped": queueHandler.dropped,
+        "batches": queueHandler.listener.batches,
+    }
+
+
 def createLogger():
     if not os.path.exists("Logs"):
         os.makedirs("Logs")
@@ -23,7 +200,16 @@ def createLogger():
             config = yaml.safe_load(file)
             dictConfig(config)
 
+        # LOG_MODE=queue takes file and console writes off the request path
+        if os.getenv("LOG_MODE", "sync") == "queue":
+            enableQueueLogging(logging.getLogger())
+
     logger = logging.getLogger()
+    if not any(
+        isinstance(loggerFilter, RequestSamplingFilter)
+        for loggerFilter in logger.filters
+    ):
+        logger.addFilter(RequestSamplingFilter())
 
     for handler in logger.handlers:
         if not any(
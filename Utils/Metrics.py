@@ -0,0 +1,238 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 25, 50, 100)
+
+# Metrics of the request being handled, None outside of a request
+requestMetricsVar = ContextVar("requestMetrics", default=None)
+
+
+class Histogram:
+    # Prometheus histogram, one series per label value tuple
+    def __init__(self, name, description, labelNames, buckets):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self.buckets = buckets
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 2))
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+
+        for labels, values in sorted(series.items()):
+            labelText = ",".join(
+                f'{labelName}="{labelValue}"'
+                for labelName, labelValue in zip(self.labelNames, labels)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labelText},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{labelText}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{labelText}}} {cumulative}")
+
+        return "\n".join(lines)
+
+
+REQUEST_SECONDS = Histogram(
+    "ims_request_duration_seconds",
+    "End to end request latency.",
+    ("method", "endpoint", "status"),
+    LATENCY_BUCKETS,
+)
+PHASE_SECONDS = Histogram(
+    "ims_request_phase_seconds",
+    "Time spent per request in validation, pool_acquire, execute, fetch, commit, "
+    "group_commit, packaging and serialization.",
+    ("endpoint", "phase"),
+    LATENCY_BUCKETS,
+)
+ROUND_TRIPS = Histogram(
+    "ims_db_round_trips",
+    "Database round trips per request.",
+    ("endpoint",),
+    ROUND_TRIP_BUCKETS,
+)
+REGISTRY = [REQUEST_SECONDS, PHASE_SECONDS, ROUND_TRIPS]
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.roundTrips = 0
+
+    def observe(self, method, endpoint, statusCode):
+        REQUEST_SECONDS.observe(
+            (method, endpoint, str(statusCode)), time.perf_counter() - self.started
+        )
+        for phase, seconds in self.phases.items():
+            PHASE_SECONDS.observe((endpoint, phase), seconds)
+        ROUND_TRIPS.observe((endpoint,), self.roundTrips)
+
+
+def recordPhase(phase, seconds):
+    requestMetrics = requestMetricsVar.get()
+    if requestMetrics is not None:
+        requestMetrics.phases[phase] = requestMetrics.phases.get(phase, 0) + seconds
+
+
+def countRoundTrips(count=1):
+    requestMetrics = requestMetricsVar.get()
+    if requestMetrics is not None:
+        requestMetrics.roundTrips += count
+
+
+def markValidated():
+    # Called first thing in a handler: routing, body parsing and validation
+    requestMetrics = requestMetricsVar.get()
+    if requestMetrics is not None:
+        recordPhase("validation", time.perf_counter() - requestMetrics.started)
+
+
+@contextmanager
+def timed(phase):
+    # Context manager or decorator adding its duration to the current request
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        recordPhase(phase, time.perf_counter() - started)
+
+
+def renderMetrics():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+class MeteredCursor:
+    # Times execute/fetch* of a mysql.connector cursor, counting round trips.
+    # Fetches only reach the server on unbuffered cursors, prepared executes
+    # are preceded by a COM_STMT_RESET.
+    def __init__(self, cursor, buffered=True, prepared=False):
+        self._cursor = cursor
+        self._fetchRoundTrips = 0 if buffered else 1
+        self._executeRoundTrips = 2 if prepared else 1
+
+    def execute(self, operation, params=None):
+        with timed("execute"):
+            result = self._cursor.execute(operation, params)
+        countRoundTrips(self._executeRoundTrips)
+        return result
+
+    def fetchone(self):
+        with timed("fetch"):
+            return self._cursor.fetchone()
+
+    def fetchall(self):
+        with timed("fetch"):
+            return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        with timed("fetch"):
+            rows = self._cursor.fetchmany(size)
+        countRoundTrips(self._fetchRoundTrips)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self._cursor.close()
+
+
+class MeteredConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    @property
+    def unwrapped(self):
+        return self._connection
+
+    def cursor(self, buffered=True, prepared=False):
+        if prepared:
+            # Prepared cursors of mysql.connector are never buffered
+            return MeteredCursor(self._connection.cursor(prepared=True), False, True)
+        return MeteredCursor(self._connection.cursor(buffered=buffered), buffered)
+
+    def commit(self):
+        with timed("commit"):
+            self._connection.commit()
+        countRoundTrips()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class AsyncMeteredCursor:
+    # Coroutine flavour of MeteredCursor for mysql.connector.aio
+    def __init__(self, cursor, buffered=True):
+        self._cursor = cursor
+        self._fetchRoundTrips = 0 if buffered else 1
+
+    async def execute(self, operation, params=None):
+        with timed("execute"):
+            result = await self._cursor.execute(operation, params)
+        countRoundTrips()
+        return result
+
+    async def fetchone(self):
+        with timed("fetch"):
+            return await self._cursor.fetchone()
+
+    async def fetchall(self):
+        with timed("fetch"):
+            return await self._cursor.fetchall()
+
+    async def fetchmany(self, size=1):
+        with timed("fetch"):
+            rows = await self._cursor.fetchmany(size)
+        countRoundTrips(self._fetchRoundTrips)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excInfo):
+        await self._cursor.close()
+
+
+class AsyncMeteredConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    async def cursor(self, buffered=True):
+        return AsyncMeteredCursor(
+            await self._connection.cursor(buffered=buffered), buffered
+        )
+
+    async def commit(self):
+        with timed("commit"):
+            await self._connection.commit()
+        countRoundTrips()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
@@ -0,0 +1,82 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import mysql.connector
+from mysql.connector import errorcode
+
+
+class PreparedStatementCache:
+    # Server-side prepared statements kept per pooled connection, one prepared
+    # cursor per SQL text, least recently used closed beyond maxSize. Cursors
+    # are unbuffered, so rows are always read in full before returning.
+    def __init__(self, maxSize=32):
+        self.maxSize = maxSize
+        self._statements = weakref.WeakKeyDictionary()  # connection -> LRU
+        self._lock = threading.Lock()
+        self._counters = {"prepared": 0, "reused": 0, "evicted": 0, "reprepared": 0}
+
+    def execute(self, connection, statement, params=None):
+        # (rows, cursor) - a pooled connection is only used by one thread
+        try:
+            return self._execute(connection, statement, params)
+        except mysql.connector.errors.DatabaseError as dbError:
+            if dbError.errno != errorcode.ER_UNKNOWN_STMT_HANDLER:
+                raise
+
+        # The session was reset (reconnect), its statements are gone
+        with self._lock:
+            self._statements.pop(self._key(connection), None)
+            self._counters["reprepared"] += 1
+
+        return self._execute(connection, statement, params)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": True,
+                "max_size": self.maxSize,
+                "connections": len(self._statements),
+                "statements": sum(len(lru) for lru in self._statements.values()),
+                **self._counters,
+            }
+
+    def _execute(self, connection, statement, params):
+        key = self._key(connection)
+        with self._lock:
+            statements = self._statements.setdefault(key, OrderedDict())
+
+        if statement in statements:
+            statements.move_to_end(statement)
+            # The connector only reuses a statement for the very same str object
+            statement, cursor = statements[statement]
+            self._count("reused")
+        else:
+            cursor = connection.cursor(prepared=True)
+            statements[statement] = (statement, cursor)
+            self._count("prepared")
+            while len(statements) > self.maxSize:
+                _, (_, evicted) = statements.popitem(last=False)
+                evicted.close()
+                self._count("evicted")
+
+        try:
+            cursor.execute(statement, params)
+        except BaseException:
+            # Re-prepared on next use, the cursor may be half way through a result
+            statements.pop(statement, None)
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+            raise
+
+        return (cursor.fetchall() if cursor.with_rows else []), cursor
+
+    @staticmethod
+    def _key(connection):
+        return getattr(connection, "unwrapped", connection)
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
@@ -0,0 +1,211 @@
+from functools import lru_cache
+
+# Columns returned to the packaging layer as (id, name, category, price)
+ITEM_COLUMNS = "id, name, category, CAST(price AS DOUBLE)"
+
+# Whitelists - the only identifiers ever interpolated into SQL text
+SORT_COLUMNS = {"name": "name", "category": "category", "price": "price"}
+SORT_DIRECTIONS = {"asc": "ASC", "desc": "DESC"}
+GROUP_COLUMNS = {"category": "category"}
+
+
+def queryPredicates(hasFrom, hasTo, hasCategory):
+    predicates = []
+    if hasCategory:
+        predicates.append("category = %s")
+    if hasFrom:
+        predicates.append("last_updated_dt >= %s")
+    if hasTo:
+        predicates.append("last_updated_dt <= %s")
+
+    return predicates
+
+
+@lru_cache(maxsize=64)
+def compileQuery(table, hasFrom, hasTo, hasCategory):
+    predicates = queryPredicates(hasFrom, hasTo, hasCategory)
+    whereClause = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+
+    return f"SELECT {ITEM_COLUMNS} FROM {table} {whereClause}"
+
+
+def buildQuery(table, queryInPayload):
+    dt_from, dt_to, category = queryInPayload
+
+    filterQuery = compileQuery(
+        table, dt_from is not None, dt_to is not None, category is not None
+    )
+    params = [value for value in (category, dt_from, dt_to) if value is not None]
+
+    return filterQuery, tuple(params)
+
+
+@lru_cache(maxsize=64)
+def compileQuerySummary(table, hasFrom, hasTo, hasCategory, groupBy):
+    # SUM over the DECIMAL column, exact and computed where the rows live
+    if groupBy is not None and groupBy not in GROUP_COLUMNS:
+        raise ValueError(f"Unsupported group by: {groupBy}")
+
+    predicates = queryPredicates(hasFrom, hasTo, hasCategory)
+    whereClause = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+    aggregates = "COUNT(*), COALESCE(SUM(price), 0)"
+
+    if groupBy is None:
+        return f"SELECT {aggregates} FROM {table} {whereClause}"
+
+    groupColumn = GROUP_COLUMNS[groupBy]
+    return (
+        f"SELECT {groupColumn}, {aggregates} FROM {table} {whereClause} "
+        f"GROUP BY {groupColumn} ORDER BY {groupColumn}"
+    )
+
+
+def buildQuerySummary(table, queryInPayload, groupBy=None):
+    dt_from, dt_to, category = queryInPayload
+
+    summaryQuery = compileQuerySummary(
+        table, dt_from is not None, dt_to is not None, category is not None, groupBy
+    )
+    params = [value for value in (category, dt_from, dt_to) if value is not None]
+
+    return summaryQuery, tuple(params)
+
+
+def advanceFilterPredicates(hasName, hasCategory, hasMinPrice, hasMaxPrice):
+    predicates = []
+    if hasName:
+        predicates.append("name = %s")
+    if hasCategory:
+        predicates.append("category = %s")
+    if hasMinPrice and hasMaxPrice:
+        predicates.append("price BETWEEN %s AND %s")
+    elif hasMinPrice:
+        predicates.append("price >= %s")
+    elif hasMaxPrice:
+        predicates.append("price <= %s")
+
+    return predicates
+
+
+@lru_cache(maxsize=256)
+def compileAdvanceQuery(
+    table,
+    hasName,
+    hasCategory,
+    hasMinPrice,
+    hasMaxPrice,
+    sortField,
+    sortOrder,
+    hasCursor,
+):
+    # One statement text per filter shape, so each shape keeps a stable plan
+    if sortField not in SORT_COLUMNS or sortOrder not in SORT_DIRECTIONS:
+        raise ValueError(f"Unsupported sort: {sortField} {sortOrder}")
+
+    sortColumn = SORT_COLUMNS[sortField]
+    orderDirection = SORT_DIRECTIONS[sortOrder]
+
+    predicates = advanceFilterPredicates(hasName, hasCategory, hasMinPrice, hasMaxPrice)
+    if hasCursor:
+        # Keyset seek on (sort column, id), matching the ORDER BY
+        comparator = ">" if orderDirection == "ASC" else "<"
+        predicates.append(
+            f"({sortColumn} {comparator} %s"
+            f" OR ({sortColumn} = %s AND id {comparator} %s))"
+        )
+
+    whereClause = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+
+    return (
+        f"SELECT {ITEM_COLUMNS} FROM {table} {whereClause} "
+        f"ORDER BY {sortColumn} {orderDirection}, id {orderDirection} "
+        "LIMIT %s OFFSET %s"
+    )
+
+
+def buildAdvanceQuery(table, advanceQueryInPayload):
+    (
+        name,
+        category,
+        minPrice,
+        maxPrice,
+        sortField,
+        sortOrder,
+        pagLimit,
+        pagOffset,
+        afterKey,
+        afterID,
+    ) = advanceQueryInPayload[:10]
+
+    hasCursor = afterID is not None
+    filterQuery = compileAdvanceQuery(
+        table,
+        name is not None,
+        category is not None,
+        minPrice is not None,
+        maxPrice is not None,
+        sortField,
+        sortOrder,
+        hasCursor,
+    )
+
+    params = [
+        value for value in (name, category, minPrice, maxPrice) if value is not None
+    ]
+    if hasCursor:
+        params += [afterKey, afterKey, afterID]
+    params += [pagLimit, pagOffset]
+
+    return filterQuery, tuple(params)
+
+
+@lru_cache(maxsize=64)
+def compileAdvanceCount(
+    table, hasName, hasCategory, hasMinPrice, hasMaxPrice, estimate
+):
+    # Same filters as the page, without seek/ORDER BY/LIMIT; served from an index
+    predicates = advanceFilterPredicates(hasName, hasCategory, hasMinPrice, hasMaxPrice)
+    whereClause = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+
+    if estimate:
+        # Optimizer row estimate for the same access path, nothing is scanned
+        return f"EXPLAIN SELECT 1 FROM {table} {whereClause}"
+
+    return f"SELECT COUNT(*) FROM {table} {whereClause}"
+
+
+def buildAdvanceCount(table, advanceQueryInPayload, estimate=False):
+    name, category, minPrice, maxPrice = advanceQueryInPayload[:4]
+
+    countQuery = compileAdvanceCount(
+        table,
+        name is not None,
+        category is not None,
+        minPrice is not None,
+        maxPrice is not None,
+        estimate,
+    )
+    params = [
+        value for value in (name, category, minPrice, maxPrice) if value is not None
+    ]
+
+    return countQuery, tuple(params)
+
+
+@lru_cache(maxsize=8)
+def compileChanges(table):
+    # Range scan of idx_updated_id after the (last_updated_dt, id) cursor. Rows
+    # newer than the settle window may still have uncommitted neighbours with
+    # the same or an older timestamp, so they are left for the next poll.
+    return (
+        f"SELECT {ITEM_COLUMNS}, last_updated_dt FROM {table} "
+        "WHERE last_updated_dt >= %s AND (last_updated_dt > %s OR id > %s) "
+        "AND last_updated_dt < NOW() - INTERVAL %s SECOND "
+        "ORDER BY last_updated_dt, id LIMIT %s"
+    )
+
+
+def buildChanges(table, changesInPayload, settleSeconds):
+    afterDT, afterID, limit = changesInPayload
+
+    return compileChanges(table), (afterDT, afterDT, afterID, settleSeconds, limit)
@@ -0,0 +1,157 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+
+from Utils.Logger import createLogger
+from Utils.SessionMiddleware import clientSessionVar
+
+# Logger
+logger = createLogger()
+
+
+class ReplicaUnavailableError(Exception):
+    def __init__(self, replica, dbError):
+        super().__init__(f"Replica '{replica.pool.name}' failed: {dbError}")
+        self.dbError = dbError
+
+
+class Replica:
+    def __init__(self, pool):
+        self.pool = pool
+        self.downUntil = 0.0
+        self.reads = 0
+        self.failures = 0
+
+    @property
+    def load(self):
+        stats = self.pool.stats()
+        return stats["in_use"] + stats["waiting"]
+
+
+class ReplicaRouter:
+    # Picks the replica pool for each read: the least loaded one that has not
+    # failed within the cooldown, or None for the primary. A client session
+    # (X-Session-ID or its cookie) that wrote within stickySeconds reads from
+    # the primary so it sees its own writes.
+    def __init__(
+        self, replicaPools, stickySeconds=5.0, cooldown=5.0, maxSessions=10000
+    ):
+        self.replicas = [Replica(pool) for pool in replicaPools]
+        self.stickySeconds = stickySeconds
+        self.cooldown = cooldown
+        self.maxSessions = maxSessions
+
+        self._stickyUntil = OrderedDict()  # session id -> deadline, soonest first
+        self._lastWrite = float("-inf")
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._counters = {"sticky_reads": 0, "fallback_reads": 0, "failovers": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def choose(self):
+        if not self.replicas:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            if self._stickyUntil.get(clientSessionVar.get(), 0.0) > now:
+                self._counters["sticky_reads"] += 1
+                return None
+
+            healthy = [replica for replica in self.replicas if replica.downUntil <= now]
+            if not healthy:
+                self._counters["fallback_reads"] += 1
+                return None
+
+            # Rotate the starting point so ties do not all go to the first one
+            self._turn = (self._turn + 1) % len(healthy)
+            healthy = healthy[self._turn :] + healthy[: self._turn]
+
+        replica = min(healthy, key=lambda replica: replica.load)
+        with self._lock:
+            replica.reads += 1
+
+        return replica
+
+    @contextmanager
+    def connection(self, replica):
+        try:
+            with replica.pool.connection() as connection:
+                yield connection
+        except (
+            mysql.connector.errors.OperationalError,
+            mysql.connector.errors.InterfaceError,
+        ) as dbError:
+            self.fail(replica, dbError)
+
+    def fail(self, replica, dbError):
+        # Unreachable or gone away, reads skip it until the cooldown is over
+        with self._lock:
+            replica.downUntil = time.monotonic() + self.cooldown
+            replica.failures += 1
+            self._counters["failovers"] += 1
+        logger.warning(
+            f"Replica '{replica.pool.name}' failed, skipping it for "
+            f"{self.cooldown}s - {dbError}"
+        )
+
+        raise ReplicaUnavailableError(replica, dbError) from dbError
+
+    def recordWrite(self):
+        if not self.replicas:
+            return
+
+        now = time.monotonic()
+        clientSession = clientSessionVar.get()
+        with self._lock:
+            self._lastWrite = now
+            if clientSession is not None:
+                self._stickyUntil.pop(clientSession, None)
+                self._stickyUntil[clientSession] = now + self.stickySeconds
+
+            # Same window for everyone, so expired sessions sit on the left
+            while self._stickyUntil and (
+                len(self._stickyUntil) > self.maxSessions
+                or next(iter(self._stickyUntil.values())) <= now
+            ):
+                self._stickyUntil.popitem(last=False)
+
+    def isSticky(self):
+        # The current session wrote within stickySeconds, its reads go to the primary
+        now = time.monotonic()
+        with self._lock:
+            return self._stickyUntil.get(clientSessionVar.get(), 0.0) > now
+
+    def settled(self):
+        # No write for stickySeconds, replicas are assumed to have caught up
+        return time.monotonic() - self._lastWrite >= self.stickySeconds
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+            sessions = len(self._stickyUntil)
+            replicas = [
+                {
+                    **replica.pool.stats(),
+                    "down": replica.downUntil > now,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                }
+                for replica in self.replicas
+            ]
+
+        return {
+            "enabled": self.enabled,
+            "sticky_seconds": self.stickySeconds,
+            "cooldown": self.cooldown,
+            "sticky_sessions": sessions,
+            **counters,
+            "replicas": replicas,
+        }
@@ -0,0 +1,170 @@
+import math
+import time
+import pickle
+import threading
+import importlib
+import unicodedata
+from collections import OrderedDict
+
+# Tag of entries whose query has no category filter, any write can touch them
+WILDCARD_TAG = "*"
+# Bumped to drop every entry at once, e.g. after a bulk upsert
+ALL_TAG = "__all__"
+
+
+def loadBackend(spec):
+    # "package.module:factory" -> factory(), e.g. a function returning a
+    # redis.Redis client, so a shared backend can be chosen without code edits
+    moduleName, _, factoryName = spec.partition(":")
+    if not factoryName:
+        raise ValueError(
+            f"Invalid cache backend '{spec}'. Expected 'package.module:factory'."
+        )
+
+    return getattr(importlib.import_module(moduleName), factoryName)()
+
+
+class LocalCacheBackend:
+    # In-process stand-in for a shared store. get/mget/set/incr follow their
+    # Redis namesakes (GET, MGET, SET EX, INCR) and ResultCache only hands them
+    # bytes values and whole-second TTLs, so a redis.Redis client can replace
+    # it and keep several workers coherent.
+    def __init__(self, maxSize=1024):
+        self.maxSize = maxSize
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, expiresAt), LRU on the left
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def mget(self, keys):
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (value, time.monotonic() + ttl)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def _get(self, key):
+        if key in self._counters:
+            return self._counters[key]
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry[0]
+
+
+class ResultCache:
+    # Read-through cache with generation based invalidation: every entry key
+    # embeds the current generation of its tag, invalidating a tag bumps the
+    # generation so older entries are never read again and age out via LRU/TTL.
+    def __init__(self, ttl=30.0, maxSize=1024, backend=None, name="results"):
+        self.ttl = ttl
+        self.backend = backend if backend is not None else LocalCacheBackend(maxSize)
+        self.name = name
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def lookup(self, key, tag=None):
+        # (hit, value, entryKey) - store a miss under entryKey, it was versioned
+        # before the read so a concurrent invalidation is never overwritten
+        if not self.enabled:
+            return False, None, None
+
+        tag = WILDCARD_TAG if tag is None else self._normaliseTag(tag)
+        tagGeneration, allGeneration = self.backend.mget(
+            [self._generationKey(tag), self._generationKey(ALL_TAG)]
+        )
+        # Shared stores hand counters back as bytes
+        entryKey = (
+            f"{self.name}:{tag}:{int(tagGeneration or 0)}:"
+            f"{int(allGeneration or 0)}:{key!r}"
+        )
+        value = self.backend.get(entryKey)
+
+        self._count("hits" if value is not None else "misses")
+        if value is None:
+            return False, None, entryKey
+
+        return True, pickle.loads(value), entryKey
+
+    def store(self, entryKey, value):
+        if entryKey is None:
+            return
+
+        # Rows hold Decimal and datetime values, pickled for byte-only stores
+        self.backend.set(
+            entryKey,
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+            max(1, math.ceil(self.ttl)),
+        )
+        self._count("stores")
+
+    def invalidate(self, tag):
+        # Rows of this category changed, and so may any unfiltered result
+        if not self.enabled:
+            return
+
+        self.backend.incr(self._generationKey(self._normaliseTag(tag)))
+        self.backend.incr(self._generationKey(WILDCARD_TAG))
+        self._count("invalidations")
+
+    def invalidateAll(self):
+        if not self.enabled:
+            return
+
+        self.backend.incr(self._generationKey(ALL_TAG))
+        self._count("invalidations")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "evictions": getattr(self.backend, "evictions", None),
+            "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else None,
+            **counters,
+        }
+
+    @staticmethod
+    def _normaliseTag(tag):
+        # Coarser than MySQL's case/accent-insensitive collation on purpose:
+        # merging two categories only over-invalidates, splitting one is stale
+        decomposed = unicodedata.normalize("NFKD", tag)
+        return (
+            "".join(char for char in decomposed.casefold() if char.isalnum())
+            or WILDCARD_TAG
+        )
+
+    def _generationKey(self, tag):
+        return f"{self.name}:generation:{tag}"
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
@@ -46,8 +46,21 @@ class Filters(BaseModel):
 
 
 class Pagination(BaseModel):
-    page: int
+    page: int = 1
     limit: int
+    # "cursor" pages with an opaque next_cursor instead of page/OFFSET
+    mode: Literal["offset", "cursor"] = "offset"
+    cursor: Optional[str] = None
+    # How the total of the filtered set is computed: exact COUNT(*), exact but
+    # reused for a short TTL, optimizer row estimate, or skipped entirely
+    total_mode: Literal["exact", "cached", "estimate", "none"] = "exact"
+
+    @model_validator(mode="after")
+    def check_cursor_mode(self):
+        if self.cursor and self.mode != "cursor":
+            raise ValueError('cursor can only be used with mode "cursor".')
+
+        return self
 
 
 class Sort(BaseModel):
@@ -59,3 +72,23 @@ class VAL_ADVANCE_QUERY(BaseModel):
     filters: Filters
     pagination: Pagination
     sort: Sort
+
+
+class VAL_CHANGES(BaseModel):
+    # Start from an opaque next_cursor, or from a point in time (or the start)
+    cursor: Optional[str] = None
+    since: Optional[datetime] = None
+    limit: int = 100
+    # Long-poll: seconds to wait for changes when there are none yet
+    wait: float = 0
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        if self.cursor and self.since:
+            raise ValueError("Use either cursor or since, not both.")
+        if not 1 <= self.limit <= 1000:
+            raise ValueError("limit must be between 1 and 1000.")
+        if not 0 <= self.wait <= 30:
+            raise ValueError("wait must be between 0 and 30 seconds.")
+
+        return self
@@ -0,0 +1,84 @@
+import os
+import json
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+from Utils.Logger import createLogger
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib encoder is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional, Accept: application/msgpack then gets JSON
+    msgpack = None
+
+# Logger
+logger = createLogger()
+
+
+def jsonDumps(content):
+    return json.dumps(content).encode()
+
+
+def orjsonDumps(content):
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+# name -> (response class, dumps(content) -> bytes); both halves must agree
+SERIALIZERS = {
+    "json": (JSONResponse, jsonDumps),
+    "orjson": (ORJSONResponse, orjsonDumps),
+}
+
+
+def getSerializer(name=None):
+    # API_SERIALIZER picks the encoder, orjson whenever it is installed
+    name = name or os.getenv("API_SERIALIZER", "orjson" if orjson else "json")
+
+    if name not in SERIALIZERS:
+        raise ValueError(
+            f"Unknown serializer '{name}', expected one of {sorted(SERIALIZERS)}"
+        )
+    if name == "orjson" and orjson is None:
+        logger.warning("orjson is not installed, falling back to json...")
+        name = "json"
+
+    return SERIALIZERS[name]
+
+
+ResponseClass, dumps = getSerializer()
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content):
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def negotiateResponseClass(accept=None):
+    # Highest q-value wins, JSON on ties, on */* and for clients sending nothing
+    binaryTypes = ("application/msgpack", "application/x-msgpack")
+    if not accept or msgpack is None:
+        return ResponseClass
+
+    jsonQuality, binaryQuality = 0.0, 0.0
+    for mediaRange in accept.split(","):
+        mediaType, *parameters = [part.strip() for part in mediaRange.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            if parameter.startswith("q="):
+                try:
+                    quality = float(parameter[2:])
+                except ValueError:
+                    quality = 0.0
+
+        if mediaType.lower() in binaryTypes:
+            binaryQuality = max(binaryQuality, quality)
+        elif mediaType.lower() in ("application/json", "application/*", "*/*"):
+            jsonQuality = max(jsonQuality, quality)
+
+    return MsgPackResponse if binaryQuality > jsonQuality else ResponseClass
@@ -0,0 +1,131 @@
+import os
+import re
+import random
+import itertools
+from http.cookies import SimpleCookie, CookieError
+from contextvars import ContextVar
+
+from Utils.Logger import createLogger, sessionIDVar, requestSampledVar
+from Utils.Metrics import RequestMetrics, requestMetricsVar
+
+# Logger
+logger = createLogger()
+
+# Incoming ids are echoed into logs and headers, so only accept plain tokens
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Client session spanning requests, e.g. for reading its own writes. Separate
+# from the per-request id, None outside of a request.
+SESSION_ID_HEADER = b"x-session-id"
+SESSION_COOKIE = "ims_session"
+clientSessionVar = ContextVar("clientSession", default=None)
+
+
+class SessionIDGenerator:
+    # Random per-process prefix plus a counter: unique like uuid4() without a
+    # urandom call per request
+    def __init__(self):
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # Forked workers would otherwise hand out the same ids
+            os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self):
+        return f"{self._prefix}-{next(self._counter):x}"
+
+    def _reset(self):
+        self._prefix = os.urandom(6).hex()
+        self._counter = itertools.count(1)
+
+
+newSessionID = SessionIDGenerator()
+
+
+class SessionTrackingMiddleware:
+    # Pure ASGI: tags each request with a session id for logs, X-Request-ID
+    # and request metrics, and with the client session (X-Session-ID or its
+    # cookie), without BaseHTTPMiddleware's extra task and streams
+    def __init__(self, app, sampleRate=None):
+        self.app = app
+        self.sampleRate = (
+            float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "1"))
+            if sampleRate is None
+            else sampleRate
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sessionID = clientSession = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                sessionID = self._validID(value.decode("latin-1"))
+            elif name == SESSION_ID_HEADER:
+                clientSession = self._validID(value.decode("latin-1"))
+            elif name == b"cookie" and clientSession is None:
+                clientSession = self._sessionCookie(value.decode("latin-1"))
+        sessionID = sessionID or newSessionID()
+        scope.setdefault("state", {})["session_id"] = sessionID
+
+        # A client without a session gets one, cookie jars send it back
+        responseHeaders = [(REQUEST_ID_HEADER, sessionID.encode("latin-1"))]
+        if clientSession is None:
+            clientSession = newSessionID()
+            responseHeaders.append(
+                (
+                    b"set-cookie",
+                    f"{SESSION_COOKIE}={clientSession}; Path=/; HttpOnly; "
+                    "SameSite=Lax".encode("latin-1"),
+                )
+            )
+        responseHeaders.append((SESSION_ID_HEADER, clientSession.encode("latin-1")))
+
+        requestMetrics = RequestMetrics()
+        tokens = (
+            sessionIDVar.set(sessionID),
+            clientSessionVar.set(clientSession),
+            requestMetricsVar.set(requestMetrics),
+            # Unsampled requests only log WARNING and above
+            requestSampledVar.set(
+                self.sampleRate >= 1 or random.random() < self.sampleRate
+            ),
+        )
+        logger.info("Handling new request...")
+
+        statusCode = 500
+
+        async def sendWithRequestID(message):
+            nonlocal statusCode
+            if message["type"] == "http.response.start":
+                statusCode = message["status"]
+                message["headers"] = [*message.get("headers", ()), *responseHeaders]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendWithRequestID)
+        finally:
+            # After the last body chunk, so streamed responses are included
+            route = scope.get("route")
+            requestMetrics.observe(
+                scope["method"], route.path if route else "unmatched", statusCode
+            )
+            for contextVar, token in zip(
+                (sessionIDVar, clientSessionVar, requestMetricsVar, requestSampledVar),
+                tokens,
+            ):
+                contextVar.reset(token)
+
+    @staticmethod
+    def _validID(value):
+        return value if REQUEST_ID_PATTERN.fullmatch(value) else None
+
+    @classmethod
+    def _sessionCookie(cls, cookieHeader):
+        try:
+            morsel = SimpleCookie(cookieHeader).get(SESSION_COOKIE)
+        except CookieError:
+            return None
+        return cls._validID(morsel.value) if morsel is not None else None
@@ -0,0 +1,54 @@
+import asyncio
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one in-flight call and its
+    # result or exception. The first caller's call runs as a task of its own,
+    # so a cancelled caller does not cancel it for the others. Callers joining
+    # a flight wait at most maxWait seconds. Event loop thread only.
+    def __init__(self, maxWait=None):
+        self.maxWait = maxWait
+        self._inFlight = {}  # key -> task
+        self._counters = {"calls": 0, "coalesced": 0, "timeouts": 0}
+
+    async def do(self, key, call):
+        task = self._inFlight.get(key)
+        if task is None:
+            self._counters["calls"] += 1
+            task = asyncio.ensure_future(call())
+            self._inFlight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            return await asyncio.shield(task)
+
+        self._counters["coalesced"] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.maxWait)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise SingleFlightTimeout(
+                f"Timed out after {self.maxWait}s waiting for an identical "
+                "in-flight call"
+            ) from None
+
+    def forget(self):
+        # Later calls start new flights, e.g. once a write has committed
+        self._inFlight.clear()
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "max_wait": self.maxWait,
+            "in_flight": len(self._inFlight),
+            **self._counters,
+        }
+
+    def _finish(self, key, task):
+        if self._inFlight.get(key) is task:
+            del self._inFlight[key]
+        if not task.cancelled():
+            # Marks the exception retrieved, every caller may have gone
+            task.exception()